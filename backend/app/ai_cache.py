@@ -0,0 +1,165 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+import hashlib
+import re
+import threading
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.metrics import metrics
+from app.models import AIResult
+from app.prompts import prompt_body
+
+_SPACES_RE = re.compile(r'\s+')
+# Query strings and fragments carry per-recipient tracking IDs
+_URL_TAIL_RE = re.compile(r'(https?://[^\s?#]+)[?#]\S*')
+_INVISIBLE_RE = re.compile('[\u00ad\u034f\u200b-\u200f\u2060\ufeff]')
+
+
+def normalize(text: Optional[str]) -> str:
+    """Lowercased text with URL query strings, invisible characters and runs of whitespace removed"""
+    text = _INVISIBLE_RE.sub('', text or '')
+    text = _URL_TAIL_RE.sub(r'\1', text)
+    return _SPACES_RE.sub(' ', text).strip().lower()
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+def content_key(email_data: Dict) -> str:
+    """Hash of what the prompts see of an email: subject, sender address and the start of the body"""
+    return _digest(
+        normalize(email_data.get('subject')),
+        (email_data.get('sender_email') or '').strip().lower(),
+        # As much of the body as any prompt reads
+        normalize(prompt_body(email_data.get('body_text'), settings.AI_PROMPT_SUMMARY_BODY_TOKENS))
+    )
+
+
+def category_fingerprint(categories: List[Dict]) -> str:
+    """Changes whenever a category is added, removed, renamed or redescribed"""
+    return _digest(*(
+        f"{cat['id']}\x1e{cat['name']}\x1e{cat['description']}"
+        for cat in sorted(categories, key=lambda cat: cat['id'])
+    ))
+
+
+def summary_key(email_data: Dict) -> str:
+    return f'summary:{content_key(email_data)}'
+
+
+def category_key(email_data: Dict, categories: List[Dict]) -> str:
+    return f'category:{_digest(content_key(email_data), category_fingerprint(categories))}'
+
+
+class AIResultCache:
+    """
+    Content-addressed cache of AI results: an in-process LRU in front of the ai_results table
+    Entries expire after ttl seconds in both tiers. Hits and misses per kind (category or
+    summary) are published under ai.cache.*; callers add what a hit saved with record_saving.
+    """
+    
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[int] = None,
+                 session_factory: Callable[[], Session] = SessionLocal):
+        self.max_entries = max_entries if max_entries is not None else settings.AI_CACHE_MAX_ENTRIES
+        self.ttl = timedelta(seconds=ttl if ttl is not None else settings.AI_CACHE_TTL)
+        self.session_factory = session_factory
+        self._entries: 'OrderedDict[str, Tuple[Dict, datetime]]' = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _remember(self, key: str, value: Dict, expires_at: datetime):
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def _from_memory(self, key: str, now: datetime) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+    
+    def _from_db(self, key: str, now: datetime) -> Optional[Tuple[Dict, datetime]]:
+        db = self.session_factory()
+        try:
+            row = db.get(AIResult, key)
+            if row is not None and row.expires_at > now:
+                return row.value, row.expires_at
+        except Exception as e:
+            print(f"Error reading AI result cache: {e}")
+        finally:
+            db.close()
+        return None
+    
+    def get(self, key: str) -> Optional[Dict]:
+        """Cached value for key, or None"""
+        kind = key.split(':', 1)[0]
+        now = datetime.utcnow()
+        value = self._from_memory(key, now)
+        tier = 'memory'
+        if value is None:
+            entry = self._from_db(key, now)
+            if entry is not None:
+                value, expires_at = entry
+                self._remember(key, value, expires_at)
+                tier = 'db'
+        if value is None:
+            metrics.incr(f'ai.cache.misses.{kind}')
+            return None
+        metrics.incr(f'ai.cache.hits.{kind}')
+        metrics.incr(f'ai.cache.hits.{tier}')
+        return value
+    
+    def set(self, key: str, value: Dict):
+        expires_at = datetime.utcnow() + self.ttl
+        self._remember(key, value, expires_at)
+        db = self.session_factory()
+        try:
+            db.merge(AIResult(key=key, value=value, created_at=datetime.utcnow(), expires_at=expires_at))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Error writing AI result cache: {e}")
+        finally:
+            db.close()
+    
+    def clear_memory(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def record_saving(prompt_tokens: int, calls: int = 1):
+    """Count the completions (and their prompt tokens) a cache hit made unnecessary"""
+    metrics.incr('ai.cache.saved_calls', calls)
+    metrics.incr('ai.cache.saved_prompt_tokens', prompt_tokens)
+
+
+def purge_expired(db: Session) -> int:
+    """Delete expired rows, returns how many"""
+    deleted = db.query(AIResult).filter(AIResult.expires_at <= datetime.utcnow()).delete(synchronize_session=False)
+    db.commit()
+    metrics.incr('ai.cache.purged', deleted)
+    return deleted
+
+
+_cache: Optional[AIResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_ai_cache() -> AIResultCache:
+    """Process-wide cache shared by every AIService"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AIResultCache()
+        return _cache
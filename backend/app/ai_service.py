@@ -1,116 +1,410 @@
 from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional
+import json
+import threading
+import time
+
+from app.ai_cache import AIResultCache, category_key, get_ai_cache, record_saving, summary_key
 from app.config import settings
+from app.local_classifier import classify_locally
+from app.metrics import metrics
+from app.prompts import (
+    batch_email_text, batch_request, categorize_request, combined_request, count_tokens,
+    prompt_tokens, summarize_request
+)
+
+
+_limiter: Optional[threading.BoundedSemaphore] = None
+_limiter_lock = threading.Lock()
+
+
+def get_request_limiter() -> threading.BoundedSemaphore:
+    """
+    Process-wide cap of AI_MAX_IN_FLIGHT completions, shared by every AIService and AsyncAIService
+    Account syncs, classify workers and summary threads each have their own limits, together
+    they would otherwise send their product.
+    """
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = threading.BoundedSemaphore(settings.AI_MAX_IN_FLIGHT)
+        return _limiter
+
+
+class AIError(Exception):
+    """A completion failed or its reply was unusable, so nothing is known about the email"""
+
+
+def _email_key(email_data: Dict, index: int) -> str:
+    """How an email is referred to in a batched prompt and its results"""
+    return str(email_data.get('message_id') or index)
+
+
+def record_usage(response, mode: str):
+    """
+    Add a completion's token usage to the ai.tokens.<mode>.* counters
+    Prompt tokens are also split into the ones the provider served from its prompt cache and the rest.
+    """
+    usage = getattr(response, 'usage', None)
+    for kind in ('prompt_tokens', 'completion_tokens'):
+        value = getattr(usage, kind, None)
+        if isinstance(value, int):
+            metrics.incr(f'ai.tokens.{mode}.{kind}', value)
+    
+    prompt = getattr(usage, 'prompt_tokens', None)
+    if isinstance(prompt, int):
+        # Not a field of this client version's usage model, kept as a plain dict
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached = details.get('cached_tokens') if isinstance(details, dict) else getattr(details, 'cached_tokens', None)
+        cached = cached if isinstance(cached, int) else 0
+        metrics.incr(f'ai.tokens.{mode}.cached_prompt_tokens', cached)
+        metrics.incr(f'ai.tokens.{mode}.uncached_prompt_tokens', prompt - cached)
+
+
+def parse_category(content: str, categories: List[Dict]) -> Optional[int]:
+    """The category ID in a categorize reply, None for "0" or an ID that isn't one of the categories"""
+    category_id = int(content.strip())
+    
+    # Verify it's a valid category
+    if category_id == 0:
+        return None
+    
+    valid_ids = [cat['id'] for cat in categories]
+    if category_id in valid_ids:
+        return category_id
+    
+    return None
+
+
+def parse_combined(content: str, categories: List[Dict]) -> Optional[Dict]:
+    """
+    Category and summary from a combined reply, None when the reply can't be used
+    A category ID that isn't one of the categories is returned as False for the caller to re-ask.
+    """
+    answer = json.loads(content)
+    category_id = int(answer['category_id'])
+    summary = str(answer['summary']).strip()
+    if not summary:
+        return None
+    if category_id == 0:
+        return {'category_id': None, 'summary': summary}
+    
+    valid_ids = [cat['id'] for cat in categories]
+    return {'category_id': category_id if category_id in valid_ids else False, 'summary': summary}
 
 
-class AIService:
-    def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+class AIServiceBase:
+    """
+    What AIService and AsyncAIService share: cache lookups, local answers and reply handling
+    Requests come from app.prompts and replies go through the parse_* helpers; subclasses only
+    send the completions. None of these steps calls the API, but they may query the cache table.
+    """
+    
+    def __init__(self, cache: Optional[AIResultCache] = None):
+        # Results are reused for identical emails (see app.ai_cache)
+        self.cache = cache or (get_ai_cache() if settings.AI_CACHE_ENABLED else None)
+    
+    def _cached(self, key: str) -> Optional[Dict]:
+        return self.cache.get(key) if self.cache else None
+    
+    def _store(self, key: str, value: Dict):
+        if self.cache:
+            self.cache.set(key, value)
+    
+    def _known_category(self, email_data: Dict, categories: List[Dict]) -> Optional[Dict]:
+        """{'category_id', 'source'} when the category is cached or the local classifier is sure, else None"""
+        cached = self._cached(category_key(email_data, categories))
+        if cached is not None:
+            record_saving(prompt_tokens(categorize_request(email_data, categories)))
+            return {'category_id': cached['category_id'], 'source': 'cache'}
+        local_id = classify_locally([email_data], categories)[0]
+        if local_id is not None:
+            return {'category_id': local_id, 'source': 'local'}
+        return None
+    
+    def _category_reply(self, email_data: Dict, categories: List[Dict], response) -> Optional[int]:
+        category_id = parse_category(response.choices[0].message.content, categories)
+        self._store(category_key(email_data, categories), {'category_id': category_id})
+        return category_id
+    
+    def _known_summary(self, email_data: Dict) -> Optional[str]:
+        cached = self._cached(summary_key(email_data))
+        if cached is not None:
+            record_saving(prompt_tokens(summarize_request(email_data)))
+            return cached['summary']
+        return None
+    
+    def _summary_reply(self, email_data: Dict, response) -> str:
+        summary = response.choices[0].message.content.strip()
+        self._store(summary_key(email_data), {'summary': summary})
+        return summary
+    
+    def _known_combined(self, email_data: Dict, categories: List[Dict]) -> Optional[Dict]:
+        """Category and summary when both are cached, else None"""
+        cached_category = self._cached(category_key(email_data, categories))
+        cached_summary = self._cached(summary_key(email_data))
+        if cached_category is None or cached_summary is None:
+            return None
+        record_saving(prompt_tokens(combined_request(email_data, categories)))
+        return {'category_id': cached_category['category_id'], 'summary': cached_summary['summary'], 'source': 'cache'}
+    
+    def _combined_reply(self, email_data: Dict, categories: List[Dict], response) -> Optional[Dict]:
+        result = parse_combined(response.choices[0].message.content, categories)
+        if result is not None:
+            if result['category_id'] is not False:
+                self._store(category_key(email_data, categories), {'category_id': result['category_id']})
+            self._store(summary_key(email_data), {'summary': result['summary']})
+            result['source'] = 'llm'
+        return result
+    
+    def _process_mode(self, email_data: Dict, categories: List[Dict], combined: Optional[bool]) -> tuple:
+        """
+        (mode, local category) of process_email: 'local' when the local classifier is sure, 'combined'
+        with AI_COMBINED_MODE (or combined=True), otherwise 'separate'
+        """
+        if combined is None:
+            combined = settings.AI_COMBINED_MODE
+        local_id = classify_locally([email_data], categories)[0]
+        if local_id is not None:
+            return 'local', local_id
+        return ('combined' if combined and categories else 'separate'), None
+    
+    def _record_process(self, mode: str, start: float):
+        metrics.incr(f'ai.process.{mode}')
+        metrics.observe(f'ai.process.{mode}', time.perf_counter() - start)
+
+
+class AIService(AIServiceBase):
+    def __init__(self, cache: Optional[AIResultCache] = None):
+        super().__init__(cache)
+        self.client = OpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL)
+    
+    def _complete(self, mode: str, request: Dict):
+        """One chat completion within the process-wide limit, its token usage counted under mode"""
+        with get_request_limiter():
+            response = self.client.chat.completions.create(**request)
+        record_usage(response, mode)
+        return response
     
     def categorize_email(self, email_data: Dict, categories: List[Dict]) -> Optional[int]:
         """
         Categorize an email based on available categories
-        Returns the category_id or None if no good match
+        Returns the category_id or None if no good match, raises AIError when the call fails
         """
+        return self._categorize(email_data, categories)['category_id']
+    
+    def _categorize(self, email_data: Dict, categories: List[Dict]) -> Dict:
+        """categorize_email's answer as {'category_id', 'source'}"""
         if not categories:
-            return None
-        
-        # Build prompt
-        categories_text = "\n".join([
-            f"ID: {cat['id']}, Name: {cat['name']}, Description: {cat['description']}"
-            for cat in categories
-        ])
-        
-        email_content = f"""
-Subject: {email_data.get('subject', '')}
-From: {email_data.get('sender', '')} <{email_data.get('sender_email', '')}>
-Body (truncated): {email_data.get('body_text', '')[:1000]}
-        """.strip()
-        
-        prompt = f"""You are an email categorization assistant. Given the following email and list of categories, determine which category best fits this email.
-
-Categories:
-{categories_text}
-
-Email:
-{email_content}
-
-Respond with ONLY the category ID number that best matches this email. If none of the categories are a good fit, respond with "0".
-"""
+            return {'category_id': None, 'source': 'local'}
+        known = self._known_category(email_data, categories)
+        if known is not None:
+            return known
         
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are an email categorization assistant. Respond only with a category ID number."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=10
-            )
-            
-            category_id_str = response.choices[0].message.content.strip()
-            category_id = int(category_id_str)
-            
-            # Verify it's a valid category
-            if category_id == 0:
-                return None
-            
-            valid_ids = [cat['id'] for cat in categories]
-            if category_id in valid_ids:
-                return category_id
-            
-            return None
-            
+            response = self._complete('separate', categorize_request(email_data, categories))
+            return {'category_id': self._category_reply(email_data, categories, response), 'source': 'llm'}
         except Exception as e:
             print(f"Error categorizing email: {e}")
-            return None
+            raise AIError(f"Error categorizing email: {e}") from e
+    
+    def _plan_batches(self, items: List[tuple], categories_tokens: int) -> List[List[tuple]]:
+        """Split (key, email text) items into batches that fit AI_BATCH_TOKEN_BUDGET prompt tokens"""
+        budget = max(settings.AI_BATCH_TOKEN_BUDGET - categories_tokens, 1)
+        batches = []
+        batch = []
+        used = 0
+        for key, text in items:
+            tokens = count_tokens(text)
+            if batch and (used + tokens > budget or len(batch) >= settings.AI_BATCH_MAX_EMAILS):
+                batches.append(batch)
+                batch = []
+                used = 0
+            batch.append((key, text))
+            used += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    def _categorize_batch(self, batch: List[tuple], categories: List[Dict]) -> Dict[str, object]:
+        """One chat completion for a batch of (key, email text), returns the raw answer per email key"""
+        response = self._complete('batch', batch_request([text for _, text in batch], categories))
+        results = json.loads(response.choices[0].message.content).get('results', {})
+        return results if isinstance(results, dict) else {}
+    
+    def categorize_emails(self, emails: List[Dict], categories: List[Dict]) -> Dict[str, Optional[int]]:
+        """
+        Categorize many emails with one structured (JSON) completion per batch
+        Batches are packed up to AI_BATCH_TOKEN_BUDGET prompt tokens. Answers are checked
+        against the category IDs and only the emails whose answer was missing or invalid are
+        sent again, up to AI_BATCH_MAX_RETRIES times.
+        Returns category_id (or None) per email key: its message_id, or its list index as a string.
+        Emails that still have no valid answer are left out. Unlike None, a missing key says
+        nothing about the email, so the caller should keep it and ask again later.
+        """
+        return {
+            key: answer['category_id']
+            for key, answer in self._categorize_answers(emails, categories).items() if 'error' not in answer
+        }
+    
+    def _categorize_answers(self, emails: List[Dict], categories: List[Dict]) -> Dict[str, Dict]:
+        """categorize_emails' answers: {'category_id', 'source'} per email key, or {'error'} when there is none"""
+        keys = [_email_key(email_data, index) for index, email_data in enumerate(emails)]
+        if not categories or not emails:
+            return {key: {'category_id': None, 'source': 'local'} for key in keys}
+        
+        answers: Dict[str, Dict] = {}
+        valid_ids = {cat['id'] for cat in categories}
+        cache_keys = {key: category_key(email_data, categories) for key, email_data in zip(keys, emails)}
+        pending = []
+        for key, email_data in zip(keys, emails):
+            cached = self._cached(cache_keys[key])
+            if cached is None:
+                pending.append((key, email_data))
+            else:
+                # A batch is still sent for the others, only this email's share is saved
+                record_saving(count_tokens(batch_email_text(key, email_data)), calls=0)
+                answers[key] = {'category_id': cached['category_id'], 'source': 'cache'}
+        local_ids = classify_locally([email_data for _, email_data in pending], categories)
+        answers.update(
+            (key, {'category_id': local_id, 'source': 'local'})
+            for (key, _), local_id in zip(pending, local_ids) if local_id is not None
+        )
+        pending = [
+            (key, batch_email_text(key, email_data))
+            for (key, email_data), local_id in zip(pending, local_ids) if local_id is None
+        ]
+        categories_tokens = prompt_tokens(batch_request([], categories))
+        
+        errors = {}
+        for attempt in range(settings.AI_BATCH_MAX_RETRIES + 1):
+            if not pending:
+                break
+            failed = []
+            for batch in self._plan_batches(pending, categories_tokens):
+                try:
+                    replies = self._categorize_batch(batch, categories)
+                    batch_error = None
+                except Exception as e:
+                    print(f"Error categorizing email batch: {e}")
+                    replies = {}
+                    batch_error = f"Error categorizing email batch: {e}"
+                for key, text in batch:
+                    try:
+                        category_id = int(replies.get(key))
+                    except (TypeError, ValueError):
+                        category_id = None
+                    if category_id == 0:
+                        category_id = None
+                    elif category_id not in valid_ids:
+                        errors[key] = batch_error or f"No valid category in the answer: {replies.get(key)!r}"
+                        failed.append((key, text))
+                        continue
+                    self._store(cache_keys[key], {'category_id': category_id})
+                    answers[key] = {'category_id': category_id, 'source': 'llm'}
+            if not failed:
+                break
+            pending = failed
+        
+        answers.update((key, {'error': errors[key]}) for key, _ in pending if key not in answers)
+        return answers
     
     def summarize_email(self, email_data: Dict) -> str:
         """
         Generate an AI summary of an email
         """
-        email_content = f"""
-Subject: {email_data.get('subject', '')}
-From: {email_data.get('sender', '')} <{email_data.get('sender_email', '')}>
-Body: {email_data.get('body_text', '')[:3000]}
-        """.strip()
-        
-        prompt = f"""Summarize the following email in 1-2 concise sentences. Focus on the main point or action items.
-
-Email:
-{email_content}
-
-Summary:"""
+        known = self._known_summary(email_data)
+        if known is not None:
+            return known
         
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are an email summarization assistant. Provide concise, actionable summaries."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.5,
-                max_tokens=150
-            )
-            
-            summary = response.choices[0].message.content.strip()
-            return summary
-            
+            response = self._complete('separate', summarize_request(email_data))
+            return self._summary_reply(email_data, response)
         except Exception as e:
             print(f"Error summarizing email: {e}")
             return "Unable to generate summary."
     
-    def process_email(self, email_data: Dict, categories: List[Dict]) -> Dict:
+    def categorize_and_summarize(self, email_data: Dict, categories: List[Dict]) -> Optional[Dict]:
+        """
+        Category and summary from one structured (JSON) completion, so the body is only sent once
+        Returns dict with category_id and summary, or None when the reply can't be used.
+        A category ID that isn't one of the user's is returned as False for the caller to re-ask.
+        """
+        known = self._known_combined(email_data, categories)
+        if known is not None:
+            return known
+        
+        try:
+            response = self._complete('combined', combined_request(email_data, categories))
+            return self._combined_reply(email_data, categories, response)
+        except Exception as e:
+            print(f"Error categorizing and summarizing email: {e}")
+            return None
+    
+    def process_email(self, email_data: Dict, categories: List[Dict], combined: Optional[bool] = None) -> Dict:
         """
         Process an email: categorize and summarize it
-        Returns dict with category_id and summary
+        With AI_COMBINED_MODE (or combined=True) both come from one completion, falling back to
+        separate categorize and summarize calls when that reply is unusable. An email the local
+        classifier is sure about only needs the summary.
+        Returns dict with category_id, summary and the category's source ('llm', 'cache' or 'local'),
+        or with an 'error' when it couldn't be categorized
         """
-        category_id = self.categorize_email(email_data, categories)
-        summary = self.summarize_email(email_data)
+        start = time.perf_counter()
+        mode, local_id = self._process_mode(email_data, categories, combined)
+        try:
+            if mode == 'combined':
+                result = self.categorize_and_summarize(email_data, categories)
+                if result is None:
+                    mode = 'separate'
+                elif result['category_id'] is False:
+                    # Only the category was wrong, keep the summary and ask for the category again
+                    metrics.incr('ai.combined.invalid_category')
+                    result.update(self._categorize(email_data, categories))
+            if mode == 'local':
+                result = {'category_id': local_id, 'summary': self.summarize_email(email_data), 'source': 'local'}
+            elif mode == 'separate':
+                result = self._categorize(email_data, categories)
+                result['summary'] = self.summarize_email(email_data)
+        except AIError as e:
+            result = {'category_id': None, 'summary': None, 'error': str(e)}
         
-        return {
-            'category_id': category_id,
-            'summary': summary
-        }
-
+        self._record_process(mode, start)
+        return result
+    
+    def summarize_emails(self, emails: List[Dict]) -> List[str]:
+        """Summaries of many emails, AI_SUMMARY_CONCURRENCY requests at a time, in input order"""
+        if not emails:
+            return []
+        with ThreadPoolExecutor(max_workers=max(1, min(settings.AI_SUMMARY_CONCURRENCY, len(emails)))) as executor:
+            return list(executor.map(self.summarize_email, emails))
+    
+    def process_emails(self, emails: List[Dict], categories: List[Dict], combined: bool = False) -> List[Dict]:
+        """
+        Categorize and summarize many emails
+        The emails are categorized together in batches and only those that get a category are
+        summarized, the others' summary is None. AI_COMBINED_MODE is not used here: one combined
+        completion per email costs a summary-sized prompt even for emails that match no category.
+        With combined=True every email gets one, AI_SUMMARY_CONCURRENCY at a time.
+        Returns a dict with category_id, summary and source per email, in input order, see process_email.
+        An email that couldn't be categorized gets an 'error' instead of a category: it is not a "no match".
+        """
+        if not emails:
+            return []
+        if combined and categories:
+            with ThreadPoolExecutor(max_workers=max(1, min(settings.AI_SUMMARY_CONCURRENCY, len(emails)))) as executor:
+                return list(executor.map(lambda email_data: self.process_email(email_data, categories, True), emails))
+        
+        answers = self._categorize_answers(emails, categories)
+        answers = [answers[_email_key(email_data, index)] for index, email_data in enumerate(emails)]
+        summaries = iter(self.summarize_emails([
+            email_data for email_data, answer in zip(emails, answers) if answer.get('category_id')
+        ]))
+        results = []
+        for answer in answers:
+            if 'error' in answer:
+                results.append({'category_id': None, 'summary': None, 'error': answer['error']})
+            else:
+                results.append({**answer, 'summary': next(summaries) if answer['category_id'] else None})
+        return results
@@ -0,0 +1,180 @@
+from email.utils import parsedate_to_datetime
+from typing import List, Dict, Optional
+from datetime import datetime, timezone
+import asyncio
+import random
+import time
+
+from openai import AsyncOpenAI, APIConnectionError, InternalServerError, RateLimitError
+
+from app.ai_cache import AIResultCache
+from app.ai_service import AIError, AIServiceBase, get_request_limiter, record_usage
+from app.config import settings
+from app.metrics import metrics
+from app.prompts import categorize_request, combined_request, summarize_request
+
+# Worth sending again: 429s, 5xx, timeouts (APITimeoutError is an APIConnectionError) and dropped connections
+RETRYABLE_ERRORS = (RateLimitError, InternalServerError, APIConnectionError)
+
+
+def retry_after(error: Exception) -> float:
+    """Seconds the server asked us to wait (Retry-After or retry-after-ms), 0 if it didn't say"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        if headers.get('retry-after-ms'):
+            return max(0.0, float(headers['retry-after-ms']) / 1000)
+        value = headers.get('retry-after')
+        if not value:
+            return 0.0
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class AsyncAIService(AIServiceBase):
+    """
+    AIService on AsyncOpenAI, so many emails' completions can be in flight at once
+    At most `concurrency` requests run at a time (and no more than the process-wide
+    AI_MAX_IN_FLIGHT across all services), each one times out after `timeout` seconds
+    and rate limited, 5xx and timed out requests are retried with jittered exponential backoff,
+    never sooner than the server's Retry-After. Use an instance within a single event loop.
+    Everything but sending the completions is AIServiceBase's, run in a worker thread since
+    the cache lookups are blocking DB queries.
+    """
+    
+    def __init__(self, concurrency: Optional[int] = None, timeout: Optional[float] = None,
+                 max_retries: Optional[int] = None, base_url: Optional[str] = None,
+                 cache: Optional[AIResultCache] = None):
+        super().__init__(cache)
+        self.timeout = timeout if timeout is not None else settings.AI_REQUEST_TIMEOUT
+        self.max_retries = max_retries if max_retries is not None else settings.AI_MAX_RETRIES
+        self.base_delay = settings.AI_BACKOFF_BASE
+        self.max_delay = settings.AI_BACKOFF_MAX
+        # Retries are ours, so they can honour Retry-After and release the semaphore while waiting
+        self.client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=base_url or settings.OPENAI_BASE_URL,
+            timeout=self.timeout,
+            max_retries=0
+        )
+        self._semaphore = asyncio.Semaphore(concurrency or settings.AI_CONCURRENCY)
+    
+    async def _acquire_shared(self):
+        """Wait for a slot of the process-wide limit without blocking the event loop"""
+        limiter = get_request_limiter()
+        while not limiter.acquire(blocking=False):
+            await asyncio.sleep(0.01)
+        return limiter
+    
+    async def _complete(self, mode: str, request: Dict):
+        """One chat completion within the concurrency limits, retried while it fails transiently"""
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    limiter = await self._acquire_shared()
+                    try:
+                        response = await self.client.chat.completions.create(**request, timeout=self.timeout)
+                    finally:
+                        limiter.release()
+                record_usage(response, mode)
+                return response
+            except RETRYABLE_ERRORS as error:
+                metrics.incr('ai.request_errors')
+                if attempt >= self.max_retries:
+                    raise
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                delay = max(delay, retry_after(error))
+                metrics.incr('ai.retries')
+                metrics.observe('ai.backoff_seconds', delay)
+                await asyncio.sleep(delay)
+                attempt += 1
+    
+    async def categorize_email(self, email_data: Dict, categories: List[Dict]) -> Optional[int]:
+        """
+        Categorize an email based on available categories
+        Returns the category_id or None if no good match, raises AIError when the call fails
+        """
+        return (await self._categorize(email_data, categories))['category_id']
+    
+    async def _categorize(self, email_data: Dict, categories: List[Dict]) -> Dict:
+        """categorize_email's answer as {'category_id', 'source'}"""
+        if not categories:
+            return {'category_id': None, 'source': 'local'}
+        known = await asyncio.to_thread(self._known_category, email_data, categories)
+        if known is not None:
+            return known
+        try:
+            response = await self._complete('separate', categorize_request(email_data, categories))
+            category_id = await asyncio.to_thread(self._category_reply, email_data, categories, response)
+            return {'category_id': category_id, 'source': 'llm'}
+        except Exception as e:
+            print(f"Error categorizing email: {e}")
+            raise AIError(f"Error categorizing email: {e}") from e
+    
+    async def summarize_email(self, email_data: Dict) -> str:
+        """Generate an AI summary of an email"""
+        known = await asyncio.to_thread(self._known_summary, email_data)
+        if known is not None:
+            return known
+        try:
+            response = await self._complete('separate', summarize_request(email_data))
+            return await asyncio.to_thread(self._summary_reply, email_data, response)
+        except Exception as e:
+            print(f"Error summarizing email: {e}")
+            return "Unable to generate summary."
+    
+    async def categorize_and_summarize(self, email_data: Dict, categories: List[Dict]) -> Optional[Dict]:
+        """Category and summary from one structured completion, see AIService.categorize_and_summarize"""
+        known = await asyncio.to_thread(self._known_combined, email_data, categories)
+        if known is not None:
+            return known
+        try:
+            response = await self._complete('combined', combined_request(email_data, categories))
+            return await asyncio.to_thread(self._combined_reply, email_data, categories, response)
+        except Exception as e:
+            print(f"Error categorizing and summarizing email: {e}")
+            return None
+    
+    async def process_email(self, email_data: Dict, categories: List[Dict], combined: Optional[bool] = None) -> Dict:
+        """
+        Process an email: categorize and summarize it, like AIService.process_email
+        In separate mode both calls are in flight at once.
+        """
+        start = time.perf_counter()
+        mode, local_id = await asyncio.to_thread(self._process_mode, email_data, categories, combined)
+        try:
+            if mode == 'combined':
+                result = await self.categorize_and_summarize(email_data, categories)
+                if result is None:
+                    mode = 'separate'
+                elif result['category_id'] is False:
+                    metrics.incr('ai.combined.invalid_category')
+                    result.update(await self._categorize(email_data, categories))
+            if mode == 'local':
+                result = {'category_id': local_id, 'summary': await self.summarize_email(email_data), 'source': 'local'}
+            elif mode == 'separate':
+                # Both calls finish before a failed categorization is handed on
+                answer, summary = await asyncio.gather(
+                    self._categorize(email_data, categories), self.summarize_email(email_data),
+                    return_exceptions=True
+                )
+                if isinstance(answer, BaseException):
+                    raise answer
+                result = {**answer, 'summary': summary}
+        except AIError as e:
+            result = {'category_id': None, 'summary': None, 'error': str(e)}
+        
+        self._record_process(mode, start)
+        return result
+    
+    async def process_emails(self, emails: List[Dict], categories: List[Dict]) -> List[Dict]:
+        """Process many emails concurrently, returns a dict with category_id, summary and source per email in input order"""
+        return list(await asyncio.gather(*(self.process_email(email_data, categories) for email_data in emails)))
+    
+    async def close(self):
+        await self.client.close()
@@ -0,0 +1,114 @@
+from typing import Optional
+import re
+
+# Bodies are cleaned from their start, later text would be cut by the prompt's token budget anyway
+MAX_INPUT_CHARS = 20000
+# Longer URLs (without query string) are replaced by their domain
+MAX_URL_CHARS = 40
+# Longer lines are content, even when they mention unsubscribing or privacy
+MAX_BOILERPLATE_LINE_CHARS = 200
+
+# Where an earlier message is quoted below a reply: "On <date>, <name> wrote:" (mail clients wrap
+# it onto a second line when the name is long), Outlook's "Original Message" line or From:/Sent: block
+_QUOTE_HEADER_RE = re.compile(
+    r'^[ \t]*(?:(?:On|Le|Am|El|Il)\b[^\n]{0,300}(?:\n[^\n]{0,300})?'
+    r'\b(?:wrote|a écrit|schrieb|escribió|ha scritto)[ \t]*:[ \t]*$'
+    r'|-{2,}[ \t]*Original Message[ \t]*-{2,}'
+    r'|From:[^\n]*\n(?:[^\n]*\n)?Sent:[^\n]*$)',
+    re.MULTILINE | re.IGNORECASE
+)
+_QUOTED_LINE_RE = re.compile(r'^[ \t]*>.*$\n?', re.MULTILINE)
+# RFC 3676 signature separator
+_SIGNATURE_RE = re.compile(r'^-- ?$', re.MULTILINE)
+_MOBILE_SIGNATURE_RE = re.compile(r'^(?:Sent from my \w+|Get Outlook for \w+).*$', re.MULTILINE | re.IGNORECASE)
+# Matched against lowercased lines, the word boundary lets the search skip most positions quickly
+_BOILERPLATE_RE = re.compile(
+    r'\b(?:unsubscribe|opt[ -]out|no longer wish to receive'
+    r'|(?:manage|update) (?:your )?(?:email |subscription |notification |communication )?'
+    r'(?:preferences|settings|subscriptions)'
+    r"|you(?:'re| are) receiving this|you received this (?:e-?mail|message)|this (?:e-?mail|message) was sent to"
+    r'|(?:view|read) (?:this (?:e-?mail|message) )?(?:in|on) (?:your |a |the )?(?:browser|web)'
+    r'|all rights reserved|privacy policy|terms of (?:service|use)'
+    r'|(?:e-?mail|message)(?: and any attachments)? (?:is|are|may (?:be|contain)) (?:confidential|privileged)'
+    r'|intended (?:solely |only )?for the (?:use of the )?(?:named )?(?:recipient|addressee|individual))'
+    r'|^\W*(?:©|\(c\)\s*\d{4})'
+)
+_URL_RE = re.compile(
+    # Host, path, then query string and fragment, none of them ending with the punctuation after the URL
+    r'(https?://(?:www\.)?([^/\s?#<>"\')\]]*[^/\s?#<>"\')\].,;:!?])(?:/(?:[^\s?#<>"\')\]]*[^\s?#<>"\')\].,;:!?])?)?)'
+    r'(?:[?#](?:[^\s<>"\')\]]*[^\s<>"\')\].,;:!?])?)?',
+    re.IGNORECASE
+)
+# Zero-width and soft hyphen characters used to pad preheaders
+_INVISIBLE_RE = re.compile('[\u00ad\u034f\u200b-\u200f\u2060\ufeff]')
+# Only runs and other whitespace, replacing every single space costs more than the rest of the cleanup
+_SPACES_RE = re.compile(r'[ \t\r\f\v\u00a0]{2,}|[\t\r\f\v\u00a0]')
+
+
+def _shorten_url(match: re.Match) -> str:
+    # Query strings and fragments are dropped either way, they carry per-recipient tracking IDs
+    url = match.group(1)
+    return url if len(url) <= MAX_URL_CHARS else match.group(2).lower()
+
+
+def _cut_quoted_history(text: str) -> str:
+    """Text above the first quoted message, unless nothing is written above it"""
+    match = _QUOTE_HEADER_RE.search(text)
+    if match and text[:match.start()].strip():
+        text = text[:match.start()]
+    return _QUOTED_LINE_RE.sub('', text)
+
+
+def _is_boilerplate(line: str) -> bool:
+    return len(line) <= MAX_BOILERPLATE_LINE_CHARS and bool(_BOILERPLATE_RE.search(line.lower()))
+
+
+def _is_footer_paragraph(paragraph: str) -> bool:
+    # Opens with boilerplate and is mostly boilerplate, so a company address at its end goes too
+    lines = [line for line in paragraph.split('\n') if line.strip()]
+    boilerplate = sum(1 for line in lines if _is_boilerplate(line))
+    return bool(lines) and _is_boilerplate(lines[0]) and boilerplate * 2 > len(lines)
+
+
+def _strip_footer(text: str) -> str:
+    """
+    Text without its footer: the trailing paragraphs of boilerplate, then the boilerplate lines
+    after the last line of content
+    Mentions of unsubscribing or a privacy policy further up are what the email is about.
+    """
+    paragraphs = re.split(r'\n[ \t]*\n', text.rstrip())
+    while len(paragraphs) > 1 and _is_footer_paragraph(paragraphs[-1]):
+        paragraphs.pop()
+    lines = '\n\n'.join(paragraphs).split('\n')
+    end = len(lines)
+    while end and (not lines[end - 1].strip() or _is_boilerplate(lines[end - 1])):
+        end -= 1
+    return '\n'.join(lines[:end])
+
+
+def _collapse(text: str) -> str:
+    """Single spaces, stripped lines and at most one empty line between paragraphs"""
+    lines = []
+    for line in _SPACES_RE.sub(' ', text).split('\n'):
+        line = line.strip()
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    return '\n'.join(lines).strip()
+
+
+def clean_body(text: Optional[str]) -> str:
+    """
+    An email body with what costs tokens without telling the model anything removed:
+    quoted replies, signatures, the unsubscribe and legal footer, long tracking URLs (kept as
+    their domain), invisible characters and runs of whitespace
+    Falls back to the body with only whitespace collapsed when nothing else would be left.
+    """
+    text = _INVISIBLE_RE.sub('', (text or '')[:MAX_INPUT_CHARS].replace('\r\n', '\n'))
+    cleaned = _cut_quoted_history(text)
+    signature = _SIGNATURE_RE.search(cleaned)
+    if signature:
+        cleaned = cleaned[:signature.start()]
+    cleaned = _MOBILE_SIGNATURE_RE.sub('', cleaned)
+    cleaned = _strip_footer(cleaned)
+    cleaned = _collapse(_URL_RE.sub(_shorten_url, cleaned))
+    return cleaned or _collapse(text)
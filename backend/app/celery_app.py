@@ -0,0 +1,40 @@
+from celery import Celery
+from app.config import settings
+
+celery_app = Celery(
+    "email_sorter",
+    broker=settings.REDIS_URL,
+    backend=settings.REDIS_URL,
+    include=["app.tasks"]
+)
+
+celery_app.conf.update(
+    task_serializer="json",
+    result_serializer="json",
+    accept_content=["json"],
+    task_track_started=True,
+    result_extended=True,  # Store task args so job owners can be checked
+    task_acks_late=True,  # A job lost with its worker is redelivered
+    worker_prefetch_multiplier=1,  # Jobs are long, don't let one worker hoard them
+    result_expires=60 * 60 * 24,
+    beat_schedule={
+        # Keeps access tokens of active accounts ahead of expiry (run beat once: worker -B)
+        "refresh-expiring-tokens": {
+            "task": "tokens.refresh_expiring",
+            "schedule": settings.TOKEN_REFRESH_INTERVAL
+        },
+        "purge-ai-cache": {
+            "task": "ai_cache.purge_expired",
+            "schedule": settings.AI_CACHE_PURGE_INTERVAL
+        }
+    }
+)
+
+if settings.CELERY_TASK_ALWAYS_EAGER:
+    # Run jobs inline with an in-memory broker and result store, no Redis needed
+    celery_app.conf.update(
+        broker_url="memory://",
+        result_backend="cache+memory://",
+        task_always_eager=True,
+        task_store_eager_result=True
+    )
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Optional
 
 
 class Settings(BaseSettings):
@@ -8,10 +8,105 @@ class Settings(BaseSettings):
     GOOGLE_CLIENT_ID: str
     GOOGLE_CLIENT_SECRET: str
     OPENAI_API_KEY: str
+    OPENAI_BASE_URL: Optional[str] = None  # Another OpenAI-compatible endpoint
     REDIS_URL: str = "redis://localhost:6379"
     FRONTEND_URL: str = "http://localhost:3000"
     BACKEND_URL: str = "http://localhost:8000"
     
+    # Email sync
+    SYNC_RESYNC_QUERY: str = "newer_than:1d"  # Used when there is no usable history ID
+    SYNC_RESYNC_MAX_MESSAGES: int = 100
+    BACKFILL_QUERY: str = "-in:sent -in:drafts -in:chats"
+    BACKFILL_MAX_IN_FLIGHT: int = 100  # Parsed messages held in memory at once
+    SYNC_MAX_WORKERS: int = 8  # Accounts synced concurrently across all users
+    SYNC_MAX_ACCOUNTS_PER_USER: int = 3  # Accounts of one user synced concurrently
+    # Sync pipeline stage workers and queue size (the persist stage always has one worker)
+    SYNC_FETCH_CONCURRENCY: int = 2
+    SYNC_PARSE_CONCURRENCY: int = 2
+    SYNC_CLASSIFY_CONCURRENCY: int = 8
+    SYNC_ARCHIVE_CONCURRENCY: int = 2
+    SYNC_QUEUE_SIZE: int = 100
+    SYNC_PERSIST_BATCH_SIZE: int = 200  # Emails written per INSERT/commit
+    SYNC_MAX_MESSAGE_ATTEMPTS: int = 5  # Syncs that retry a failed message before it is skipped
+    # Fetch metadata first and only fetch full bodies of messages worth categorizing
+    SYNC_TWO_PHASE_FETCH: bool = True
+    SYNC_SKIP_LABELS: List[str] = ["SENT", "DRAFT", "SPAM", "TRASH", "CHAT"]
+    HTML_TEXT_EXTRACTOR: str = "streaming"  # or "beautifulsoup", for HTML-only emails
+    
+    # Gmail API clients
+    GMAIL_CLIENT_CACHE_SIZE: int = 256  # Accounts whose clients are kept
+    GMAIL_CLIENT_CACHE_TTL: int = 1800  # Seconds before a client is rebuilt
+    # Gmail quota units per second: 250 per user, and this process's share of the
+    # project's 20,000 (lower it when running several API/worker processes)
+    GMAIL_USER_QUOTA_PER_SECOND: float = 250
+    GMAIL_PROJECT_QUOTA_PER_SECOND: float = 5000
+    GMAIL_RATE_LIMIT_RETRIES: int = 5  # Retries of a call Gmail rate limited
+    GMAIL_BACKOFF_BASE: float = 1.0  # Seconds, doubled per retry and jittered
+    GMAIL_BACKOFF_MAX: float = 32.0
+    
+    # OAuth tokens
+    TOKEN_REFRESH_MARGIN: int = 300  # Refresh access tokens this many seconds before they expire
+    TOKEN_REFRESH_INTERVAL: int = 600  # Seconds between background refresh runs
+    TOKEN_REFRESH_ACTIVE_HOURS: int = 24  # Only accounts synced this recently are kept warm
+    
+    # AI processing
+    AI_BATCH_MAX_EMAILS: int = 20  # Emails categorized per completion
+    AI_BATCH_TOKEN_BUDGET: int = 6000  # Prompt tokens per batched categorization
+    AI_BATCH_MAX_RETRIES: int = 2  # Re-asks for emails with a missing or invalid answer
+    AI_SUMMARY_CONCURRENCY: int = 8  # Summaries requested at once per batch
+    AI_MAX_IN_FLIGHT: int = 32  # Completions in flight at once across the process, whatever asks for them
+    AI_COMBINED_MODE: bool = True  # Category and summary from one completion in process_email (process_emails batches)
+    AI_PROMPT_CATEGORIZE_BODY_TOKENS: int = 250  # Body tokens a categorization prompt includes
+    AI_PROMPT_SUMMARY_BODY_TOKENS: int = 750  # Body tokens a summary or combined prompt includes
+    AI_CLEAN_BODY: bool = True  # Strip quoted replies, footers and long URLs from bodies before prompting
+    # Async client (AsyncAIService)
+    AI_CONCURRENCY: int = 16  # Completions in flight at once per service
+    AI_REQUEST_TIMEOUT: float = 30.0  # Seconds per completion request
+    AI_MAX_RETRIES: int = 4  # Retries of a rate limited, timed out or 5xx request
+    AI_BACKOFF_BASE: float = 0.5  # Seconds, doubled per retry and jittered, never below Retry-After
+    AI_BACKOFF_MAX: float = 20.0
+    # Content-addressed result cache (in-process LRU in front of the ai_results table)
+    AI_CACHE_ENABLED: bool = True
+    AI_CACHE_MAX_ENTRIES: int = 10000  # Results kept in memory per process
+    AI_CACHE_TTL: int = 60 * 60 * 24 * 7  # Seconds before a cached result expires
+    AI_CACHE_PURGE_INTERVAL: int = 60 * 60  # Seconds between deletions of expired rows
+    # Local pre-classifier: hashed TF-IDF similarity to category names and descriptions,
+    # the LLM is only asked when the best category doesn't win by LOCAL_CLASSIFIER_MARGIN
+    LOCAL_CLASSIFIER_ENABLED: bool = True
+    LOCAL_CLASSIFIER_MARGIN: float = 0.1  # Cosine similarity lead over the runner-up
+    # Best similarity required, personal mail that shares a word with a category scores up to ~0.13
+    LOCAL_CLASSIFIER_MIN_SCORE: float = 0.15
+    LOCAL_CLASSIFIER_CACHE_SIZE: int = 1024  # Users whose category vectors are kept
+    
+    # Sender affinity: categorize mail from senders whose history agrees without asking the LLM
+    AFFINITY_ENABLED: bool = True
+    AFFINITY_MIN_EMAILS: int = 5  # Emails seen from a sender before its history is trusted
+    AFFINITY_MIN_SHARE: float = 0.95  # Share of them that must have landed in the same category
+    AFFINITY_DOMAIN_MIN_EMAILS: int = 20  # The same for all senders of a domain together
+    AFFINITY_DOMAIN_MIN_SHARE: float = 0.98
+    # Domains shared by unrelated senders, only individual addresses are learned there
+    AFFINITY_SHARED_DOMAINS: List[str] = [
+        "gmail.com", "googlemail.com", "yahoo.com", "outlook.com", "hotmail.com", "live.com",
+        "icloud.com", "me.com", "aol.com", "proton.me", "protonmail.com", "gmx.com"
+    ]
+    # Online classifier: naive Bayes learned from each user's own categorized emails, sync uses its
+    # predictions instead of the LLM once it is confident
+    ONLINE_CLASSIFIER_ENABLED: bool = True
+    ONLINE_CLASSIFIER_MIN_EMAILS: int = 50  # Emails learned before any prediction is used
+    ONLINE_CLASSIFIER_MIN_CONFIDENCE: float = 0.9  # Probability the predicted category must reach
+    ONLINE_CLASSIFIER_SMOOTHING: float = 0.01  # Additive smoothing of feature counts
+    ONLINE_CLASSIFIER_BOOTSTRAP_EMAILS: int = 2000  # Stored emails a new model is first trained on
+    
+    # Unsubscribe
+    UNSUBSCRIBE_ALLOW_MAILTO: bool = True  # Send mailto: unsubscribe requests from the user's account
+    UNSUBSCRIBE_CONCURRENCY: int = 8  # One-click POSTs and mailto sends in flight per job
+    UNSUBSCRIBE_HTTP_TIMEOUT: float = 15.0
+    
+    # Background jobs
+    CELERY_TASK_ALWAYS_EAGER: bool = False  # Run jobs in-process without Redis (local testing)
+    JOB_MAX_RETRIES: int = 3
+    JOB_RETRY_DELAY: int = 30  # Seconds, doubled on every retry
+    
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,108 @@
+from collections import OrderedDict
+from functools import partial
+from typing import Optional, Tuple
+import hashlib
+import threading
+import time
+
+from app.config import settings
+from app.gmail_service import GmailService
+from app.metrics import metrics
+from app.models import GmailAccount
+from app.token_manager import ensure_fresh_token, save_refreshed_token
+from sqlalchemy.orm import Session
+
+
+class GmailClientCache:
+    """
+    Per-account GmailService cache with TTL and LRU eviction
+    Reusing a client keeps its built API resource, its credentials (and any token it
+    refreshed) and its per-thread pooled HTTP connections.
+    """
+    
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clients: "OrderedDict[Tuple, Tuple[GmailService, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def _key(gmail_account: GmailAccount) -> Tuple:
+        # A re-authorized account gets a new refresh token and therefore a fresh client
+        token_hash = hashlib.sha256((gmail_account.refresh_token or '').encode('utf-8')).hexdigest()
+        return gmail_account.id, token_hash
+    
+    def get(self, gmail_account: GmailAccount) -> GmailService:
+        key = self._key(gmail_account)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry and now - entry[1] < self.ttl:
+                self._clients.move_to_end(key)
+                self.hits += 1
+                self._record()
+                return entry[0]
+            self.misses += 1
+        
+        start = time.perf_counter()
+        gmail_service = GmailService(
+            access_token=gmail_account.access_token,
+            refresh_token=gmail_account.refresh_token,
+            client_id=settings.GOOGLE_CLIENT_ID,
+            client_secret=settings.GOOGLE_CLIENT_SECRET,
+            token_expiry=gmail_account.token_expiry,
+            on_token_refresh=partial(save_refreshed_token, gmail_account.id),
+            quota_key=gmail_account.id
+        )
+        metrics.observe('gmail.client.build_seconds', time.perf_counter() - start)
+        
+        with self._lock:
+            self._clients[key] = (gmail_service, now)
+            self._clients.move_to_end(key)
+            while len(self._clients) > self.max_size:
+                self._clients.popitem(last=False)
+                metrics.incr('gmail.client.cache_evictions')
+            self._record()
+        return gmail_service
+    
+    def invalidate(self, account_id: int):
+        with self._lock:
+            for key in [key for key in self._clients if key[0] == account_id]:
+                del self._clients[key]
+    
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+    
+    def _record(self):
+        total = self.hits + self.misses
+        metrics.set_gauge('gmail.client.cache_hits', self.hits)
+        metrics.set_gauge('gmail.client.cache_misses', self.misses)
+        metrics.set_gauge('gmail.client.cache_hit_ratio', self.hits / total if total else 0.0)
+        metrics.set_gauge('gmail.client.cache_size', len(self._clients))
+
+
+_cache: Optional[GmailClientCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_client_cache() -> GmailClientCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = GmailClientCache(settings.GMAIL_CLIENT_CACHE_SIZE, settings.GMAIL_CLIENT_CACHE_TTL)
+        return _cache
+
+
+def get_gmail_service(gmail_account: GmailAccount, db: Optional[Session] = None) -> GmailService:
+    """
+    Cached GmailService for an account
+    With a session its token is first made valid for TOKEN_REFRESH_MARGIN more seconds,
+    adopting a token another worker already refreshed and stored.
+    """
+    gmail_service = get_client_cache().get(gmail_account)
+    if db is not None:
+        ensure_fresh_token(db, gmail_account, gmail_service.credentials)
+    return gmail_service
@@ -0,0 +1,150 @@
+from typing import Callable, Dict, Hashable, Optional, TypeVar
+import json
+import random
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+from app.config import settings
+from app.metrics import metrics
+
+T = TypeVar('T')
+
+# Gmail quota units charged per call, https://developers.google.com/gmail/api/reference/quota
+QUOTA_UNITS = {
+    'getProfile': 1,
+    'history.list': 2,
+    'messages.list': 5,
+    'messages.get': 5,
+    'messages.attachments.get': 5,
+    'messages.modify': 5,
+    'messages.trash': 5,
+    'messages.batchModify': 50,
+    'messages.send': 100,
+}
+
+RATE_LIMIT_REASONS = {'userRateLimitExceeded', 'rateLimitExceeded'}
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """True for 429s and the 403s Gmail returns when a rate limit (not a daily quota) is hit"""
+    if not isinstance(error, HttpError):
+        return False
+    if error.resp.status == 429:
+        return True
+    if error.resp.status != 403:
+        return False
+    try:
+        errors = json.loads(error.content.decode('utf-8'))['error'].get('errors', [])
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return False
+    return any(item.get('reason') in RATE_LIMIT_REASONS for item in errors)
+
+
+def _retry_after(error: Exception) -> float:
+    try:
+        return float(error.resp.get('retry-after', 0))
+    except (TypeError, ValueError, AttributeError):
+        return 0.0
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at rate units per second, holding at most capacity units
+    A caller may take more than is available (a 100 message batch costs more than one second
+    of per-user quota); the bucket goes into debt and later callers wait it off.
+    """
+    
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def reserve(self, units: float) -> float:
+        """Take units and return how many seconds the caller has to wait before using them"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= units
+            return max(0.0, -self._tokens / self.rate)
+
+
+class GmailRateLimiter:
+    """
+    Paces Gmail calls to the per-user and per-project quotas and retries rate limited calls
+    with jittered exponential backoff. Counters are published under gmail.quota.*
+    """
+    
+    def __init__(self, user_units_per_second: float, project_units_per_second: float,
+                 max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 32.0):
+        self.user_units_per_second = user_units_per_second
+        self.project_bucket = TokenBucket(project_units_per_second)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._user_buckets: Dict[Hashable, TokenBucket] = {}
+        self._lock = threading.Lock()
+    
+    def _user_bucket(self, user_key: Hashable) -> TokenBucket:
+        with self._lock:
+            if user_key not in self._user_buckets:
+                self._user_buckets[user_key] = TokenBucket(self.user_units_per_second)
+            return self._user_buckets[user_key]
+    
+    def acquire(self, user_key: Hashable, method: str, count: int = 1):
+        """Block until count calls of method fit in both quotas"""
+        units = QUOTA_UNITS.get(method, 5) * count
+        wait = max(self._user_bucket(user_key).reserve(units), self.project_bucket.reserve(units))
+        metrics.incr('gmail.quota.units', units)
+        metrics.incr(f'gmail.quota.units.{method}', units)
+        if wait > 0:
+            metrics.incr('gmail.quota.throttled')
+            metrics.observe('gmail.quota.wait_seconds', wait)
+            time.sleep(wait)
+    
+    def backoff(self, attempt: int, error: Optional[Exception] = None):
+        """Sleep before retry number attempt, full jitter but never less than Retry-After"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        delay = max(delay, _retry_after(error) if error is not None else 0.0)
+        metrics.incr('gmail.quota.retries')
+        metrics.observe('gmail.quota.backoff_seconds', delay)
+        time.sleep(delay)
+    
+    def call(self, user_key: Hashable, method: str, func: Callable[[], T], count: int = 1) -> T:
+        """Run func within quota, retrying it while Gmail answers with a rate limit error"""
+        attempt = 0
+        while True:
+            self.acquire(user_key, method, count)
+            try:
+                return func()
+            except HttpError as error:
+                if not is_rate_limited(error):
+                    raise
+                metrics.incr('gmail.quota.rate_limited')
+                if attempt >= self.max_retries:
+                    raise
+                self.backoff(attempt, error)
+                attempt += 1
+
+
+_limiter: Optional[GmailRateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> GmailRateLimiter:
+    """Process-wide limiter, all clients of one account share its per-user bucket"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = GmailRateLimiter(
+                settings.GMAIL_USER_QUOTA_PER_SECOND,
+                settings.GMAIL_PROJECT_QUOTA_PER_SECOND,
+                max_retries=settings.GMAIL_RATE_LIMIT_RETRIES,
+                base_delay=settings.GMAIL_BACKOFF_BASE,
+                max_delay=settings.GMAIL_BACKOFF_MAX
+            )
+        return _limiter
@@ -1,13 +1,48 @@
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
 from googleapiclient.errors import HttpError
 from datetime import datetime
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple, Iterator, Callable, Hashable
 import base64
 import email
+from email.message import EmailMessage
 from email.utils import parsedate_to_datetime
-from bs4 import BeautifulSoup
 import re
+import json
+import threading
+from functools import lru_cache
+
+import httplib2
+
+from app.gmail_quota import GmailRateLimiter, get_rate_limiter, is_rate_limited
+from app.mime_parser import extract_bodies, MAX_TEXT_CHARS
+from app.html_text import html_to_text
+from app.list_unsubscribe import parse_list_unsubscribe, find_unsubscribe_link
+
+
+@lru_cache(maxsize=1)
+def _discovery_document() -> Dict:
+    """Gmail v1 discovery document from the copy bundled with google-api-python-client, parsed once"""
+    return json.loads(discovery_cache.get_static_doc('gmail', 'v1'))
+
+
+class HistoryExpiredError(Exception):
+    """Gmail no longer has history for the requested start history ID"""
+
+
+class _NotifyingCredentials(Credentials):
+    """Credentials that report every refresh google-auth does on its own, so the new token can be stored"""
+    
+    def __init__(self, *args, on_refresh: Optional[Callable[[Credentials], None]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._on_refresh = on_refresh
+    
+    def refresh(self, request):
+        super().refresh(request)
+        if self._on_refresh:
+            self._on_refresh(self)
 
 
 class GmailService:
@@ -18,25 +53,54 @@ class GmailService:
         'https://www.googleapis.com/auth/userinfo.profile'
     ]
     
-    def __init__(self, access_token: str, refresh_token: str, client_id: str, client_secret: str):
-        self.credentials = Credentials(
+    # Gmail accepts at most 100 sub-requests per HTTP batch call
+    BATCH_SIZE = 100
+    # and at most 1000 IDs per batchModify call
+    MODIFY_BATCH_SIZE = 1000
+    
+    # Headers and fields a metadata fetch returns, enough to decide whether a message is worth a full fetch
+    METADATA_HEADERS = ['From', 'Subject', 'Auto-Submitted']
+    METADATA_FIELDS = 'id,threadId,labelIds,sizeEstimate,internalDate,payload/headers'
+    
+    def __init__(self, access_token: str, refresh_token: str, client_id: str, client_secret: str,
+                 token_expiry: Optional[datetime] = None,
+                 on_token_refresh: Optional[Callable[[Credentials], None]] = None,
+                 rate_limiter: Optional[GmailRateLimiter] = None, quota_key: Optional[Hashable] = None):
+        self.credentials = _NotifyingCredentials(
             token=access_token,
             refresh_token=refresh_token,
             token_uri="https://oauth2.googleapis.com/token",
             client_id=client_id,
             client_secret=client_secret,
-            scopes=self.SCOPES
+            scopes=self.SCOPES,
+            expiry=token_expiry,
+            on_refresh=on_token_refresh
         )
-        self.service = build('gmail', 'v1', credentials=self.credentials)
+        self.service = build_from_document(_discovery_document(), credentials=self.credentials)
+        self._local = threading.local()
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        # Clients of the same account should pass the same key to share its per-user quota
+        self.quota_key = quota_key if quota_key is not None else id(self)
+    
+    def _http(self) -> AuthorizedHttp:
+        """Per-thread authorized transport, httplib2 connections can't be shared between threads"""
+        if not hasattr(self._local, 'http'):
+            self._local.http = AuthorizedHttp(self.credentials, http=httplib2.Http())
+        return self._local.http
+    
+    def _execute(self, request, method: str):
+        """Execute an API request within quota, retrying it when Gmail rate limits it"""
+        return self.rate_limiter.call(self.quota_key, method, lambda: request.execute(http=self._http()))
     
     def get_user_info(self):
         """Get user profile information"""
         try:
-            profile = self.service.users().getProfile(userId='me').execute()
+            profile = self._execute(self.service.users().getProfile(userId='me'), 'getProfile')
             return {
                 'email': profile['emailAddress'],
                 'messages_total': profile.get('messagesTotal', 0),
-                'threads_total': profile.get('threadsTotal', 0)
+                'threads_total': profile.get('threadsTotal', 0),
+                'history_id': profile.get('historyId')
             }
         except HttpError as error:
             print(f'An error occurred: {error}')
@@ -53,7 +117,7 @@ class GmailService:
             if page_token:
                 params['pageToken'] = page_token
             
-            results = self.service.users().messages().list(**params).execute()
+            results = self._execute(self.service.users().messages().list(**params), 'messages.list')
             return results
         except HttpError as error:
             print(f'An error occurred: {error}')
@@ -62,61 +126,141 @@ class GmailService:
     def get_message(self, message_id: str) -> Optional[Dict]:
         """Get a specific message by ID"""
         try:
-            message = self.service.users().messages().get(
+            message = self._execute(self.service.users().messages().get(
                 userId='me',
                 id=message_id,
                 format='full'
-            ).execute()
+            ), 'messages.get')
             return self._parse_message(message)
         except HttpError as error:
             print(f'An error occurred: {error}')
             return None
     
+    def get_messages_batch(self, message_ids: List[str]) -> Tuple[List[Dict], Dict[str, str]]:
+        """
+        Get and parse messages using Gmail HTTP batch requests
+        Returns (messages, failures) where failures maps message ID to an error
+        """
+        raw_messages, failures = self.get_raw_messages_batch(message_ids)
+        messages = []
+        for raw_message in raw_messages:
+            try:
+                messages.append(self._parse_message(raw_message))
+            except Exception as error:
+                failures[raw_message['id']] = f'Parse error: {error}'
+        return messages, failures
+    
+    def get_metadata_batch(self, message_ids: List[str]) -> Tuple[List[Dict], Dict[str, str]]:
+        """
+        Get labels, size and METADATA_HEADERS of messages, a small fraction of a full fetch
+        Returns (metadata, failures) where failures maps message ID to an error
+        """
+        return self.get_raw_messages_batch(
+            message_ids, format='metadata', metadata_headers=self.METADATA_HEADERS, fields=self.METADATA_FIELDS
+        )
+    
+    def get_raw_messages_batch(self, message_ids: List[str], format: str = 'full',
+                               metadata_headers: Optional[List[str]] = None,
+                               fields: Optional[str] = None) -> Tuple[List[Dict], Dict[str, str]]:
+        """
+        Get unparsed Gmail message resources using HTTP batch requests
+        Returns (raw_messages, failures) where failures maps message ID to an error
+        """
+        message_ids = list(dict.fromkeys(message_ids))
+        params = {'userId': 'me', 'format': format}
+        if metadata_headers:
+            params['metadataHeaders'] = metadata_headers
+        if fields:
+            params['fields'] = fields
+        raw = {}
+        failures = {}
+        throttled = {}
+        
+        def callback(request_id, response, exception):
+            if isinstance(exception, HttpError) and exception.resp.status == 404:
+                # Deleted between listing and fetching, nothing left to import
+                return
+            if is_rate_limited(exception):
+                throttled[request_id] = exception
+                return
+            if exception is not None:
+                failures[request_id] = str(exception)
+                return
+            raw[request_id] = response
+        
+        # Building resource objects is surprisingly expensive, do it once per call
+        messages_resource = self.service.users().messages()
+        for start in range(0, len(message_ids), self.BATCH_SIZE):
+            pending = message_ids[start:start + self.BATCH_SIZE]
+            attempt = 0
+            while pending:
+                batch = self.service.new_batch_http_request(callback=callback)
+                for message_id in pending:
+                    batch.add(messages_resource.get(id=message_id, **params), request_id=message_id)
+                try:
+                    self.rate_limiter.call(
+                        self.quota_key, 'messages.get', lambda: batch.execute(http=self._http()), count=len(pending)
+                    )
+                except Exception as error:
+                    # The batch call itself failed, every message without a response failed with it
+                    for message_id in pending:
+                        if message_id not in raw and message_id not in failures:
+                            failures[message_id] = str(error)
+                    throttled.clear()
+                    break
+                
+                # Sub-requests Gmail rate limited are sent again in a smaller batch
+                pending = list(throttled)
+                if pending and attempt >= self.rate_limiter.max_retries:
+                    failures.update((message_id, str(throttled[message_id])) for message_id in pending)
+                    pending = []
+                elif pending:
+                    self.rate_limiter.backoff(attempt, next(iter(throttled.values())))
+                    attempt += 1
+                throttled.clear()
+        
+        raw_messages = [raw[message_id] for message_id in message_ids if message_id in raw]
+        return raw_messages, failures
+    
+    def get_attachment(self, message_id: str, attachment_id: str) -> str:
+        """Base64url data of a message part Gmail returns by attachmentId (large bodies and attachments)"""
+        attachment = self._execute(self.service.users().messages().attachments().get(
+            userId='me',
+            messageId=message_id,
+            id=attachment_id
+        ), 'messages.attachments.get')
+        return attachment.get('data', '')
+    
+    def send_message(self, to: str, subject: str, body: str) -> Dict:
+        """Send a plain text email from the account"""
+        mime_message = EmailMessage()
+        mime_message['To'] = to
+        mime_message['Subject'] = subject
+        mime_message.set_content(body)
+        raw = base64.urlsafe_b64encode(mime_message.as_bytes()).decode()
+        return self._execute(self.service.users().messages().send(userId='me', body={'raw': raw}), 'messages.send')
+    
+    def parse_message(self, message: Dict) -> Dict:
+        """Parse a raw Gmail message resource"""
+        return self._parse_message(message)
+    
     def _parse_message(self, message: Dict) -> Dict:
         """Parse Gmail message into structured format"""
         headers = {header['name']: header['value'] for header in message['payload'].get('headers', [])}
         
-        # Extract body
-        body_text = ''
-        body_html = ''
-        
-        if 'parts' in message['payload']:
-            for part in message['payload']['parts']:
-                if part['mimeType'] == 'text/plain' and 'data' in part['body']:
-                    body_text += base64.urlsafe_b64decode(part['body']['data']).decode('utf-8', errors='ignore')
-                elif part['mimeType'] == 'text/html' and 'data' in part['body']:
-                    body_html += base64.urlsafe_b64decode(part['body']['data']).decode('utf-8', errors='ignore')
-        elif 'body' in message['payload'] and 'data' in message['payload']['body']:
-            body_data = base64.urlsafe_b64decode(message['payload']['body']['data']).decode('utf-8', errors='ignore')
-            if message['payload']['mimeType'] == 'text/plain':
-                body_text = body_data
-            elif message['payload']['mimeType'] == 'text/html':
-                body_html = body_data
+        # Walk the part tree, bodies Gmail stored as attachments are only fetched if still needed
+        body_text, body_html = extract_bodies(
+            message['payload'],
+            fetch_attachment=lambda attachment_id: self.get_attachment(message['id'], attachment_id)
+        )
         
         # If only HTML, extract text
         if not body_text and body_html:
-            soup = BeautifulSoup(body_html, 'html.parser')
-            body_text = soup.get_text(separator='\n', strip=True)
-        
-        # Extract unsubscribe link
-        unsubscribe_link = None
-        if 'List-Unsubscribe' in headers:
-            match = re.search(r'<(https?://[^>]+)>', headers['List-Unsubscribe'])
-            if match:
-                unsubscribe_link = match.group(1)
+            body_text = html_to_text(body_html)
         
-        # Also search in body
-        if not unsubscribe_link:
-            unsubscribe_patterns = [
-                r'https?://[^\s]+unsubscribe[^\s]*',
-                r'https?://[^\s]+opt-out[^\s]*',
-                r'https?://[^\s]+remove[^\s]*'
-            ]
-            for pattern in unsubscribe_patterns:
-                match = re.search(pattern, body_text, re.IGNORECASE)
-                if match:
-                    unsubscribe_link = match.group(0).rstrip('.,;)')
-                    break
+        # Every unsubscribe method the sender offers, plus a link for the browser fallback
+        unsubscribe_options = parse_list_unsubscribe(headers)
+        unsubscribe_link = find_unsubscribe_link(unsubscribe_options, body_text)
         
         # Parse date
         date_str = headers.get('Date', '')
@@ -137,11 +281,12 @@ class GmailService:
             'sender_email': sender_email,
             'recipient': headers.get('To', ''),
             'received_at': received_at,
-            'body_text': body_text[:50000],  # Limit size
-            'body_html': body_html[:100000] if body_html else None,
+            'body_text': body_text[:MAX_TEXT_CHARS],
+            'body_html': body_html or None,
             'headers': dict(headers),
             'labels': message.get('labelIds', []),
-            'unsubscribe_link': unsubscribe_link
+            'unsubscribe_link': unsubscribe_link,
+            'unsubscribe_options': unsubscribe_options
         }
     
     def _parse_email_address(self, email_str: str) -> tuple:
@@ -154,11 +299,11 @@ class GmailService:
     def archive_message(self, message_id: str) -> bool:
         """Archive a message (remove INBOX label)"""
         try:
-            self.service.users().messages().modify(
+            self._execute(self.service.users().messages().modify(
                 userId='me',
                 id=message_id,
                 body={'removeLabelIds': ['INBOX']}
-            ).execute()
+            ), 'messages.modify')
             return True
         except HttpError as error:
             print(f'An error occurred: {error}')
@@ -167,40 +312,173 @@ class GmailService:
     def delete_message(self, message_id: str) -> bool:
         """Move message to trash"""
         try:
-            self.service.users().messages().trash(
+            self._execute(self.service.users().messages().trash(
                 userId='me',
                 id=message_id
-            ).execute()
+            ), 'messages.trash')
             return True
         except HttpError as error:
             print(f'An error occurred: {error}')
             return False
     
-    def get_new_messages_since(self, history_id: Optional[str] = None) -> List[Dict]:
-        """Get new messages since a specific history ID"""
-        if not history_id:
-            # Get recent messages (last 24 hours)
-            query = 'newer_than:1d'
-            results = self.list_messages(query=query, max_results=100)
-            messages = results.get('messages', [])
-            return [self.get_message(msg['id']) for msg in messages]
-        
-        try:
-            history = self.service.users().history().list(
-                userId='me',
-                startHistoryId=history_id,
-                historyTypes=['messageAdded']
-            ).execute()
+    def modify_labels(self, message_ids: List[str], add_label_ids: Optional[List[str]] = None,
+                      remove_label_ids: Optional[List[str]] = None) -> Dict[str, List[str]]:
+        """
+        Add and remove labels on many messages with batchModify, 1000 IDs per call
+        Returns dict with the succeeded and failed message IDs
+        """
+        messages_resource = self.service.users().messages()
+        succeeded = []
+        failed = []
+        message_ids = list(dict.fromkeys(message_ids))
+        for start in range(0, len(message_ids), self.MODIFY_BATCH_SIZE):
+            chunk = message_ids[start:start + self.MODIFY_BATCH_SIZE]
+            try:
+                self._execute(messages_resource.batchModify(
+                    userId='me',
+                    body={
+                        'ids': chunk,
+                        'addLabelIds': add_label_ids or [],
+                        'removeLabelIds': remove_label_ids or []
+                    }
+                ), 'messages.batchModify')
+                succeeded.extend(chunk)
+            except HttpError as error:
+                print(f'An error occurred: {error}')
+                failed.extend(chunk)
+        return {'succeeded': succeeded, 'failed': failed}
+    
+    def archive_messages(self, message_ids: List[str]) -> Dict[str, List[str]]:
+        """Archive many messages (remove INBOX label)"""
+        return self.modify_labels(message_ids, remove_label_ids=['INBOX'])
+    
+    def trash_messages(self, message_ids: List[str]) -> Dict[str, List[str]]:
+        """Move many messages to trash"""
+        return self.modify_labels(message_ids, add_label_ids=['TRASH'], remove_label_ids=['INBOX'])
+    
+    def list_message_ids(self, query: str = '', limit: int = 100) -> List[str]:
+        """
+        List message IDs matching the query, following pages up to limit
+        Raises HttpError instead of returning a partial list
+        """
+        messages_resource = self.service.users().messages()
+        message_ids = []
+        page_token = None
+        while len(message_ids) < limit:
+            params = {
+                'userId': 'me',
+                'maxResults': min(500, limit - len(message_ids)),
+                'q': query
+            }
+            if page_token:
+                params['pageToken'] = page_token
+            results = self._execute(messages_resource.list(**params), 'messages.list')
+            message_ids.extend(msg['id'] for msg in results.get('messages', []))
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+        return message_ids[:limit]
+    
+    def iter_message_pages(self, query: str = '', page_token: Optional[str] = None,
+                           page_size: int = 500) -> Iterator[Tuple[List[str], Optional[str]]]:
+        """
+        Walk the message list one page at a time, starting at page_token
+        Yields (message_ids, next_page_token); next_page_token is None on the last page
+        """
+        messages_resource = self.service.users().messages()
+        while True:
+            params = {
+                'userId': 'me',
+                'maxResults': min(page_size, 500),
+                'q': query
+            }
+            if page_token:
+                params['pageToken'] = page_token
+            results = self._execute(messages_resource.list(**params), 'messages.list')
+            page_token = results.get('nextPageToken')
+            yield [msg['id'] for msg in results.get('messages', [])], page_token
+            if not page_token:
+                return
+    
+    def list_history(self, start_history_id: str) -> Dict:
+        """
+        Follow every history page since start_history_id
+        Returns dict with the added message IDs and the latest history ID
+        Raises HistoryExpiredError when Gmail reports the start ID as too old
+        """
+        history_resource = self.service.users().history()
+        params = {
+            'userId': 'me',
+            'startHistoryId': start_history_id,
+            'historyTypes': ['messageAdded'],
+            'maxResults': 500
+        }
+        message_ids = []
+        history_id = start_history_id
+        while True:
+            try:
+                history = self._execute(history_resource.list(**params), 'history.list')
+            except HttpError as error:
+                if error.resp.status == 404:
+                    raise HistoryExpiredError(start_history_id) from error
+                raise
             
-            messages = []
             for record in history.get('history', []):
                 for message_added in record.get('messagesAdded', []):
-                    msg = self.get_message(message_added['message']['id'])
-                    if msg:
-                        messages.append(msg)
+                    message_ids.append(message_added['message']['id'])
             
-            return messages
+            history_id = history.get('historyId', history_id)
+            if not history.get('nextPageToken'):
+                break
+            params['pageToken'] = history['nextPageToken']
+        
+        return {
+            'message_ids': list(dict.fromkeys(message_ids)),
+            'history_id': history_id
+        }
+    
+    def get_sync_changes(self, history_id: Optional[str] = None, resync_query: str = 'newer_than:1d',
+                         resync_max_messages: int = 100) -> Dict:
+        """
+        Get messages added since history_id
+        Falls back to a bounded resync (resync_query, at most resync_max_messages)
+        when there is no history ID yet or Gmail has expired it.
+        Returns dict with the message IDs, the new history_id and whether it was a full sync
+        """
+        full_sync = not history_id
+        new_history_id = None
+        message_ids = []
+        
+        if history_id:
+            try:
+                history = self.list_history(history_id)
+                message_ids = history['message_ids']
+                new_history_id = history['history_id']
+            except HistoryExpiredError:
+                print(f'History ID {history_id} expired, falling back to full resync')
+                full_sync = True
+        
+        if full_sync:
+            # Read the history ID before listing so mail arriving meanwhile is picked up next sync
+            profile = self.get_user_info()
+            new_history_id = profile['history_id'] if profile else None
+            message_ids = self.list_message_ids(query=resync_query, limit=resync_max_messages)
+        
+        return {
+            'message_ids': message_ids,
+            'history_id': new_history_id,
+            'full_sync': full_sync
+        }
+    
+    def get_new_messages_since(self, history_id: Optional[str] = None) -> List[Dict]:
+        """Get new messages since a specific history ID"""
+        try:
+            changes = self.get_sync_changes(history_id)
         except HttpError as error:
             print(f'An error occurred: {error}')
             return []
-
+        
+        messages, failures = self.get_messages_batch(changes['message_ids'])
+        for message_id, error in failures.items():
+            print(f'Failed to fetch message {message_id}: {error}')
+        return messages
@@ -0,0 +1,148 @@
+from html.parser import HTMLParser
+from typing import Callable, Dict, List, Optional
+import re
+
+from bs4 import BeautifulSoup, NavigableString
+
+from app.config import settings
+
+# Never rendered as text
+SKIP_TAGS = {'style', 'script', 'head', 'title', 'noscript', 'template', 'svg', 'object'}
+# Start a new line in the extracted text
+BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'br', 'center', 'dd', 'div', 'dl', 'dt', 'fieldset',
+    'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr',
+    'li', 'main', 'nav', 'ol', 'p', 'pre', 'section', 'table', 'td', 'th', 'tr', 'ul'
+}
+VOID_TAGS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source',
+    'track', 'wbr'
+}
+
+# Inline styles email templates use to hide preheaders and tracking blocks
+_HIDDEN_STYLE_RE = re.compile(
+    r'display\s*:\s*none|visibility\s*:\s*hidden|mso-hide\s*:\s*all|max-height\s*:\s*0(?![.\d])'
+    r'|font-size\s*:\s*0(?![.\d])|opacity\s*:\s*0(?![.\d]*[1-9])',
+    re.IGNORECASE
+)
+_HIDDEN_CLASS_RE = re.compile(r'preheader|preview-?text', re.IGNORECASE)
+# Zero-width and soft hyphen characters used to pad preheaders
+_INVISIBLE_RE = re.compile('[\u00ad\u034f\u200b-\u200f\u2060\ufeff]')
+_SPACES_RE = re.compile(r'[ \t\r\f\v\u00a0]+')
+
+
+def is_hidden(attrs: Dict[str, Optional[str]]) -> bool:
+    """Whether an element's attributes hide it from the reader"""
+    if 'hidden' in attrs or attrs.get('aria-hidden') == 'true':
+        return True
+    if _HIDDEN_STYLE_RE.search(attrs.get('style') or ''):
+        return True
+    return bool(_HIDDEN_CLASS_RE.search(attrs.get('class') or ''))
+
+
+def _normalize(text: str) -> str:
+    """Collapse runs of spaces, strip lines and drop empty ones"""
+    text = _INVISIBLE_RE.sub('', text)
+    lines = (_SPACES_RE.sub(' ', line).strip() for line in text.split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+
+class _TextCollector(HTMLParser):
+    """Single pass over the markup that keeps visible text and never builds a tree"""
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.chunks: List[str] = []
+        # Tags opened inside a skipped or hidden element, closed again by name so
+        # unclosed <p>/<td> tags in there don't leave the rest of the document hidden
+        self._hidden: List[str] = []
+    
+    def handle_starttag(self, tag, attrs):
+        # Self-closing tags come through here too, HTMLParser follows them with handle_endtag
+        if self._hidden:
+            if tag not in VOID_TAGS:
+                self._hidden.append(tag)
+            return
+        if tag in SKIP_TAGS or (attrs and is_hidden(dict(attrs))):
+            # A hidden void element has no content to hide
+            if tag not in VOID_TAGS:
+                self._hidden.append(tag)
+            return
+        if tag in BLOCK_TAGS:
+            self.chunks.append('\n')
+        elif tag == 'img':
+            alt = dict(attrs).get('alt')
+            if alt:
+                self.chunks.append(f' {alt} ')
+    
+    def handle_endtag(self, tag):
+        if self._hidden:
+            if tag in self._hidden:
+                while self._hidden.pop() != tag:
+                    pass
+            return
+        if tag in BLOCK_TAGS:
+            self.chunks.append('\n')
+    
+    def handle_data(self, data):
+        if not self._hidden:
+            self.chunks.append(data)
+
+
+def streaming_html_to_text(html: str) -> str:
+    """Visible text of an HTML document, without style/script blocks or hidden preheaders"""
+    collector = _TextCollector()
+    collector.feed(html)
+    collector.close()
+    return _normalize(''.join(collector.chunks))
+
+
+def soup_html_to_text(html: str) -> str:
+    """The same filtering on a BeautifulSoup tree, slower and heavier but more forgiving of broken markup"""
+    soup = BeautifulSoup(html, 'html.parser')
+    for element in soup.find_all(SKIP_TAGS):
+        element.decompose()
+    for element in soup.find_all(lambda tag: tag.attrs and is_hidden({
+        name: ' '.join(value) if isinstance(value, list) else value for name, value in tag.attrs.items()
+    })):
+        element.decompose()
+    
+    chunks = []
+    # Nodes that directly follow the end of a block element
+    after_block = set()
+    for node in soup.descendants:
+        if id(node) in after_block:
+            chunks.append('\n')
+        if type(node) is NavigableString:
+            chunks.append(node)
+        elif getattr(node, 'name', None) == 'img':
+            if node.get('alt'):
+                chunks.append(f" {node['alt']} ")
+        elif getattr(node, 'name', None) in BLOCK_TAGS:
+            chunks.append('\n')
+            if node.next_sibling is not None:
+                after_block.add(id(node.next_sibling))
+    return _normalize(''.join(chunks))
+
+
+EXTRACTORS: Dict[str, Callable[[str], str]] = {
+    'streaming': streaming_html_to_text,
+    'beautifulsoup': soup_html_to_text,
+}
+
+
+def register_extractor(name: str, extractor: Callable[[str], str]):
+    """Make an extractor selectable with HTML_TEXT_EXTRACTOR"""
+    EXTRACTORS[name] = extractor
+
+
+def html_to_text(html: str, extractor: Optional[str] = None) -> str:
+    """Plain text of an HTML body with the configured extractor, falling back to BeautifulSoup"""
+    extract = EXTRACTORS[extractor or settings.HTML_TEXT_EXTRACTOR]
+    try:
+        return extract(html)
+    except Exception as e:
+        if extract is soup_html_to_text:
+            raise
+        print(f"HTML extractor failed, falling back to BeautifulSoup: {e}")
+        return soup_html_to_text(html)
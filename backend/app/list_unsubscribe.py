@@ -0,0 +1,79 @@
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+import re
+
+import httpx
+
+# Body of an RFC 8058 one-click unsubscribe POST, and the header value announcing support for it
+ONE_CLICK_BODY = 'List-Unsubscribe=One-Click'
+
+_BRACKETED_RE = re.compile(r'<\s*([^>]+?)\s*>')
+_BODY_LINK_PATTERNS = [
+    re.compile(r'https?://[^\s]+unsubscribe[^\s]*', re.IGNORECASE),
+    re.compile(r'https?://[^\s]+opt-out[^\s]*', re.IGNORECASE),
+    re.compile(r'https?://[^\s]+remove[^\s]*', re.IGNORECASE),
+]
+
+
+def parse_list_unsubscribe(headers: Dict[str, str]) -> Dict:
+    """
+    Everything List-Unsubscribe (RFC 2369) and List-Unsubscribe-Post (RFC 8058) offer
+    Returns {'http': [urls], 'mailto': [mailto URIs], 'one_click': bool}; one_click is only
+    set when the sender also lists an https URL to POST to.
+    """
+    lowered = {name.lower(): value for name, value in (headers or {}).items()}
+    http_urls: List[str] = []
+    mailtos: List[str] = []
+    for uri in _BRACKETED_RE.findall(lowered.get('list-unsubscribe', '')):
+        scheme = uri.split(':', 1)[0].lower()
+        if scheme in ('http', 'https'):
+            http_urls.append(uri)
+        elif scheme == 'mailto':
+            mailtos.append(uri)
+    
+    post = lowered.get('list-unsubscribe-post', '')
+    one_click = (
+        post.replace(' ', '').lower() == ONE_CLICK_BODY.lower()
+        and any(url.lower().startswith('https://') for url in http_urls)
+    )
+    return {'http': http_urls, 'mailto': mailtos, 'one_click': one_click}
+
+
+def find_unsubscribe_link(options: Dict, body_text: str) -> Optional[str]:
+    """The link a person (or the browser agent) would follow, from the header or else the body"""
+    if options['http']:
+        return options['http'][0]
+    for pattern in _BODY_LINK_PATTERNS:
+        match = pattern.search(body_text or '')
+        if match:
+            return match.group(0).rstrip('.,;)')
+    return None
+
+
+def parse_mailto(uri: str) -> Dict[str, str]:
+    """Address, subject and body of a mailto: URI (RFC 6068)"""
+    parts = urlsplit(uri)
+    query = parse_qs(parts.query)
+    return {
+        'to': unquote(parts.path),
+        'subject': query.get('subject', ['unsubscribe'])[0],
+        'body': query.get('body', ['unsubscribe'])[0]
+    }
+
+
+async def one_click_unsubscribe(client: httpx.AsyncClient, url: str) -> Dict:
+    """
+    RFC 8058 one-click unsubscribe: a single POST, no cookies and no redirects followed
+    """
+    try:
+        response = await client.post(
+            url,
+            content=ONE_CLICK_BODY,
+            headers={'Content-Type': 'application/x-www-form-urlencoded'},
+            follow_redirects=False
+        )
+    except httpx.HTTPError as e:
+        return {"success": False, "message": f"One-click request failed: {e}"}
+    if 200 <= response.status_code < 300:
+        return {"success": True, "message": "Unsubscribed with one-click POST"}
+    return {"success": False, "message": f"One-click request returned {response.status_code}"}
@@ -0,0 +1,143 @@
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+import math
+import re
+import threading
+import zlib
+
+import numpy as np
+
+from app.ai_cache import category_fingerprint
+from app.config import settings
+from app.metrics import metrics
+
+# Hashed feature space, collisions are rare at the vocabulary size of a few emails
+DIMENSIONS = 2 ** 14
+# Body characters that go into an email's vector
+BODY_CHARS = 2000
+
+_WORD_RE = re.compile(r'[^\W\d_]{2,}')
+STOPWORDS = frozenset('''
+a an and are as at be been but by can do for from has have here how i if in into is it its just me more my
+no not of on or our out so than that the their them then there these this to too up us was we were what
+when which who will with you your yours all any about after also get new now only other over some such
+'''.split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased words without stopwords, plural "s" stripped so receipts matches receipt"""
+    tokens = []
+    for word in _WORD_RE.findall((text or '').lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def _email_tokens(email_data: Dict) -> List[str]:
+    # The subject says the most about what an email is, count it twice
+    subject = tokenize(email_data.get('subject', ''))
+    return (
+        subject + subject
+        + tokenize(email_data.get('sender', ''))
+        + tokenize((email_data.get('body_text') or '')[:BODY_CHARS])
+    )
+
+
+class CategoryIndex:
+    """
+    Hashed TF-IDF vectors of one user's categories (name and description)
+    IDF comes from the categories themselves, so words every category shares count for little.
+    Emails are scored against all categories at once with a cosine similarity matrix product.
+    """
+    
+    def __init__(self, categories: List[Dict]):
+        self.category_ids = [cat['id'] for cat in categories]
+        documents = [tokenize(f"{cat['name']} {cat['name']} {cat.get('description') or ''}") for cat in categories]
+        document_frequency = Counter(term for document in documents for term in set(document))
+        count = len(documents)
+        self.idf = {term: math.log((1 + count) / (1 + df)) + 1 for term, df in document_frequency.items()}
+        # Words no category uses still make an email less similar to all of them
+        self.unseen_idf = math.log(1 + count) + 1
+        self.matrix = self._normalize(np.vstack([self._vector(document) for document in documents]))
+    
+    def _vector(self, tokens: List[str]) -> np.ndarray:
+        vector = np.zeros(DIMENSIONS, dtype=np.float32)
+        for term, occurrences in Counter(tokens).items():
+            digest = zlib.crc32(term.encode('utf-8'))
+            # Signed hashing, so colliding terms cancel out instead of piling up
+            sign = 1.0 if digest & 0x80000000 else -1.0
+            vector[digest % DIMENSIONS] += sign * (1 + math.log(occurrences)) * self.idf.get(term, self.unseen_idf)
+        return vector
+    
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+    
+    def scores(self, emails: List[Dict]) -> np.ndarray:
+        """Cosine similarity of every email (rows) to every category (columns)"""
+        vectors = self._normalize(np.vstack([self._vector(_email_tokens(email_data)) for email_data in emails]))
+        return vectors @ self.matrix.T
+    
+    def classify(self, emails: List[Dict], margin: float, min_score: float) -> List[Optional[int]]:
+        """
+        Category ID per email when the best category beats the runner-up by at least margin
+        (and scores at least min_score), None where the LLM should decide
+        """
+        if not emails or not self.category_ids:
+            return [None] * len(emails)
+        scores = self.scores(emails)
+        if scores.shape[1] > 1:
+            top2 = np.partition(scores, -2, axis=1)[:, -2:]
+            best, runner_up = top2[:, 1], top2[:, 0]
+        else:
+            best, runner_up = scores[:, 0], np.zeros(len(emails))
+        winners = scores.argmax(axis=1)
+        confident = (best - runner_up >= margin) & (best >= min_score)
+        return [self.category_ids[winner] if ok else None for winner, ok in zip(winners, confident)]
+
+
+_indexes: 'OrderedDict[frozenset, Tuple[str, CategoryIndex]]' = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_category_index(categories: List[Dict]) -> CategoryIndex:
+    """
+    The index of a user's categories, rebuilt only when one of them changes
+    Category IDs belong to one user, so their set identifies the user's entry.
+    """
+    key = frozenset(cat['id'] for cat in categories)
+    fingerprint = category_fingerprint(categories)
+    with _indexes_lock:
+        entry = _indexes.get(key)
+        if entry and entry[0] == fingerprint:
+            _indexes.move_to_end(key)
+            return entry[1]
+    
+    index = CategoryIndex(categories)
+    metrics.incr('ai.local.index_builds')
+    with _indexes_lock:
+        _indexes[key] = (fingerprint, index)
+        _indexes.move_to_end(key)
+        while len(_indexes) > settings.LOCAL_CLASSIFIER_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
+
+
+def classify_locally(emails: List[Dict], categories: List[Dict]) -> List[Optional[int]]:
+    """
+    Categories the local classifier is sure about, None for emails the LLM should categorize
+    Never decides that no category fits, that is left to the LLM.
+    """
+    if not settings.LOCAL_CLASSIFIER_ENABLED or not categories or not emails:
+        return [None] * len(emails)
+    results = get_category_index(categories).classify(
+        emails, settings.LOCAL_CLASSIFIER_MARGIN, settings.LOCAL_CLASSIFIER_MIN_SCORE
+    )
+    resolved = sum(1 for category_id in results if category_id is not None)
+    metrics.incr('ai.local.resolved', resolved)
+    metrics.incr('ai.local.deferred', len(results) - resolved)
+    return results
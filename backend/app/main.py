@@ -1,8 +1,9 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.database import Base, engine
-from app.routers import auth, categories, emails, accounts
+from app.routers import auth, categories, emails, accounts, jobs
 from app.config import settings
+from app.metrics import metrics
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
@@ -23,6 +24,7 @@ app.include_router(auth.router)
 app.include_router(categories.router)
 app.include_router(emails.router)
 app.include_router(accounts.router)
+app.include_router(jobs.router)
 
 
 @app.get("/")
@@ -34,3 +36,7 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+
+@app.get("/metrics")
+async def get_metrics():
+    return metrics.snapshot()
@@ -0,0 +1,52 @@
+from collections import defaultdict
+from typing import Dict
+import threading
+
+
+class Metrics:
+    """
+    Thread-safe in-process counters, gauges and timers
+    Exposed as JSON on GET /metrics
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._gauges: Dict[str, float] = {}
+        self._timers: Dict[str, Dict[str, float]] = {}
+    
+    def incr(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] += value
+    
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+    
+    def observe(self, name: str, seconds: float):
+        """Record a duration"""
+        with self._lock:
+            timer = self._timers.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+            timer['count'] += 1
+            timer['total'] += seconds
+            timer['max'] = max(timer['max'], seconds)
+    
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'counters': dict(self._counters),
+                'gauges': dict(self._gauges),
+                'timers': {
+                    name: {**timer, 'avg': timer['total'] / timer['count'] if timer['count'] else 0.0}
+                    for name, timer in self._timers.items()
+                }
+            }
+    
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._timers.clear()
+
+
+metrics = Metrics()
@@ -0,0 +1,96 @@
+from typing import Callable, Dict, List, Optional, Tuple
+import base64
+import codecs
+import re
+
+# Characters of body text and HTML kept per message
+MAX_TEXT_CHARS = 50000
+MAX_HTML_CHARS = 100000
+
+_CHARSET_RE = re.compile(r'charset\s*=\s*"?([^";\s]+)', re.IGNORECASE)
+
+# Labels mail clients use that Python has no codec for, or whose superset decodes more mail correctly
+_CHARSET_ALIASES = {
+    'gb2312': 'gb18030',
+    'gbk': 'gb18030',
+    'ks_c_5601-1987': 'cp949',
+    'x-sjis': 'shift_jis',
+    'iso-8859-8-i': 'iso-8859-8',
+    'windows-874': 'cp874',
+    'us-ascii': 'utf-8',
+    'ascii': 'utf-8',
+    'x-unknown': 'utf-8',
+    'unknown-8bit': 'utf-8',
+}
+
+
+def _part_headers(part: Dict) -> Dict[str, str]:
+    return {header['name'].lower(): header['value'] for header in part.get('headers', [])}
+
+
+def part_charset(part: Dict) -> str:
+    """Python codec for a part's declared charset, utf-8 when it is missing or unknown"""
+    match = _CHARSET_RE.search(_part_headers(part).get('content-type', ''))
+    if not match:
+        return 'utf-8'
+    charset = match.group(1).strip("'").lower()
+    charset = _CHARSET_ALIASES.get(charset, charset)
+    try:
+        return codecs.lookup(charset).name
+    except LookupError:
+        return 'utf-8'
+
+
+def decode_base64url(data: str, max_bytes: Optional[int] = None) -> bytes:
+    """Decode Gmail's base64url body data, only as much as needed for max_bytes"""
+    if max_bytes is not None and len(data) > (max_bytes + 2) // 3 * 4:
+        # Decoding a 4 character aligned prefix avoids decoding (and holding) the whole body
+        data = data[:(max_bytes + 2) // 3 * 4]
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def _is_attachment(part: Dict) -> bool:
+    disposition = _part_headers(part).get('content-disposition', '').lower()
+    return disposition.startswith('attachment') or bool(part.get('filename'))
+
+
+def extract_bodies(payload: Dict, fetch_attachment: Optional[Callable[[str], str]] = None,
+                   max_text: int = MAX_TEXT_CHARS, max_html: int = MAX_HTML_CHARS) -> Tuple[str, str]:
+    """
+    Collect the text/plain and text/html bodies of a Gmail message payload
+    Walks the whole part tree (nested multiparts, forwarded messages) depth first without
+    recursion, decodes each part with its declared charset and stops decoding once both
+    caps are reached. Bodies Gmail only references by attachmentId are fetched through
+    fetch_attachment, and only while the cap for their type is not yet reached.
+    Returns (text, html), each at most max_text/max_html characters.
+    """
+    remaining = {'text/plain': max_text, 'text/html': max_html}
+    out: Dict[str, List[str]] = {'text/plain': [], 'text/html': []}
+    
+    stack = [payload]
+    while stack and (remaining['text/plain'] > 0 or remaining['text/html'] > 0):
+        part = stack.pop()
+        mime_type = part.get('mimeType', '').lower()
+        
+        if part.get('parts'):
+            # Reversed so parts come off the stack in document order
+            stack.extend(reversed(part['parts']))
+            continue
+        
+        if mime_type not in remaining or remaining[mime_type] <= 0 or _is_attachment(part):
+            continue
+        
+        body = part.get('body', {})
+        data = body.get('data')
+        if data is None and body.get('attachmentId') and fetch_attachment:
+            data = fetch_attachment(body['attachmentId'])
+        if not data:
+            continue
+        
+        # No supported charset takes more than 4 bytes per character
+        raw = decode_base64url(data, max_bytes=remaining[mime_type] * 4)
+        decoded = raw.decode(part_charset(part), errors='replace')[:remaining[mime_type]]
+        out[mime_type].append(decoded)
+        remaining[mime_type] -= len(decoded)
+    
+    return ''.join(out['text/plain']), ''.join(out['text/html'])
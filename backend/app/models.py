@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, JSON
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, JSON, LargeBinary, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -30,9 +30,12 @@ class GmailAccount(Base):
     history_id = Column(String, nullable=True)  # For Gmail push notifications
     created_at = Column(DateTime, default=datetime.utcnow)
     last_synced = Column(DateTime, nullable=True)
+    backfill_page_token = Column(String, nullable=True)  # Resume point of an interrupted backfill
+    backfill_completed_at = Column(DateTime, nullable=True)
     
     user = relationship("User", back_populates="gmail_accounts")
     emails = relationship("Email", back_populates="gmail_account", cascade="all, delete-orphan")
+    sync_failures = relationship("SyncFailure", cascade="all, delete-orphan")
 
 
 class Category(Base):
@@ -69,8 +72,55 @@ class Email(Base):
     is_archived = Column(Boolean, default=False)
     is_deleted = Column(Boolean, default=False)
     unsubscribe_link = Column(String, nullable=True)
+    unsubscribe_options = Column(JSON, nullable=True)  # List-Unsubscribe http/mailto URIs and one-click support
     created_at = Column(DateTime, default=datetime.utcnow)
     
     gmail_account = relationship("GmailAccount", back_populates="emails")
     category = relationship("Category", back_populates="emails")
 
+
+
+class AIResult(Base):
+    """Cached categorization or summary, keyed by a hash of the email content (see app.ai_cache)"""
+    __tablename__ = "ai_results"
+    
+    key = Column(String, primary_key=True)
+    value = Column(JSON)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, index=True)
+
+
+class SenderAffinity(Base):
+    """How many of a user's emails from a sender (or an @domain) went to each category, see app.sender_affinity"""
+    __tablename__ = "sender_affinities"
+    __table_args__ = (UniqueConstraint("user_id", "sender", "category_id", name="uq_sender_affinity"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    sender = Column(String)  # Lowercased address, or "@domain"
+    category_id = Column(Integer)  # 0 when no category matched
+    count = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class SyncFailure(Base):
+    """A message that failed to import, retried by later syncs until SYNC_MAX_MESSAGE_ATTEMPTS"""
+    __tablename__ = "sync_failures"
+    __table_args__ = (UniqueConstraint("gmail_account_id", "gmail_message_id", name="uq_sync_failure"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    gmail_account_id = Column(Integer, ForeignKey("gmail_accounts.id"), index=True)
+    gmail_message_id = Column(String)
+    attempts = Column(Integer, default=0)
+    error = Column(Text)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class UserClassifier(Base):
+    """A user's naive Bayes category model, learned from their emails, see app.online_classifier"""
+    __tablename__ = "user_classifiers"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    state = Column(LargeBinary)  # zlib-compressed JSON of the per-category counts
+    email_count = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,204 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+import json
+import math
+import zlib
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.local_classifier import tokenize
+from app.metrics import metrics
+from app.models import Email, GmailAccount, UserClassifier
+from app.sender_affinity import NO_CATEGORY
+
+# Hashed feature space, large enough that a mailbox's vocabulary rarely collides
+FEATURE_BITS = 20
+# Body characters that contribute features
+BODY_CHARS = 2000
+
+
+def email_features(email_data: Dict) -> List[int]:
+    """Hashed features of an email: subject and body words, sender address and domain, each counted once"""
+    address = (email_data.get('sender_email') or '').strip().lower()
+    names = {f's:{word}' for word in tokenize(email_data.get('subject', ''))}
+    names.update(f'b:{word}' for word in tokenize((email_data.get('body_text') or '')[:BODY_CHARS]))
+    if '@' in address:
+        names.add(f'from:{address}')
+        names.add(f"from:@{address.rsplit('@', 1)[1]}")
+    return sorted({zlib.crc32(name.encode('utf-8')) >> (32 - FEATURE_BITS) for name in names})
+
+
+class NaiveBayes:
+    """
+    Multinomial naive Bayes over hashed email features, learned one email at a time
+    Per category it keeps the number of emails, the number of features and a sparse count per
+    feature, so learning is a few dict increments and models of two imports can be added up.
+    Category NO_CATEGORY stands for emails that matched none of the user's categories.
+    """
+    
+    def __init__(self, classes: Optional[Dict[int, list]] = None):
+        # category_id -> [emails, feature total, {feature: count}]
+        self.classes: Dict[int, list] = classes if classes is not None else {}
+        self._vocabulary: Optional[int] = None
+    
+    @property
+    def email_count(self) -> int:
+        return sum(state[0] for state in self.classes.values())
+    
+    def learn(self, features: Iterable[int], category_id: Optional[int]):
+        state = self.classes.setdefault(category_id or NO_CATEGORY, [0, 0, {}])
+        counts = state[2]
+        state[0] += 1
+        for feature in features:
+            counts[feature] = counts.get(feature, 0) + 1
+            state[1] += 1
+        self._vocabulary = None
+    
+    def merge(self, other: 'NaiveBayes'):
+        """Add another model's counts to this one"""
+        for category_id, (emails, total, counts) in other.classes.items():
+            state = self.classes.setdefault(category_id, [0, 0, {}])
+            state[0] += emails
+            state[1] += total
+            for feature, count in counts.items():
+                state[2][feature] = state[2].get(feature, 0) + count
+        self._vocabulary = None
+    
+    def forget(self, category_id: int):
+        self.classes.pop(category_id, None)
+        self._vocabulary = None
+    
+    def _vocabulary_size(self) -> int:
+        if self._vocabulary is None:
+            self._vocabulary = len(set().union(*(state[2] for state in self.classes.values())))
+        return self._vocabulary
+    
+    def predict(self, features: List[int]) -> Tuple[Optional[int], float]:
+        """
+        (category_id, probability) of the most likely category, NO_CATEGORY for no match
+        The probability is tempered by the number of features, raw naive Bayes posteriors are
+        close to 1 for almost any email long enough.
+        """
+        if not self.classes or not features:
+            return None, 0.0
+        alpha = settings.ONLINE_CLASSIFIER_SMOOTHING
+        vocabulary = self._vocabulary_size() + 1
+        emails = self.email_count
+        scores = {}
+        for category_id, (class_emails, total, counts) in self.classes.items():
+            denominator = math.log(total + alpha * vocabulary)
+            likelihood = sum(math.log(counts.get(feature, 0) + alpha) - denominator for feature in features)
+            scores[category_id] = math.log(class_emails / emails) + likelihood / math.sqrt(len(features))
+        best = max(scores, key=scores.get)
+        normalizer = sum(math.exp(score - scores[best]) for score in scores.values())
+        return best, 1 / normalizer
+    
+    def to_bytes(self) -> bytes:
+        return zlib.compress(json.dumps({
+            str(category_id): [emails, total, list(counts.keys()), list(counts.values())]
+            for category_id, (emails, total, counts) in self.classes.items()
+        }, separators=(',', ':')).encode('utf-8'))
+    
+    @classmethod
+    def from_bytes(cls, data: Optional[bytes]) -> 'NaiveBayes':
+        if not data:
+            return cls()
+        return cls({
+            int(category_id): [emails, total, dict(zip(features, counts))]
+            for category_id, (emails, total, features, counts) in json.loads(zlib.decompress(data)).items()
+        })
+
+
+def classify(model: NaiveBayes, email_data: Dict) -> Optional[int]:
+    """Category ID (NO_CATEGORY for no match) when the model is confident about the email, otherwise None"""
+    if model.email_count < settings.ONLINE_CLASSIFIER_MIN_EMAILS:
+        return None
+    category_id, probability = model.predict(email_features(email_data))
+    return category_id if probability >= settings.ONLINE_CLASSIFIER_MIN_CONFIDENCE else None
+
+
+def _bootstrap(db: Session, user_id: int) -> NaiveBayes:
+    """A model of the user's most recent stored emails that have a category"""
+    model = NaiveBayes()
+    rows = db.query(
+        Email.subject, Email.sender_email, func.substr(Email.body_text, 1, BODY_CHARS), Email.category_id
+    ).join(GmailAccount).filter(
+        GmailAccount.user_id == user_id,
+        Email.category_id.isnot(None)
+    ).order_by(Email.received_at.desc()).limit(settings.ONLINE_CLASSIFIER_BOOTSTRAP_EMAILS)
+    for subject, sender_email, body_text, category_id in rows:
+        model.learn(email_features({'subject': subject, 'sender_email': sender_email, 'body_text': body_text}), category_id)
+    metrics.incr('online_classifier.bootstraps')
+    return model
+
+
+def load_classifier(db: Session, user_id: int) -> NaiveBayes:
+    """
+    The user's model as stored, trained first from their stored emails if they have none yet
+    A new model is committed right away so concurrent syncs of the user's accounts share it.
+    """
+    row = db.get(UserClassifier, user_id)
+    if row is not None:
+        return NaiveBayes.from_bytes(row.state)
+    
+    model = _bootstrap(db, user_id)
+    db.add(UserClassifier(user_id=user_id, state=model.to_bytes(), email_count=model.email_count,
+                          updated_at=datetime.utcnow()))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another account of the user stored one first, both came from the same emails
+        db.rollback()
+    return model
+
+
+def _update(db: Session, user_id: int, change):
+    """Apply change to the stored model under a row lock, so concurrent syncs don't lose each other's counts"""
+    row = db.query(UserClassifier).filter(UserClassifier.user_id == user_id).with_for_update().first()
+    if row is None:
+        row = UserClassifier(user_id=user_id)
+        db.add(row)
+    model = NaiveBayes.from_bytes(row.state)
+    change(model)
+    row.state = model.to_bytes()
+    row.email_count = model.email_count
+    row.updated_at = datetime.utcnow()
+    db.flush()
+
+
+def record_emails(db: Session, user_id: int, examples: Iterable[Tuple[List[int], Optional[int]]]):
+    """
+    Learn (email_features, category_id) examples, category_id None for no match
+    Flushes in the caller's transaction.
+    """
+    delta = NaiveBayes()
+    for features, category_id in examples:
+        delta.learn(features, category_id)
+    if not delta.classes:
+        return
+    _update(db, user_id, lambda model: model.merge(delta))
+    metrics.incr('online_classifier.learned', delta.email_count)
+
+
+def expire_category(db: Session, user_id: int, category_id: int):
+    """
+    Forget a category whose meaning changed or that is gone, it is learned again from new emails
+    So is "no match": emails that matched nothing before may match the changed category.
+    """
+    def forget(model: NaiveBayes):
+        model.forget(category_id)
+        model.forget(NO_CATEGORY)
+    
+    if db.query(UserClassifier.user_id).filter(UserClassifier.user_id == user_id).first():
+        _update(db, user_id, forget)
+
+
+def reset_user(db: Session, user_id: int):
+    """
+    Start the user's model over, e.g. once a new category could be the better fit for any email
+    An empty model is kept rather than none, so it isn't trained again from the old decisions.
+    """
+    _update(db, user_id, lambda model: model.classes.clear())
@@ -0,0 +1,183 @@
+from typing import Dict, List, Optional
+import threading
+
+from app.body_cleaner import clean_body
+from app.config import settings
+
+try:
+    import tiktoken
+except ImportError:  # Token counts are estimated without it
+    tiktoken = None
+
+MODEL = "gpt-4o-mini"
+# gpt-4o-mini's tokenizer
+ENCODING = "o200k_base"
+# Upper bound of characters per token, limits how much text is tokenized to truncate it
+MAX_CHARS_PER_TOKEN = 10
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """The model's tokenizer, None without tiktoken or when its vocabulary can't be loaded"""
+    global _encoding, _encoding_loaded
+    with _encoding_lock:
+        if not _encoding_loaded:
+            _encoding_loaded = True
+            if tiktoken is None:
+                print("tiktoken is not installed, estimating token counts")
+            else:
+                try:
+                    # Downloaded on first use unless TIKTOKEN_CACHE_DIR already has it (the
+                    # backend image bakes it in, see Dockerfile.backend)
+                    _encoding = tiktoken.get_encoding(ENCODING)
+                except Exception as e:
+                    print(f"Error loading tokenizer, estimating token counts: {e}")
+        return _encoding
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count, about four characters per token for English text"""
+    return len(text) // 4 + 1
+
+
+def count_tokens(text: str) -> int:
+    """Token count by the model's tokenizer, estimated when it isn't available"""
+    encoding = _get_encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: Optional[str], max_tokens: int) -> str:
+    """The start of text that fits in max_tokens"""
+    text = text or ''
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text[:max_tokens * MAX_CHARS_PER_TOKEN], disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text[:max_tokens * MAX_CHARS_PER_TOKEN]
+    return encoding.decode(tokens[:max_tokens])
+
+
+def prompt_tokens(request: Dict) -> int:
+    """Prompt tokens of a chat completion request"""
+    return sum(count_tokens(message['content']) for message in request['messages'])
+
+
+def prompt_body(body_text: Optional[str], body_tokens: int) -> str:
+    """What a prompt includes of a body: cleaned up (see app.body_cleaner), then at most body_tokens of it"""
+    if settings.AI_CLEAN_BODY:
+        body_text = clean_body(body_text)
+    return truncate_tokens(body_text, body_tokens)
+
+
+def email_text(email_data: Dict, body_tokens: int) -> str:
+    """Subject, sender and the start of the body, at most body_tokens of it"""
+    return (
+        f"Subject: {email_data.get('subject', '')}\n"
+        f"From: {email_data.get('sender', '')} <{email_data.get('sender_email', '')}>\n"
+        f"Body: {prompt_body(email_data.get('body_text'), body_tokens)}"
+    )
+
+
+def categories_text(categories: List[Dict]) -> str:
+    """One line per category, in ID order so the text only changes when a category does"""
+    return "\n".join([
+        f"ID: {cat['id']}, Name: {cat['name']}, Description: {cat['description']}"
+        for cat in sorted(categories, key=lambda cat: cat['id'])
+    ])
+
+
+def _categorizer_prompt(categories: List[Dict], task: str) -> str:
+    """
+    System prompt of the categorizing requests: the user's categories, then what to answer
+    Every request of a user starts with the same categories block, the email comes last in
+    its own message, so the provider can reuse the cached prefix across emails and modes.
+    """
+    return f"""You are an email assistant that sorts a user's emails into their categories.
+
+Categories:
+{categories_text(categories)}
+
+{task}"""
+
+
+def categorize_request(email_data: Dict, categories: List[Dict]) -> Dict:
+    """Chat completion arguments that ask for one email's category ID"""
+    task = (
+        'Determine which category best fits the email. Respond with ONLY the category ID number. '
+        'If none of the categories are a good fit, respond with "0".'
+    )
+    return dict(
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": _categorizer_prompt(categories, task)},
+            {"role": "user", "content": f"Email:\n{email_text(email_data, settings.AI_PROMPT_CATEGORIZE_BODY_TOKENS)}"}
+        ],
+        temperature=0.3,
+        max_tokens=10
+    )
+
+
+def summarize_request(email_data: Dict) -> Dict:
+    """Chat completion arguments that ask for a 1-2 sentence summary"""
+    return dict(
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": (
+                "You are an email summarization assistant. Provide concise, actionable summaries. "
+                "Summarize the email in 1-2 concise sentences. Focus on the main point or action items."
+            )},
+            {"role": "user", "content": f"Email:\n{email_text(email_data, settings.AI_PROMPT_SUMMARY_BODY_TOKENS)}"}
+        ],
+        temperature=0.5,
+        max_tokens=150
+    )
+
+
+def combined_request(email_data: Dict, categories: List[Dict]) -> Dict:
+    """Chat completion arguments that ask for the category and the summary as one JSON object"""
+    task = (
+        'Determine which category best fits the email and summarize it in 1-2 concise sentences, '
+        'focusing on the main point or action items. Respond with a JSON object '
+        '{"category_id": <category ID>, "summary": "<summary>"}. '
+        'Use 0 as the category ID if none of the categories are a good fit.'
+    )
+    return dict(
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": _categorizer_prompt(categories, task)},
+            {"role": "user", "content": f"Email:\n{email_text(email_data, settings.AI_PROMPT_SUMMARY_BODY_TOKENS)}"}
+        ],
+        temperature=0.3,
+        max_tokens=170,
+        response_format={"type": "json_object"}
+    )
+
+
+def batch_email_text(key: str, email_data: Dict) -> str:
+    """One email of a batched categorization prompt"""
+    return f"[{key}]\n{email_text(email_data, settings.AI_PROMPT_CATEGORIZE_BODY_TOKENS)}"
+
+
+def batch_request(batch_texts: List[str], categories: List[Dict]) -> Dict:
+    """Chat completion arguments that ask for the category ID of every email in batch_texts"""
+    task = (
+        'Determine which category best fits each email. Respond with a JSON object '
+        '{"results": {"<email key>": <category ID>}} with one entry for every email key in square brackets. '
+        'Use 0 when none of the categories are a good fit.'
+    )
+    return dict(
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": _categorizer_prompt(categories, task)},
+            {"role": "user", "content": "Emails:\n\n" + "\n\n".join(batch_texts)}
+        ],
+        temperature=0.3,
+        max_tokens=20 + 15 * len(batch_texts),
+        response_format={"type": "json_object"}
+    )
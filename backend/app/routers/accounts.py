@@ -6,6 +6,7 @@ from app.database import get_db
 from app.models import User, GmailAccount
 from app.schemas import GmailAccountResponse
 from app.auth import get_current_user
+from app.gmail_clients import get_client_cache
 
 router = APIRouter(prefix="/accounts", tags=["accounts"])
 
@@ -54,6 +55,7 @@ async def disconnect_gmail_account(
     
     db.delete(account)
     db.commit()
+    get_client_cache().invalidate(account_id)
     
     return {"message": "Account disconnected successfully"}
 
@@ -6,6 +6,7 @@ from app.database import get_db
 from app.models import User, Category, Email
 from app.schemas import CategoryCreate, CategoryUpdate, CategoryResponse
 from app.auth import get_current_user
+from app import online_classifier, sender_affinity
 
 router = APIRouter(prefix="/categories", tags=["categories"])
 
@@ -63,6 +64,10 @@ async def create_category(
         description=category.description
     )
     db.add(db_category)
+    # Senders learned before may fit the new category better, only the stored emails' categories are kept
+    sender_affinity.expire_user(db, current_user.id)
+    sender_affinity.bootstrap(db, current_user.id)
+    online_classifier.reset_user(db, current_user.id)
     db.commit()
     db.refresh(db_category)
     
@@ -126,11 +131,19 @@ async def update_category(
             detail="Category not found"
         )
     
+    changed = (
+        (category_update.name is not None and category_update.name != category.name)
+        or (category_update.description is not None and category_update.description != category.description)
+    )
     if category_update.name is not None:
         category.name = category_update.name
     if category_update.description is not None:
         category.description = category_update.description
     
+    if changed:
+        # What was learned about this category may not hold for its new meaning
+        sender_affinity.expire_category(db, current_user.id, category.id)
+        online_classifier.expire_category(db, current_user.id, category.id)
     db.commit()
     db.refresh(category)
     
@@ -166,6 +179,8 @@ async def delete_category(
             detail="Category not found"
         )
     
+    sender_affinity.expire_category(db, current_user.id, category.id)
+    online_classifier.expire_category(db, current_user.id, category.id)
     db.delete(category)
     db.commit()
     
@@ -1,16 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from typing import List
-import asyncio
+from collections import defaultdict
+from typing import List, Dict, Tuple, Callable
 
 from app.database import get_db
 from app.models import User, Category, Email, GmailAccount
 from app.schemas import EmailResponse, EmailDetail, BulkActionRequest
 from app.auth import get_current_user
 from app.gmail_service import GmailService
-from app.ai_service import AIService
-from app.unsubscribe_agent import unsubscribe_from_email
-from app.config import settings
+from app.gmail_clients import get_gmail_service
+from app.tasks import sync_emails as sync_emails_job, backfill_emails as backfill_emails_job
+from app.tasks import process_emails as process_emails_job, unsubscribe_emails as unsubscribe_emails_job
 
 router = APIRouter(prefix="/emails", tags=["emails"])
 
@@ -65,7 +65,6 @@ async def get_email(
 
 @router.post("/sync")
 async def sync_emails(
-    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -80,108 +79,78 @@ async def sync_emails(
             detail="No Gmail accounts connected"
         )
     
-    # Start background sync
-    background_tasks.add_task(sync_emails_task, current_user.id, db)
+    # Queue the sync on a worker
+    job = sync_emails_job.delay(current_user.id)
     
-    return {"message": "Email sync started"}
+    return {"message": "Email sync started", "job_id": job.id}
 
 
-def sync_emails_task(user_id: int, db: Session):
-    """Background task to sync emails"""
-    try:
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
-            return
-        
-        gmail_accounts = db.query(GmailAccount).filter(
-            GmailAccount.user_id == user_id
-        ).all()
-        
-        categories = db.query(Category).filter(
-            Category.user_id == user_id
-        ).all()
-        
-        if not categories:
-            print("No categories defined, skipping sync")
-            return
-        
-        categories_data = [
-            {"id": cat.id, "name": cat.name, "description": cat.description}
-            for cat in categories
-        ]
-        
-        ai_service = AIService()
-        
+@router.post("/backfill")
+async def backfill_emails(
+    restart: bool = False,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Import the full mailbox of every account, resuming interrupted backfills"""
+    gmail_accounts = db.query(GmailAccount).filter(
+        GmailAccount.user_id == current_user.id
+    ).all()
+    
+    if not gmail_accounts:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No Gmail accounts connected"
+        )
+    
+    if restart:
         for gmail_account in gmail_accounts:
-            try:
-                gmail_service = GmailService(
-                    access_token=gmail_account.access_token,
-                    refresh_token=gmail_account.refresh_token,
-                    client_id=settings.GOOGLE_CLIENT_ID,
-                    client_secret=settings.GOOGLE_CLIENT_SECRET
-                )
-                
-                # Get new messages
-                messages = gmail_service.get_new_messages_since(gmail_account.history_id)
-                
-                for message in messages:
-                    if not message:
-                        continue
-                    
-                    # Check if already imported
-                    existing = db.query(Email).filter(
-                        Email.gmail_message_id == message['message_id']
-                    ).first()
-                    
-                    if existing:
-                        continue
-                    
-                    # Process email with AI
-                    ai_result = ai_service.process_email(message, categories_data)
-                    
-                    if not ai_result['category_id']:
-                        # Skip emails that don't match any category
-                        continue
-                    
-                    # Create email record
-                    email = Email(
-                        gmail_account_id=gmail_account.id,
-                        category_id=ai_result['category_id'],
-                        gmail_message_id=message['message_id'],
-                        thread_id=message['thread_id'],
-                        subject=message['subject'],
-                        sender=message['sender'],
-                        sender_email=message['sender_email'],
-                        recipient=message['recipient'],
-                        received_at=message['received_at'],
-                        body_text=message['body_text'],
-                        body_html=message['body_html'],
-                        ai_summary=ai_result['summary'],
-                        headers=message['headers'],
-                        labels=message['labels'],
-                        unsubscribe_link=message.get('unsubscribe_link'),
-                        is_archived=False
-                    )
-                    db.add(email)
-                    db.commit()
-                    
-                    # Archive the email in Gmail
-                    gmail_service.archive_message(message['message_id'])
-                    email.is_archived = True
-                    db.commit()
-                
-            except Exception as e:
-                print(f"Error syncing emails for account {gmail_account.email}: {e}")
-                continue
+            gmail_account.backfill_page_token = None
+            gmail_account.backfill_completed_at = None
+        db.commit()
+    
+    job = backfill_emails_job.delay(current_user.id)
+    
+    return {"message": "Email backfill started", "job_id": job.id}
+
+
+def _modify_by_account(db: Session, emails: List[Email], operation: Callable[[GmailService, List[str]], Dict]) -> Tuple[List[Email], List[Email]]:
+    """
+    Run a bulk Gmail operation once per account for the given emails
+    Returns (succeeded, failed) emails
+    """
+    by_account = defaultdict(list)
+    for email in emails:
+        by_account[email.gmail_account_id].append(email)
+    
+    succeeded = []
+    failed = []
+    for account_emails in by_account.values():
+        gmail_account = account_emails[0].gmail_account
+        try:
+            gmail_service = get_gmail_service(gmail_account, db)
+            result = operation(gmail_service, [email.gmail_message_id for email in account_emails])
+            done = set(result['succeeded'])
+        except Exception as e:
+            print(f"Error modifying emails in Gmail for {gmail_account.email}: {e}")
+            done = set()
         
-    except Exception as e:
-        print(f"Error in sync task: {e}")
+        for email in account_emails:
+            (succeeded if email.gmail_message_id in done else failed).append(email)
+    
+    return succeeded, failed
+
+
+def _bulk_result(message: str, succeeded: List[Email], failed: List[Email]) -> Dict:
+    return {
+        "message": message,
+        "succeeded": [email.id for email in succeeded],
+        "failed": [email.id for email in failed]
+    }
 
 
 @router.post("/bulk-action")
 async def bulk_action(
     action_request: BulkActionRequest,
-    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -199,56 +168,58 @@ async def bulk_action(
         )
     
     if action_request.action == "delete":
-        # Mark as deleted and delete from Gmail
-        for email in emails:
+        # Move to trash in Gmail, only mark the ones Gmail accepted as deleted
+        succeeded, failed = _modify_by_account(
+            db, emails, lambda gmail_service, ids: gmail_service.trash_messages(ids)
+        )
+        for email in succeeded:
             email.is_deleted = True
-            
-            gmail_account = email.gmail_account
-            try:
-                gmail_service = GmailService(
-                    access_token=gmail_account.access_token,
-                    refresh_token=gmail_account.refresh_token,
-                    client_id=settings.GOOGLE_CLIENT_ID,
-                    client_secret=settings.GOOGLE_CLIENT_SECRET
-                )
-                gmail_service.delete_message(email.gmail_message_id)
-            except Exception as e:
-                print(f"Error deleting email from Gmail: {e}")
-        
         db.commit()
-        return {"message": f"Deleted {len(emails)} emails"}
+        return _bulk_result(f"Deleted {len(succeeded)} emails", succeeded, failed)
+    
+    elif action_request.action == "archive":
+        succeeded, failed = _modify_by_account(
+            db, emails, lambda gmail_service, ids: gmail_service.archive_messages(ids)
+        )
+        for email in succeeded:
+            email.is_archived = True
+        db.commit()
+        return _bulk_result(f"Archived {len(succeeded)} emails", succeeded, failed)
+    
+    elif action_request.action == "label":
+        if not action_request.add_label_ids and not action_request.remove_label_ids:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Label action needs add_label_ids or remove_label_ids"
+            )
+        succeeded, failed = _modify_by_account(
+            db, emails, lambda gmail_service, ids: gmail_service.modify_labels(
+                ids, action_request.add_label_ids, action_request.remove_label_ids
+            )
+        )
+        for email in succeeded:
+            labels = [label for label in email.labels or [] if label not in (action_request.remove_label_ids or [])]
+            email.labels = labels + [label for label in action_request.add_label_ids or [] if label not in labels]
+        db.commit()
+        return _bulk_result(f"Relabeled {len(succeeded)} emails", succeeded, failed)
     
     elif action_request.action == "unsubscribe":
-        # Start unsubscribe process in background
-        background_tasks.add_task(unsubscribe_emails_task, [e.id for e in emails], db)
-        return {"message": f"Started unsubscribe process for {len(emails)} emails"}
+        # Start unsubscribe process on a worker
+        job = unsubscribe_emails_job.delay(current_user.id, [e.id for e in emails])
+        return {"message": f"Started unsubscribe process for {len(emails)} emails", "job_id": job.id}
+    
+    elif action_request.action == "reprocess":
+        # Re-run categorization and summaries, e.g. after editing categories
+        job = process_emails_job.delay(current_user.id, [e.id for e in emails])
+        return {"message": f"Started reprocessing {len(emails)} emails", "job_id": job.id}
     
     else:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid action. Must be 'delete' or 'unsubscribe'"
+            detail="Invalid action. Must be 'delete', 'archive', 'label', 'unsubscribe' or 'reprocess'"
         )
 
 
-async def unsubscribe_emails_task(email_ids: List[int], db: Session):
-    """Background task to unsubscribe from emails"""
-    for email_id in email_ids:
-        email = db.query(Email).filter(Email.id == email_id).first()
-        if not email or not email.unsubscribe_link:
-            continue
-        
-        try:
-            result = await unsubscribe_from_email(email.unsubscribe_link)
-            print(f"Unsubscribe result for {email.sender_email}: {result}")
-            
-            # If successful, mark email as deleted
-            if result.get('success'):
-                email.is_deleted = True
-                db.commit()
-        except Exception as e:
-            print(f"Error unsubscribing from {email.sender_email}: {e}")
-
-
 @router.delete("/{email_id}")
 async def delete_email(
     email_id: int,
@@ -273,12 +244,7 @@ async def delete_email(
     # Delete from Gmail
     gmail_account = email.gmail_account
     try:
-        gmail_service = GmailService(
-            access_token=gmail_account.access_token,
-            refresh_token=gmail_account.refresh_token,
-            client_id=settings.GOOGLE_CLIENT_ID,
-            client_secret=settings.GOOGLE_CLIENT_SECRET
-        )
+        gmail_service = get_gmail_service(gmail_account, db)
         gmail_service.delete_message(email.gmail_message_id)
     except Exception as e:
         print(f"Error deleting email from Gmail: {e}")
@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from celery.result import AsyncResult
+
+from app.models import User
+from app.schemas import JobStatusResponse
+from app.auth import get_current_user
+from app.celery_app import celery_app
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+@router.get("/{job_id}", response_model=JobStatusResponse)
+async def get_job_status(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Get the status of a background job"""
+    job = AsyncResult(job_id, app=celery_app)
+    info = job.info
+    
+    # Every job takes the owning user ID as its first argument
+    owner_id = (job.kwargs or {}).get("user_id") or (job.args[0] if job.args else None)
+    if job.state != "PENDING" and owner_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    
+    response = JobStatusResponse(job_id=job_id, status=job.state)
+    if job.state == "PROGRESS":
+        response.progress = info
+    elif job.successful():
+        response.result = info
+    elif job.failed():
+        response.error = str(info)
+    
+    return response
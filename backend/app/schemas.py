@@ -87,6 +87,7 @@ class EmailResponse(EmailBase):
     is_archived: bool
     is_deleted: bool
     unsubscribe_link: Optional[str] = None
+    unsubscribe_options: Optional[dict] = None
     created_at: datetime
     category_id: int
     
@@ -106,7 +107,17 @@ class EmailDetail(EmailResponse):
 
 class BulkActionRequest(BaseModel):
     email_ids: List[int]
-    action: str  # "delete" or "unsubscribe"
+    action: str  # "delete", "archive", "label", "unsubscribe" or "reprocess"
+    add_label_ids: Optional[List[str]] = None  # For "label"
+    remove_label_ids: Optional[List[str]] = None
+
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str  # PENDING, STARTED, PROGRESS, RETRY, SUCCESS or FAILURE
+    progress: Optional[dict] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
 
 
 class TokenResponse(BaseModel):
@@ -0,0 +1,152 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Email, GmailAccount, SenderAffinity
+
+# Stands for "no category matched", those decisions count against a sender's other categories
+NO_CATEGORY = 0
+
+
+def sender_keys(sender_email: Optional[str]) -> List[str]:
+    """The address and, unless it is a shared mail provider, its "@domain", lowercased"""
+    address = (sender_email or '').strip().lower()
+    if '@' not in address:
+        return []
+    domain = address.rsplit('@', 1)[1]
+    if domain in settings.AFFINITY_SHARED_DOMAINS:
+        return [address]
+    return [address, f'@{domain}']
+
+
+class AffinityTable:
+    """
+    A user's sender -> category counts, as loaded at the start of a sync
+    lookup answers from the sender's own history when there is enough of it, otherwise from
+    its domain's; a history that exists but disagrees with itself is left to the LLM.
+    """
+    
+    def __init__(self, counts: Dict[str, Dict[int, int]]):
+        self.counts = counts
+    
+    def _decide(self, counts: Dict[int, int], min_emails: int, min_share: float) -> Optional[int]:
+        total = sum(counts.values())
+        category_id, top = max(counts.items(), key=lambda item: item[1])
+        if total >= min_emails and top / total >= min_share:
+            return category_id
+        return None
+    
+    def lookup(self, sender_email: Optional[str]) -> Optional[int]:
+        """Category ID (NO_CATEGORY when the sender's mail never matches one), or None if unsure"""
+        keys = sender_keys(sender_email)
+        if not keys:
+            return None
+        sender_counts = self.counts.get(keys[0])
+        if sender_counts and sum(sender_counts.values()) >= settings.AFFINITY_MIN_EMAILS:
+            return self._decide(sender_counts, settings.AFFINITY_MIN_EMAILS, settings.AFFINITY_MIN_SHARE)
+        if len(keys) > 1 and self.counts.get(keys[1]):
+            return self._decide(
+                self.counts[keys[1]], settings.AFFINITY_DOMAIN_MIN_EMAILS, settings.AFFINITY_DOMAIN_MIN_SHARE
+            )
+        return None
+
+
+def load_affinities(db: Session, user_id: int) -> AffinityTable:
+    counts: Dict[str, Dict[int, int]] = defaultdict(dict)
+    rows = db.query(SenderAffinity.sender, SenderAffinity.category_id, SenderAffinity.count).filter(
+        SenderAffinity.user_id == user_id
+    )
+    for sender, category_id, count in rows:
+        counts[sender][category_id] = count
+    return AffinityTable(dict(counts))
+
+
+def record_emails(db: Session, user_id: int, decisions: Iterable[Tuple[Optional[str], Optional[int]]]):
+    """
+    Add (sender_email, category_id) decisions to the user's counts, category_id None for no match
+    Flushes in the caller's transaction, so counts are committed together with the emails.
+    """
+    increments: Dict[Tuple[str, int], int] = defaultdict(int)
+    for sender_email, category_id in decisions:
+        for key in sender_keys(sender_email):
+            increments[(key, category_id or NO_CATEGORY)] += 1
+    _add_counts(db, user_id, increments)
+
+
+def _add_counts(db: Session, user_id: int, increments: Dict[Tuple[str, int], int]):
+    if not increments:
+        return
+    
+    now = datetime.utcnow()
+    rows = [
+        {'user_id': user_id, 'sender': sender, 'category_id': category_id, 'count': count, 'updated_at': now}
+        for (sender, category_id), count in increments.items()
+    ]
+    dialect = db.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        # Accounts of one user sync concurrently, let the database add up their counts
+        stmt = dialect_insert(SenderAffinity).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'sender', 'category_id'],
+            set_={'count': SenderAffinity.count + stmt.excluded.count, 'updated_at': now}
+        )
+        db.execute(stmt)
+        return
+    
+    existing = {
+        (row.sender, row.category_id): row
+        for row in db.query(SenderAffinity).filter(
+            SenderAffinity.user_id == user_id,
+            SenderAffinity.sender.in_({row['sender'] for row in rows})
+        )
+    }
+    for row in rows:
+        current = existing.get((row['sender'], row['category_id']))
+        if current:
+            current.count += row['count']
+            current.updated_at = now
+        else:
+            db.add(SenderAffinity(**row))
+    db.flush()
+
+
+def bootstrap(db: Session, user_id: int):
+    """
+    Count the user's stored emails that have a category, in the caller's transaction
+    Meant for a user without affinities, e.g. right after expire_user; "no match" decisions are not
+    stored with the emails, so those senders are learned again from the next syncs.
+    """
+    increments: Dict[Tuple[str, int], int] = defaultdict(int)
+    rows = db.query(Email.sender_email, Email.category_id, func.count(Email.id)).join(GmailAccount).filter(
+        GmailAccount.user_id == user_id,
+        Email.category_id.isnot(None)
+    ).group_by(Email.sender_email, Email.category_id)
+    for sender_email, category_id, count in rows:
+        for key in sender_keys(sender_email):
+            increments[(key, category_id)] += count
+    _add_counts(db, user_id, increments)
+
+
+def expire_category(db: Session, user_id: int, category_id: int):
+    """
+    Forget what was learned about a category whose meaning changed or that is gone
+    Senders that went there fall back to the LLM until they build up a new history. So do those
+    that matched no category, the changed category may be a match for them now.
+    """
+    db.query(SenderAffinity).filter(
+        SenderAffinity.user_id == user_id,
+        SenderAffinity.category_id.in_([category_id, NO_CATEGORY])
+    ).delete(synchronize_session=False)
+
+
+def expire_user(db: Session, user_id: int):
+    """Forget every affinity of a user, e.g. once a new category could be the better fit for anyone"""
+    db.query(SenderAffinity).filter(SenderAffinity.user_id == user_id).delete(synchronize_session=False)
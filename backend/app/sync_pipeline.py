@@ -0,0 +1,184 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import queue
+import threading
+import time
+
+from app.metrics import metrics
+
+_DONE = object()
+
+
+class Stage:
+    """
+    One pipeline step
+    func takes an item and returns a list of items for the next stage (empty to drop it).
+    With batch_size, func instead takes a list of up to batch_size items, collected for at
+    most linger seconds after the first one arrives.
+    When func raises, on_error(item, error) is called if given, otherwise the error is kept
+    in Pipeline.errors. Either way the item is dropped.
+    """
+    
+    def __init__(self, name: str, func: Callable[[Any], List[Any]], concurrency: int = 1,
+                 batch_size: Optional[int] = None, linger: float = 0.5,
+                 on_error: Optional[Callable[[Any, Exception], None]] = None):
+        self.name = name
+        self.func = func
+        self.concurrency = max(1, concurrency)
+        self.batch_size = batch_size
+        self.linger = linger
+        self.on_error = on_error
+
+
+class StageStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.received = 0
+        self.emitted = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.max_queue_depth = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+    
+    def as_dict(self) -> Dict:
+        elapsed = (self.finished_at or time.perf_counter()) - self.started_at if self.started_at else 0.0
+        return {
+            'received': self.received,
+            'emitted': self.emitted,
+            'errors': self.errors,
+            'busy_seconds': round(self.busy_seconds, 3),
+            'throughput_per_second': round(self.received / elapsed, 2) if elapsed else 0.0,
+            'max_queue_depth': self.max_queue_depth
+        }
+
+
+class Pipeline:
+    """
+    Run items through stages joined by bounded queues
+    Each stage has its own worker threads, so slow network stages overlap instead of
+    running one after another. Per-stage throughput and queue depth are kept in stats
+    and published to app.metrics under pipeline.<name>.<stage>.
+    """
+    
+    def __init__(self, name: str, stages: List[Stage], queue_size: int = 100):
+        self.name = name
+        self.stages = stages
+        self.queue_size = max(1, queue_size)
+        self.stats = {stage.name: StageStats(stage.name) for stage in stages}
+        self.errors: List[Dict] = []
+        self._lock = threading.Lock()
+    
+    def run(self, items: Iterable[Any]) -> List[Any]:
+        """Feed items through every stage and return what the last stage emits"""
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        remaining = [stage.concurrency for stage in self.stages]
+        results = []
+        threads = []
+        
+        for index, stage in enumerate(self.stages):
+            for worker in range(stage.concurrency):
+                thread = threading.Thread(
+                    target=self._work,
+                    args=(index, queues, remaining, results),
+                    name=f"{self.name}-{stage.name}-{worker}",
+                    daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+        
+        try:
+            for item in items:
+                self._put(queues, 0, item)
+        finally:
+            # Let the workers drain and exit even if producing items failed
+            for _ in range(self.stages[0].concurrency):
+                queues[0].put(_DONE)
+            for thread in threads:
+                thread.join()
+        
+        for stage_name, stats in self.stats.items():
+            for key, value in stats.as_dict().items():
+                metrics.set_gauge(f"pipeline.{self.name}.{stage_name}.{key}", value)
+        return results
+    
+    def _put(self, queues: List[queue.Queue], index: int, item: Any):
+        queues[index].put(item)
+        stats = self.stats[self.stages[index].name]
+        depth = queues[index].qsize()
+        with self._lock:
+            stats.max_queue_depth = max(stats.max_queue_depth, depth)
+    
+    def _collect_batch(self, stage: Stage, stage_queue: queue.Queue, first: Any):
+        """Gather up to batch_size items, returns (batch, whether the stage's input is exhausted)"""
+        batch = [first]
+        deadline = time.perf_counter() + stage.linger
+        while len(batch) < stage.batch_size:
+            try:
+                item = stage_queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+            except queue.Empty:
+                break
+            if item is _DONE:
+                return batch, True
+            batch.append(item)
+        return batch, False
+    
+    def _handle_error(self, stage: Stage, item: Any, error: Exception):
+        if stage.on_error:
+            try:
+                stage.on_error(item, error)
+                return
+            except Exception as e:
+                error = e
+        with self._lock:
+            self.errors.append({'stage': stage.name, 'error': str(error)})
+    
+    def _work(self, index: int, queues: List[queue.Queue], remaining: List[int], results: List[Any]):
+        stage = self.stages[index]
+        stats = self.stats[stage.name]
+        last = index == len(self.stages) - 1
+        
+        done = False
+        while not done:
+            item = queues[index].get()
+            if item is _DONE:
+                break
+            received = 1
+            if stage.batch_size:
+                item, done = self._collect_batch(stage, queues[index], item)
+                received = len(item)
+            
+            start = time.perf_counter()
+            with self._lock:
+                if stats.started_at is None:
+                    stats.started_at = start
+                stats.received += received
+            try:
+                outputs = stage.func(item) or []
+            except Exception as e:
+                outputs = []
+                with self._lock:
+                    stats.errors += 1
+                metrics.incr(f"pipeline.{self.name}.{stage.name}.errors")
+                self._handle_error(stage, item, e)
+            elapsed = time.perf_counter() - start
+            
+            with self._lock:
+                stats.busy_seconds += elapsed
+                stats.emitted += len(outputs)
+                stats.finished_at = time.perf_counter()
+            metrics.incr(f"pipeline.{self.name}.{stage.name}.items", received)
+            
+            for output in outputs:
+                if last:
+                    with self._lock:
+                        results.append(output)
+                else:
+                    self._put(queues, index + 1, output)
+        
+        # The last worker of a stage to finish tells the next stage there is nothing more
+        with self._lock:
+            remaining[index] -= 1
+            stage_done = remaining[index] == 0
+        if stage_done and not last:
+            for _ in range(self.stages[index + 1].concurrency):
+                queues[index + 1].put(_DONE)
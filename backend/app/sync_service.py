@@ -0,0 +1,623 @@
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from email.utils import parseaddr
+from typing import Iterable, List, Dict, Optional, Callable
+import json
+import threading
+import time
+
+from app.models import User, Category, Email, GmailAccount, SyncFailure
+from app.database import SessionLocal
+from app.gmail_service import GmailService
+from app.gmail_clients import get_gmail_service
+from app.ai_service import AIService
+from app.sync_pipeline import Pipeline, Stage
+from app import online_classifier, sender_affinity
+from app.metrics import metrics
+from app.config import settings
+
+
+class SyncError(Exception):
+    """Some messages could not be imported, the sync checkpoint was left where it was"""
+
+
+# Keep IN (...) lists well below driver parameter limits
+IN_CLAUSE_CHUNK = 500
+
+
+def _existing_message_ids(db: Session, message_ids: List[str]) -> set:
+    """Gmail message IDs that are already stored, one IN query per chunk"""
+    existing = set()
+    for start in range(0, len(message_ids), IN_CLAUSE_CHUNK):
+        chunk = message_ids[start:start + IN_CLAUSE_CHUNK]
+        existing.update(
+            row[0] for row in db.query(Email.gmail_message_id).filter(Email.gmail_message_id.in_(chunk))
+        )
+    return existing
+
+
+def _insert_new_emails(db: Session, rows: List[Dict]) -> List[str]:
+    """
+    Bulk insert email rows, skipping any gmail_message_id that is already stored
+    (e.g. imported concurrently by another worker). Returns the inserted message IDs.
+    """
+    if not rows:
+        return []
+    
+    dialect = db.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(Email).values(rows).on_conflict_do_nothing(
+            index_elements=['gmail_message_id']
+        ).returning(Email.gmail_message_id)
+        return list(db.execute(stmt).scalars())
+    
+    # No portable ON CONFLICT, filter against the table first
+    existing = _existing_message_ids(db, [row['gmail_message_id'] for row in rows])
+    rows = [row for row in rows if row['gmail_message_id'] not in existing]
+    if rows:
+        db.execute(insert(Email), rows)
+    return [row['gmail_message_id'] for row in rows]
+
+
+def _record_failures(db: Session, account_id: int, message_ids: List[str], failures: Dict[str, str]) -> Dict[str, str]:
+    """
+    Count another attempt for each failed message and forget the earlier failures of the others
+    Returns the failures a later sync retries, the rest have used up SYNC_MAX_MESSAGE_ATTEMPTS.
+    """
+    rows = {}
+    for start in range(0, len(message_ids), IN_CLAUSE_CHUNK):
+        for row in db.query(SyncFailure).filter(
+            SyncFailure.gmail_account_id == account_id,
+            SyncFailure.gmail_message_id.in_(message_ids[start:start + IN_CLAUSE_CHUNK])
+        ):
+            rows[row.gmail_message_id] = row
+    for message_id, row in rows.items():
+        if message_id not in failures:
+            db.delete(row)
+    
+    now = datetime.utcnow()
+    retry = {}
+    for message_id, error in failures.items():
+        row = rows.get(message_id)
+        if row is None:
+            row = SyncFailure(gmail_account_id=account_id, gmail_message_id=message_id, attempts=0)
+            db.add(row)
+        row.attempts += 1
+        row.error = error
+        row.updated_at = now
+        if row.attempts < settings.SYNC_MAX_MESSAGE_ATTEMPTS:
+            retry[message_id] = error
+        else:
+            print(f"Giving up on message {message_id} after {row.attempts} attempts: {error}")
+    metrics.incr('sync.messages_given_up', len(failures) - len(retry))
+    db.flush()
+    return retry
+
+
+def _is_relevant(metadata: Dict, account_email: str) -> bool:
+    """Whether a message's metadata makes it worth a full fetch and an LLM call"""
+    if set(metadata.get('labelIds', [])) & set(settings.SYNC_SKIP_LABELS):
+        return False
+    headers = {
+        header['name'].lower(): header['value'] for header in metadata.get('payload', {}).get('headers', [])
+    }
+    # Mail the account sent itself and out-of-office style replies are not worth sorting
+    if account_email and parseaddr(headers.get('from', ''))[1].lower() == account_email.lower():
+        return False
+    if headers.get('auto-submitted', 'no').lower().startswith('auto-replied'):
+        return False
+    return True
+
+
+class FetchStats:
+    """What the metadata screening of a sync cost and what it saved"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.screened = 0
+        self.skipped = 0
+        self.metadata_bytes = 0
+        self.metadata_seconds = 0.0
+        self.fetched = 0
+        self.fetched_bytes = 0
+        self.fetch_seconds = 0.0
+        self.skipped_bytes = 0
+    
+    def add_screening(self, metadata: List[Dict], skipped: List[Dict], seconds: float):
+        with self._lock:
+            self.screened += len(metadata)
+            self.skipped += len(skipped)
+            self.metadata_bytes += sum(len(json.dumps(item)) for item in metadata)
+            self.metadata_seconds += seconds
+            # sizeEstimate is what Gmail would have sent for the full message
+            self.skipped_bytes += sum(item.get('sizeEstimate', 0) for item in skipped)
+    
+    def add_fetch(self, raw_messages: List[Dict], seconds: float):
+        with self._lock:
+            self.fetched += len(raw_messages)
+            self.fetched_bytes += sum(raw.get('sizeEstimate', 0) for raw in raw_messages)
+            self.fetch_seconds += seconds
+    
+    def as_dict(self) -> Dict:
+        with self._lock:
+            seconds_per_fetch = self.fetch_seconds / self.fetched if self.fetched else 0.0
+            return {
+                'screened': self.screened,
+                'skipped': self.skipped,
+                'fetched': self.fetched,
+                'metadata_bytes': self.metadata_bytes,
+                'fetched_bytes': self.fetched_bytes,
+                'bytes_saved': self.skipped_bytes - self.metadata_bytes,
+                'metadata_seconds': round(self.metadata_seconds, 3),
+                'fetch_seconds': round(self.fetch_seconds, 3),
+                # Full fetches avoided, at the average full fetch time of this sync, minus the screening
+                'seconds_saved': round(self.skipped * seconds_per_fetch - self.metadata_seconds, 3)
+            }
+
+
+def _import_message_ids(db: Session, gmail_account: GmailAccount, gmail_service: GmailService,
+                        ai_service: AIService, categories_data: List[Dict], message_ids: List[str],
+                        max_in_flight: Optional[int] = None) -> Dict:
+    """
+    Fetch, parse, classify, store and archive messages through a staged pipeline
+    so Gmail calls, LLM calls and DB writes overlap. Only the persist stage uses the DB session.
+    With max_in_flight, batch and queue sizes are chosen so at most that many messages
+    (plus one per stage worker) are held in memory at once.
+    Messages that fail are recorded as SyncFailure rows (flushed, for the caller to commit),
+    'retry' holds those a later sync should try again.
+    """
+    # Read once here, commits expire the account and a reload from a worker thread would
+    # run a query on the session the persist stage is using
+    account_id, account_email, user_id = gmail_account.id, gmail_account.email, gmail_account.user_id
+    
+    # Skip messages that are already imported before spending any API calls on them
+    all_ids = list(dict.fromkeys(message_ids))
+    existing = _existing_message_ids(db, all_ids)
+    message_ids = [message_id for message_id in all_ids if message_id not in existing]
+    
+    fetch_size = GmailService.BATCH_SIZE
+    queue_size = settings.SYNC_QUEUE_SIZE
+    persist_batch_size = settings.SYNC_PERSIST_BATCH_SIZE
+    classify_batch_size = settings.AI_BATCH_MAX_EMAILS
+    classify_concurrency = settings.SYNC_CLASSIFY_CONCURRENCY
+    if max_in_flight:
+        # A quarter of the budget each for the batches being fetched, the batches being classified,
+        # the three queues holding messages and the batch being written
+        quarter = max(1, max_in_flight // 4)
+        fetch_size = max(1, min(fetch_size, quarter // settings.SYNC_FETCH_CONCURRENCY))
+        queue_size = max(1, max_in_flight // 12)
+        # Full batches from fewer workers, a smaller batch costs the same prompt for fewer emails
+        classify_batch_size = min(classify_batch_size, quarter)
+        classify_concurrency = max(1, min(classify_concurrency, quarter // classify_batch_size))
+        persist_batch_size = max(1, min(persist_batch_size, quarter))
+    
+    # Message ID -> error of the messages that could not be fetched, categorized or stored
+    failures = {}
+    failures_lock = threading.Lock()
+    fetch_stats = FetchStats()
+    # Affinities as of the start of this import, what it learns is used from the next one on
+    affinities = sender_affinity.load_affinities(db, user_id) if settings.AFFINITY_ENABLED else None
+    # The same goes for the user's model, it learns from the LLM's decisions once the import is done
+    model = online_classifier.load_classifier(db, user_id) if settings.ONLINE_CLASSIFIER_ENABLED else None
+    valid_ids = {category['id'] for category in categories_data}
+    # Senders of messages the LLM matched to no category, they are not stored but still count
+    unmatched = []
+    # (features, category_id) of the emails the LLM categorized
+    learned = []
+    
+    def fail(stage: str, message_ids: Iterable[str], error: Exception):
+        with failures_lock:
+            failures.update((message_id, f"Error in {stage} stage: {error}") for message_id in message_ids)
+    
+    def fetch(chunk: List[str]) -> List[Dict]:
+        if settings.SYNC_TWO_PHASE_FETCH:
+            # Phase 1: labels and a few headers, then full fetches only for relevant messages
+            start = time.perf_counter()
+            metadata, chunk_failures = gmail_service.get_metadata_batch(chunk)
+            relevant, skipped = [], []
+            for item in metadata:
+                (relevant if _is_relevant(item, account_email) else skipped).append(item)
+            fetch_stats.add_screening(metadata, skipped, time.perf_counter() - start)
+            with failures_lock:
+                failures.update(chunk_failures)
+            chunk = [item['id'] for item in relevant]
+            if not chunk:
+                return []
+        
+        start = time.perf_counter()
+        raw_messages, chunk_failures = gmail_service.get_raw_messages_batch(chunk)
+        fetch_stats.add_fetch(raw_messages, time.perf_counter() - start)
+        with failures_lock:
+            failures.update(chunk_failures)
+        return raw_messages
+    
+    def parse(raw_message: Dict) -> List[Dict]:
+        return [gmail_service.parse_message(raw_message)]
+    
+    def classify(messages: List[Dict]) -> List[tuple]:
+        known = {}
+        sources = {}
+        if affinities:
+            for index, message in enumerate(messages):
+                category_id = affinities.lookup(message['sender_email'])
+                if category_id == sender_affinity.NO_CATEGORY or category_id in valid_ids:
+                    known[index] = category_id
+                    sources[index] = 'affinity'
+        metrics.incr('sync.affinity.hits', len(known))
+        metrics.incr('sync.affinity.misses', len(messages) - len(known))
+        if model is not None:
+            predicted = 0
+            for index, message in enumerate(messages):
+                if index in known:
+                    continue
+                category_id = online_classifier.classify(model, message)
+                if category_id == sender_affinity.NO_CATEGORY or category_id in valid_ids:
+                    known[index] = category_id
+                    sources[index] = 'model'
+                    predicted += 1
+            metrics.incr('sync.model.hits', predicted)
+            metrics.incr('sync.model.misses', len(messages) - len(known))
+        
+        # One batched categorization call per AI_BATCH_MAX_EMAILS messages for the unknown ones,
+        # only a summary for the known ones that have a category
+        ask = [message for index, message in enumerate(messages) if index not in known]
+        ai_results = iter(ai_service.process_emails(ask, categories_data) if ask else [])
+        summarize = [message for index, message in enumerate(messages) if known.get(index)]
+        summaries = iter(ai_service.summarize_emails(summarize) if summarize else [])
+        
+        items = []
+        for index, message in enumerate(messages):
+            if index not in known:
+                ai_result = next(ai_results)
+                if 'error' in ai_result:
+                    # Not a "no match", the message is imported by a later sync
+                    with failures_lock:
+                        failures[message['message_id']] = ai_result['error']
+                    continue
+                if not ai_result['category_id']:
+                    with failures_lock:
+                        unmatched.append((message['sender_email'], None))
+                        if model is not None and ai_result.get('source') == 'llm':
+                            learned.append((online_classifier.email_features(message), None))
+            elif known[index]:
+                ai_result = {'category_id': known[index], 'summary': next(summaries), 'source': sources[index]}
+            else:
+                ai_result = {'category_id': None, 'source': sources[index]}
+            # Skip emails that don't match any category
+            if ai_result['category_id']:
+                items.append((message, ai_result))
+        return items
+    
+    def persist(items: List[tuple]) -> List[str]:
+        rows = [
+            {
+                'gmail_account_id': account_id,
+                'category_id': ai_result['category_id'],
+                'gmail_message_id': message['message_id'],
+                'thread_id': message['thread_id'],
+                'subject': message['subject'],
+                'sender': message['sender'],
+                'sender_email': message['sender_email'],
+                'recipient': message['recipient'],
+                'received_at': message['received_at'],
+                'body_text': message['body_text'],
+                'body_html': message['body_html'],
+                'ai_summary': ai_result['summary'],
+                'headers': message['headers'],
+                'labels': message['labels'],
+                'unsubscribe_link': message.get('unsubscribe_link'),
+                'unsubscribe_options': message.get('unsubscribe_options'),
+                'is_archived': False
+            }
+            for message, ai_result in items
+        ]
+        try:
+            inserted = _insert_new_emails(db, rows)
+            new = set(inserted)
+            if affinities is not None:
+                sender_affinity.record_emails(db, user_id, [
+                    (message['sender_email'], ai_result['category_id']) for message, ai_result in items
+                    if message['message_id'] in new and ai_result.get('source') != 'affinity'
+                ])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        if model is not None:
+            # Only the LLM's own answers, the model would otherwise reinforce its own, the local
+            # classifier's or the cache's mistakes
+            with failures_lock:
+                learned.extend(
+                    (online_classifier.email_features(message), ai_result['category_id']) for message, ai_result in items
+                    if message['message_id'] in new and ai_result.get('source') == 'llm'
+                )
+        return inserted
+    
+    def archive(message_ids: List[str]) -> List[str]:
+        return gmail_service.archive_messages(message_ids)['succeeded']
+    
+    def archive_failed(message_ids: List[str], error: Exception):
+        # Already stored, the messages just stay in the inbox
+        print(f"Error archiving {len(message_ids)} messages for {account_email}: {error}")
+    
+    # A failing stage fails its messages rather than the sync, so one bad message can't hold it back
+    pipeline = Pipeline("sync", [
+        Stage("fetch", fetch, settings.SYNC_FETCH_CONCURRENCY,
+              on_error=lambda chunk, e: fail("fetch", chunk, e)),
+        Stage("parse", parse, settings.SYNC_PARSE_CONCURRENCY,
+              on_error=lambda raw_message, e: fail("parse", [raw_message['id']], e)),
+        Stage("classify", classify, classify_concurrency, batch_size=classify_batch_size,
+              on_error=lambda messages, e: fail("classify", [message['message_id'] for message in messages], e)),
+        Stage("persist", persist, 1, batch_size=persist_batch_size,
+              on_error=lambda items, e: fail("persist", [message['message_id'] for message, _ in items], e)),
+        Stage("archive", archive, settings.SYNC_ARCHIVE_CONCURRENCY, batch_size=GmailService.MODIFY_BATCH_SIZE,
+              on_error=archive_failed),
+    ], queue_size=queue_size)
+    
+    chunks = (message_ids[start:start + fetch_size] for start in range(0, len(message_ids), fetch_size))
+    archived = pipeline.run(chunks)
+    
+    if unmatched:
+        sender_affinity.record_emails(db, user_id, unmatched)
+        db.commit()
+    
+    # Committed together with the archived flags
+    if learned:
+        online_classifier.record_emails(db, user_id, learned)
+    if archived:
+        for start in range(0, len(archived), IN_CLAUSE_CHUNK):
+            db.query(Email).filter(Email.gmail_message_id.in_(archived[start:start + IN_CLAUSE_CHUNK])).update(
+                {Email.is_archived: True}, synchronize_session=False
+            )
+    if learned or archived:
+        db.commit()
+    
+    for message_id, error in failures.items():
+        print(f"Failed to import message {message_id} for {account_email}: {error}")
+    for error in pipeline.errors:
+        print(f"Error in {error['stage']} stage for {account_email}: {error['error']}")
+    retry = _record_failures(db, account_id, all_ids, failures)
+    
+    fetch_result = fetch_stats.as_dict()
+    for key in ('screened', 'skipped', 'bytes_saved', 'seconds_saved'):
+        metrics.incr(f'sync.fetch.{key}', fetch_result[key])
+    
+    return {
+        'imported': pipeline.stats['persist'].emitted,
+        'failures': failures,
+        'retry': retry,
+        'errors': pipeline.errors,
+        'stages': {name: stats.as_dict() for name, stats in pipeline.stats.items()},
+        'fetch': fetch_result
+    }
+
+
+def sync_account(db: Session, gmail_account: GmailAccount, gmail_service: GmailService,
+                 ai_service: AIService, categories_data: List[Dict]) -> Dict:
+    """
+    Import new messages for one Gmail account
+    The account's history_id and last_synced are only advanced after the messages are committed,
+    and history_id only once no failed message is left to retry (see SYNC_MAX_MESSAGE_ATTEMPTS)
+    """
+    changes = gmail_service.get_sync_changes(
+        gmail_account.history_id,
+        resync_query=settings.SYNC_RESYNC_QUERY,
+        resync_max_messages=settings.SYNC_RESYNC_MAX_MESSAGES
+    )
+    
+    result = _import_message_ids(
+        db, gmail_account, gmail_service, ai_service, categories_data, changes['message_ids']
+    )
+    if result['errors']:
+        raise SyncError(f"{len(result['errors'])} messages failed to import: {result['errors'][0]['error']}")
+    
+    # Failed messages are retried next sync by keeping the old history ID, until they run out of attempts
+    if changes['history_id'] and not result['retry']:
+        gmail_account.history_id = changes['history_id']
+    gmail_account.last_synced = datetime.utcnow()
+    db.commit()
+    
+    return {
+        'imported': result['imported'],
+        'failed': len(result['failures']),
+        'full_sync': changes['full_sync'],
+        'stages': result['stages'],
+        'fetch': result['fetch']
+    }
+
+
+def backfill_account(db: Session, gmail_account: GmailAccount, gmail_service: GmailService,
+                     ai_service: AIService, categories_data: List[Dict],
+                     max_in_flight: Optional[int] = None) -> Dict:
+    """
+    Import the whole mailbox page by page
+    Resumes from gmail_account.backfill_page_token and checkpoints after every page,
+    roughly max_in_flight parsed messages are held in memory at a time
+    """
+    max_in_flight = max_in_flight or settings.BACKFILL_MAX_IN_FLIGHT
+    imported = 0
+    failed = 0
+    
+    pages = gmail_service.iter_message_pages(
+        query=settings.BACKFILL_QUERY,
+        page_token=gmail_account.backfill_page_token
+    )
+    for message_ids, next_page_token in pages:
+        result = _import_message_ids(
+            db, gmail_account, gmail_service, ai_service, categories_data, message_ids,
+            max_in_flight=max_in_flight
+        )
+        if result['errors']:
+            raise SyncError(f"{len(result['errors'])} messages failed to import: {result['errors'][0]['error']}")
+        imported += result['imported']
+        failed += len(result['failures'])
+        if result['retry']:
+            # The page is imported again by the next backfill, keep count of the attempts
+            db.commit()
+            message_id, error = next(iter(result['retry'].items()))
+            raise SyncError(f"{len(result['retry'])} messages failed to import, e.g. {message_id}: {error}")
+        
+        # Page done, an interrupted backfill resumes at the next one
+        gmail_account.backfill_page_token = next_page_token
+        db.commit()
+    
+    gmail_account.backfill_completed_at = datetime.utcnow()
+    db.commit()
+    
+    return {'imported': imported, 'failed': failed}
+
+
+def load_categories_data(db: Session, user_id: int) -> List[Dict]:
+    """Load a user's categories in the shape AIService expects"""
+    categories = db.query(Category).filter(
+        Category.user_id == user_id
+    ).all()
+    return [
+        {"id": cat.id, "name": cat.name, "description": cat.description}
+        for cat in categories
+    ]
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_user_semaphores: Dict[int, threading.BoundedSemaphore] = {}
+_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Process-wide pool bounding concurrent account syncs across all users"""
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.SYNC_MAX_WORKERS, thread_name_prefix="account-sync")
+        return _executor
+
+
+def _get_user_semaphore(user_id: int) -> threading.BoundedSemaphore:
+    with _lock:
+        if user_id not in _user_semaphores:
+            _user_semaphores[user_id] = threading.BoundedSemaphore(settings.SYNC_MAX_ACCOUNTS_PER_USER)
+        return _user_semaphores[user_id]
+
+
+def _sync_account_worker(account_id: int, categories_data: List[Dict]) -> Dict:
+    """Sync one account with its own DB session and Gmail client"""
+    db = SessionLocal()
+    try:
+        gmail_account = db.get(GmailAccount, account_id)
+        if not gmail_account:
+            return {"status": "error", "error": "Account not found"}
+        
+        gmail_service = get_gmail_service(gmail_account, db)
+        result = sync_account(db, gmail_account, gmail_service, AIService(), categories_data)
+        return {"status": "ok", **result}
+    except Exception as e:
+        db.rollback()
+        return {"status": "error", "error": str(e)}
+    finally:
+        db.close()
+
+
+def sync_user_accounts(user_id: int, account_ids: List[int], categories_data: List[Dict],
+                       on_result: Optional[Callable[[int, Dict], None]] = None) -> Dict[int, Dict]:
+    """
+    Sync accounts concurrently, at most SYNC_MAX_ACCOUNTS_PER_USER at a time for this user
+    and SYNC_MAX_WORKERS across the process
+    Returns a result dict per account ID, on_result is called as each account finishes
+    """
+    executor = _get_executor()
+    semaphore = _get_user_semaphore(user_id)
+    futures = {}
+    
+    for account_id in account_ids:
+        # Acquire before submitting so waiting accounts don't occupy global workers
+        semaphore.acquire()
+        future = executor.submit(_sync_account_worker, account_id, categories_data)
+        future.add_done_callback(lambda _: semaphore.release())
+        futures[future] = account_id
+    
+    results = {}
+    for future in as_completed(futures):
+        account_id = futures[future]
+        results[account_id] = future.result()
+        if on_result:
+            on_result(account_id, results[account_id])
+    
+    return results
+
+
+def sync_emails_task(user_id: int, account_ids: Optional[List[int]] = None,
+                     on_result: Optional[Callable[[int, Dict], None]] = None) -> Dict[int, Dict]:
+    """Sync emails for a user's accounts (all of them unless account_ids is given)"""
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.id == user_id).first()
+        if not user:
+            return {}
+        
+        categories_data = load_categories_data(db, user_id)
+        if not categories_data:
+            print("No categories defined, skipping sync")
+            return {}
+        
+        query = db.query(GmailAccount).filter(GmailAccount.user_id == user_id)
+        if account_ids is not None:
+            query = query.filter(GmailAccount.id.in_(account_ids))
+        account_emails = {account.id: account.email for account in query.all()}
+    finally:
+        db.close()
+    
+    def report(account_id: int, result: Dict):
+        if result["status"] == "ok":
+            print(f"Synced {account_emails[account_id]}: {result}")
+        else:
+            print(f"Error syncing emails for account {account_emails[account_id]}: {result['error']}")
+        if on_result:
+            on_result(account_id, result)
+    
+    return sync_user_accounts(user_id, list(account_emails), categories_data, on_result=report)
+
+
+def backfill_emails_task(user_id: int):
+    """
+    Background task to backfill every account of a user that has not finished a backfill
+    Raises SyncError naming the accounts that failed once all of them were tried.
+    """
+    db = SessionLocal()
+    errors = {}
+    try:
+        categories_data = load_categories_data(db, user_id)
+        if not categories_data:
+            print("No categories defined, skipping backfill")
+            return
+        
+        gmail_accounts = db.query(GmailAccount).filter(
+            GmailAccount.user_id == user_id,
+            GmailAccount.backfill_completed_at == None
+        ).all()
+        
+        ai_service = AIService()
+        
+        for gmail_account in gmail_accounts:
+            try:
+                gmail_service = get_gmail_service(gmail_account, db)
+                
+                result = backfill_account(db, gmail_account, gmail_service, ai_service, categories_data)
+                print(f"Backfilled {gmail_account.email}: {result}")
+                
+            except Exception as e:
+                db.rollback()
+                print(f"Error backfilling emails for account {gmail_account.email}: {e}")
+                errors[gmail_account.email] = str(e)
+                continue
+    finally:
+        db.close()
+    
+    if errors:
+        # For the job to retry, finished accounts are skipped and the others resume from their checkpoint
+        raise SyncError("; ".join(f"{email}: {error}" for email, error in errors.items()))
@@ -0,0 +1,238 @@
+from typing import List, Dict, Optional
+import asyncio
+
+import httpx
+
+from app.celery_app import celery_app
+from app.database import SessionLocal
+from app.models import Email, GmailAccount
+from app.ai_service import AIService
+from app.sync_service import sync_emails_task, backfill_emails_task, load_categories_data
+from app.unsubscribe_agent import UnsubscribeAgent
+from app.list_unsubscribe import parse_list_unsubscribe, parse_mailto, one_click_unsubscribe
+from app.gmail_clients import get_gmail_service
+from app import ai_cache, token_manager
+from app.config import settings
+
+
+def _retry_countdown(retries: int) -> int:
+    return settings.JOB_RETRY_DELAY * 2 ** retries
+
+
+@celery_app.task(bind=True, name="emails.sync", max_retries=settings.JOB_MAX_RETRIES)
+def sync_emails(self, user_id: int, account_ids: Optional[List[int]] = None) -> Dict:
+    """Sync a user's Gmail accounts, retrying only the accounts that failed"""
+    accounts = {}
+    
+    def report(account_id: int, result: Dict):
+        accounts[str(account_id)] = result
+        self.update_state(state="PROGRESS", meta={"user_id": user_id, "accounts": accounts})
+    
+    sync_emails_task(user_id, account_ids, on_result=report)
+    
+    failed = [int(account_id) for account_id, result in accounts.items() if result["status"] == "error"]
+    if failed and self.request.retries < self.max_retries:
+        # Same positional user_id as the original call, retry() merges kwargs into its args
+        raise self.retry(
+            args=(user_id,),
+            kwargs={"account_ids": failed},
+            countdown=_retry_countdown(self.request.retries)
+        )
+    
+    return {"user_id": user_id, "accounts": accounts}
+
+
+@celery_app.task(bind=True, name="emails.backfill", max_retries=settings.JOB_MAX_RETRIES)
+def backfill_emails(self, user_id: int) -> Dict:
+    """Backfill a user's mailboxes, a retry resumes from the saved page checkpoint"""
+    try:
+        backfill_emails_task(user_id)
+    except Exception as e:
+        raise self.retry(exc=e, countdown=_retry_countdown(self.request.retries))
+    return {"user_id": user_id}
+
+
+@celery_app.task(bind=True, name="emails.process", max_retries=settings.JOB_MAX_RETRIES)
+def process_emails(self, user_id: int, email_ids: List[int]) -> Dict:
+    """Re-run AI categorization and summarization on stored emails"""
+    db = SessionLocal()
+    try:
+        categories_data = load_categories_data(db, user_id)
+        emails = db.query(Email).join(GmailAccount).filter(
+            Email.id.in_(email_ids),
+            GmailAccount.user_id == user_id
+        ).all()
+        
+        ai_service = AIService()
+        ai_results = ai_service.process_emails([
+            {
+                'message_id': email.gmail_message_id,
+                'subject': email.subject,
+                'sender': email.sender,
+                'sender_email': email.sender_email,
+                'body_text': email.body_text or ''
+            }
+            for email in emails
+        ], categories_data)
+        processed = 0
+        for email, ai_result in zip(emails, ai_results):
+            if 'error' in ai_result:
+                # Nothing was learned about the email, it keeps what it has
+                continue
+            # Keep the current category and summary when nothing matches anymore
+            if ai_result['category_id']:
+                email.category_id = ai_result['category_id']
+            if ai_result['summary']:
+                email.ai_summary = ai_result['summary']
+            processed += 1
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise self.retry(exc=e, countdown=_retry_countdown(self.request.retries))
+    finally:
+        db.close()
+    
+    return {"user_id": user_id, "processed": processed}
+
+
+def _unsubscribe_plan(email: Email) -> Dict:
+    """The methods to try for an email, cheapest first"""
+    options = email.unsubscribe_options or parse_list_unsubscribe(email.headers or {})
+    https_urls = [url for url in options['http'] if url.lower().startswith('https://')]
+    return {
+        'one_click': https_urls[0] if options['one_click'] and https_urls else None,
+        'mailto': options['mailto'][0] if options['mailto'] and settings.UNSUBSCRIBE_ALLOW_MAILTO else None,
+        'browser': email.unsubscribe_link
+    }
+
+
+def _mark_unsubscribed(db, emails: List[Email], results: Dict[str, Dict]):
+    """Mark the emails whose sender was unsubscribed from as deleted and commit"""
+    for email in emails:
+        result = results.get(str(email.id))
+        if result and not email.is_deleted:
+            print(f"Unsubscribe result for {email.sender_email}: {result}")
+            # If successful, mark email as deleted
+            if result.get('success'):
+                email.is_deleted = True
+    db.commit()
+
+
+async def _unsubscribe(db, user_id: int, email_ids: List[int]) -> Dict[str, Dict]:
+    """
+    Unsubscribe with the cheapest method each sender supports: an RFC 8058 one-click POST,
+    then a mailto sent from the user's own Gmail account, then the Playwright agent.
+    Emails of the same list share one attempt.
+    """
+    emails = db.query(Email).join(GmailAccount).filter(
+        Email.id.in_(email_ids),
+        GmailAccount.user_id == user_id,
+        Email.is_deleted == False
+    ).all()
+    plans = {email.id: _unsubscribe_plan(email) for email in emails}
+    plans = {email_id: plan for email_id, plan in plans.items() if any(plan.values())}
+    emails = [email for email in emails if email.id in plans]
+    
+    # Gmail clients are resolved up front, they need the DB session which the coroutines can't share
+    gmail_services = {}
+    for email in emails:
+        if plans[email.id]['mailto'] and email.gmail_account_id not in gmail_services:
+            gmail_services[email.gmail_account_id] = get_gmail_service(email.gmail_account, db)
+    
+    attempts: Dict[tuple, asyncio.Task] = {}
+    semaphore = asyncio.Semaphore(settings.UNSUBSCRIBE_CONCURRENCY)
+    
+    async def without_browser(client: httpx.AsyncClient, plan: Dict, gmail_account_id: int) -> Dict:
+        async with semaphore:
+            result = {"success": False, "message": "No one-click or mailto unsubscribe offered"}
+            if plan['one_click']:
+                result = {**await one_click_unsubscribe(client, plan['one_click']), "method": "one_click"}
+                if result['success']:
+                    return result
+            if plan['mailto']:
+                mail = parse_mailto(plan['mailto'])
+                try:
+                    await asyncio.to_thread(
+                        gmail_services[gmail_account_id].send_message, mail['to'], mail['subject'], mail['body']
+                    )
+                    return {"success": True, "message": f"Sent unsubscribe request to {mail['to']}", "method": "mailto"}
+                except Exception as e:
+                    result = {"success": False, "message": f"Could not send unsubscribe email: {e}", "method": "mailto"}
+            return result
+    
+    results = {}
+    async with httpx.AsyncClient(timeout=settings.UNSUBSCRIBE_HTTP_TIMEOUT) as client:
+        for email in emails:
+            plan = plans[email.id]
+            key = (email.gmail_account_id, plan['one_click'], plan['mailto'])
+            if (plan['one_click'] or plan['mailto']) and key not in attempts:
+                attempts[key] = asyncio.create_task(without_browser(client, plan, email.gmail_account_id))
+        for email in emails:
+            plan = plans[email.id]
+            key = (email.gmail_account_id, plan['one_click'], plan['mailto'])
+            if key in attempts:
+                results[str(email.id)] = await attempts[key]
+    # Committed before the browser is started, so nothing that went through is attempted again
+    _mark_unsubscribed(db, emails, results)
+    
+    # Whatever is left goes through the browser, one browser for the whole job
+    fallback = [
+        email for email in emails
+        if not results.get(str(email.id), {}).get('success') and plans[email.id]['browser']
+    ]
+    if fallback:
+        browser_results = {}
+        try:
+            async with UnsubscribeAgent() as agent:
+                for email in fallback:
+                    url = plans[email.id]['browser']
+                    try:
+                        if url not in browser_results:
+                            browser_results[url] = {**await agent.unsubscribe(url), "method": "browser"}
+                        results[str(email.id)] = browser_results[url]
+                    except Exception as e:
+                        print(f"Error unsubscribing from {email.sender_email}: {e}")
+                        results[str(email.id)] = {"success": False, "message": str(e), "method": "browser"}
+        except Exception as e:
+            # Reported per email rather than raised, a retry of the job would repeat the other attempts
+            print(f"Error starting the unsubscribe browser: {e}")
+            for email in fallback:
+                if plans[email.id]['browser'] not in browser_results:
+                    results[str(email.id)] = {"success": False, "message": f"Browser unavailable: {e}", "method": "browser"}
+        _mark_unsubscribed(db, fallback, results)
+    
+    return results
+
+
+@celery_app.task(bind=True, name="emails.unsubscribe", max_retries=settings.JOB_MAX_RETRIES)
+def unsubscribe_emails(self, user_id: int, email_ids: List[int]) -> Dict:
+    """Unsubscribe from the senders of the given emails"""
+    db = SessionLocal()
+    try:
+        results = asyncio.run(_unsubscribe(db, user_id, email_ids))
+    except Exception as e:
+        raise self.retry(exc=e, countdown=_retry_countdown(self.request.retries))
+    finally:
+        db.close()
+    
+    return {"user_id": user_id, "emails": results}
+
+
+@celery_app.task(name="tokens.refresh_expiring")
+def refresh_expiring_tokens() -> Dict:
+    """Refresh access tokens of active accounts before they expire (scheduled by celery beat)"""
+    db = SessionLocal()
+    try:
+        return token_manager.refresh_expiring_tokens(db)
+    finally:
+        db.close()
+
+
+@celery_app.task(name="ai_cache.purge_expired")
+def purge_ai_cache() -> Dict:
+    """Delete expired AI results (scheduled by celery beat)"""
+    db = SessionLocal()
+    try:
+        return {"deleted": ai_cache.purge_expired(db)}
+    finally:
+        db.close()
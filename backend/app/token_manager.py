@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+import threading
+
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.metrics import metrics
+from app.models import GmailAccount
+
+TOKEN_URI = "https://oauth2.googleapis.com/token"
+
+_locks: Dict[int, threading.Lock] = {}
+_locks_lock = threading.Lock()
+
+
+def _account_lock(account_id: int) -> threading.Lock:
+    with _locks_lock:
+        if account_id not in _locks:
+            _locks[account_id] = threading.Lock()
+        return _locks[account_id]
+
+
+def needs_refresh(expiry: Optional[datetime], margin: Optional[int] = None) -> bool:
+    """True when a token expires within margin seconds (or its expiry is unknown)"""
+    if margin is None:
+        margin = settings.TOKEN_REFRESH_MARGIN
+    return expiry is None or expiry - datetime.utcnow() <= timedelta(seconds=margin)
+
+
+def _adopt_stored_token(gmail_account: GmailAccount, credentials: Credentials) -> bool:
+    """Copy the account's stored token into credentials when it outlives the one they hold"""
+    if not gmail_account.access_token or gmail_account.token_expiry is None:
+        return False
+    if credentials.expiry is not None and credentials.expiry >= gmail_account.token_expiry:
+        return False
+    credentials.token = gmail_account.access_token
+    credentials.expiry = gmail_account.token_expiry
+    return True
+
+
+def refresh_account_token(db: Session, gmail_account: GmailAccount, margin: Optional[int] = None) -> GmailAccount:
+    """
+    Refresh an account's access token unless it is valid for more than margin seconds
+    Concurrent callers for the same account share one refresh: threads of this process wait
+    on a per-account lock and workers in other processes on the account's row lock, then
+    pick up the token the first caller stored instead of refreshing again.
+    """
+    with _account_lock(gmail_account.id):
+        # SELECT ... FOR UPDATE, held until the commit below
+        account = db.query(GmailAccount).filter(
+            GmailAccount.id == gmail_account.id
+        ).with_for_update().populate_existing().one()
+        
+        if not needs_refresh(account.token_expiry, margin):
+            db.commit()
+            metrics.incr('gmail.token.refreshes_shared')
+            return account
+        
+        credentials = Credentials(
+            token=None,
+            refresh_token=account.refresh_token,
+            token_uri=TOKEN_URI,
+            client_id=settings.GOOGLE_CLIENT_ID,
+            client_secret=settings.GOOGLE_CLIENT_SECRET
+        )
+        try:
+            credentials.refresh(Request())
+        except Exception:
+            db.rollback()
+            metrics.incr('gmail.token.refresh_failures')
+            raise
+        
+        account.access_token = credentials.token
+        account.token_expiry = credentials.expiry
+        db.commit()
+        metrics.incr('gmail.token.refreshes')
+        return account
+
+
+def ensure_fresh_token(db: Session, gmail_account: GmailAccount, credentials: Credentials,
+                       margin: Optional[int] = None):
+    """Make credentials valid for more than margin seconds, reusing a token another worker stored"""
+    _adopt_stored_token(gmail_account, credentials)
+    if not needs_refresh(credentials.expiry, margin):
+        return
+    account = refresh_account_token(db, gmail_account, margin)
+    _adopt_stored_token(account, credentials)
+
+
+def save_refreshed_token(account_id: int, credentials: Credentials):
+    """Store a token google-auth refreshed mid-request, unless a newer one is already stored"""
+    db = SessionLocal()
+    try:
+        account = db.query(GmailAccount).filter(GmailAccount.id == account_id).with_for_update().first()
+        if account and (account.token_expiry is None or
+                        (credentials.expiry is not None and credentials.expiry > account.token_expiry)):
+            account.access_token = credentials.token
+            account.token_expiry = credentials.expiry
+        db.commit()
+        metrics.incr('gmail.token.refreshes_inline')
+    except Exception as e:
+        db.rollback()
+        print(f"Error saving refreshed token for account {account_id}: {e}")
+    finally:
+        db.close()
+
+
+def refresh_expiring_tokens(db: Session) -> Dict[str, int]:
+    """
+    Refresh tokens of recently synced accounts that would expire before the next run,
+    so syncs and bulk actions start with a valid token
+    """
+    margin = settings.TOKEN_REFRESH_MARGIN + settings.TOKEN_REFRESH_INTERVAL
+    now = datetime.utcnow()
+    active_since = now - timedelta(hours=settings.TOKEN_REFRESH_ACTIVE_HOURS)
+    
+    account_ids = [row.id for row in db.query(GmailAccount.id).filter(
+        GmailAccount.last_synced >= active_since,
+        (GmailAccount.token_expiry == None) | (GmailAccount.token_expiry <= now + timedelta(seconds=margin))
+    ).all()]
+    
+    refreshed = failed = 0
+    for account_id in account_ids:
+        gmail_account = db.get(GmailAccount, account_id)
+        try:
+            refresh_account_token(db, gmail_account, margin)
+            refreshed += 1
+        except Exception as e:
+            failed += 1
+            print(f"Error refreshing token for account {gmail_account.email}: {e}")
+    
+    return {"refreshed": refreshed, "failed": failed}
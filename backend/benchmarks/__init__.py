@@ -0,0 +1,2 @@
+# Offline performance benchmarks
+
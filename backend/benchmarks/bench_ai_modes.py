@@ -0,0 +1,97 @@
+"""
+Benchmark: process_email with separate categorize + summarize calls vs one combined call
+
+Runs AIService against an in-process fake chat completions client that sleeps for a
+simulated round trip plus a per-token time, and reports latency and token use per email
+for both modes from the ai.process.* timers and ai.tokens.* counters.
+
+Usage: python -m benchmarks.bench_ai_modes [--emails 50] [--latency 0.2] [--ms-per-token 0.01]
+"""
+from types import SimpleNamespace
+from unittest.mock import patch
+import argparse
+import time
+
+from app.ai_service import AIService
+from app.config import settings
+from app.metrics import metrics
+from app.prompts import estimate_tokens
+from benchmarks.fake_openai import answer
+from benchmarks.payloads import LOREM
+
+CATEGORIES = [
+    {'id': 1, 'name': 'Newsletters', 'description': 'Marketing and promotional emails, newsletters'},
+    {'id': 2, 'name': 'Receipts', 'description': 'Purchase receipts and order confirmations'},
+    {'id': 3, 'name': 'Social', 'description': 'Social media notifications and updates'},
+]
+
+
+class FakeCompletions:
+    """In-process stand-in for client.chat.completions, answering like benchmarks.fake_openai"""
+    
+    def __init__(self, latency: float, seconds_per_token: float):
+        self.latency = latency
+        self.seconds_per_token = seconds_per_token
+        self.calls = 0
+    
+    def create(self, messages, max_tokens, response_format=None, **kwargs):
+        self.calls += 1
+        content = answer(messages, max_tokens, response_format)
+        prompt_tokens = sum(estimate_tokens(message['content']) for message in messages)
+        completion_tokens = estimate_tokens(content)
+        time.sleep(self.latency + (prompt_tokens + completion_tokens) * self.seconds_per_token)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        )
+
+
+def make_emails(count: int) -> list:
+    return [
+        {
+            'message_id': f'm{i}',
+            'subject': f'Weekly update {i}',
+            'sender': 'News Corp',
+            'sender_email': 'news@example.com',
+            'body_text': LOREM * 40
+        }
+        for i in range(count)
+    ]
+
+
+def run(email_count: int, latency: float, seconds_per_token: float):
+    service = AIService()
+    completions = FakeCompletions(latency, seconds_per_token)
+    service.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    emails = make_emails(email_count)
+    
+    print(f'emails: {email_count}, simulated latency: {latency * 1000:.0f}ms + {seconds_per_token * 1000:.3f}ms per token')
+    print(f"{'mode':<10}{'ms/email':>10}{'prompt tok':>12}{'output tok':>12}{'calls/email':>13}")
+    for mode, combined in (('separate', False), ('combined', True)):
+        metrics.reset()
+        completions.calls = 0
+        for email_data in emails:
+            service.process_email(email_data, CATEGORIES, combined=combined)
+        snapshot = metrics.snapshot()
+        counters = snapshot['counters']
+        timer = snapshot['timers'][f'ai.process.{mode}']
+        print(
+            f"{mode:<10}{timer['avg'] * 1000:>10.1f}"
+            f"{counters[f'ai.tokens.{mode}.prompt_tokens'] / email_count:>12.0f}"
+            f"{counters[f'ai.tokens.{mode}.completion_tokens'] / email_count:>12.0f}{completions.calls / email_count:>13.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--emails', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds per completion round trip')
+    parser.add_argument('--ms-per-token', type=float, default=0.01, help='simulated processing time per token')
+    args = parser.parse_args()
+    # Every email goes to the completions, as it would without earlier results or a confident local guess
+    with patch.object(settings, 'AI_CACHE_ENABLED', False), patch.object(settings, 'LOCAL_CLASSIFIER_ENABLED', False):
+        run(args.emails, args.latency, args.ms_per_token / 1000)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Benchmark: AsyncAIService throughput by concurrency limit
+
+Processes the same emails against the local fake completions server with increasing
+semaphore sizes and reports wall-clock time, speedup over one request at a time and
+the most requests the server saw in flight at once.
+
+Usage: python -m benchmarks.bench_async_ai [--emails 64] [--latency 0.5] [--limits 1,2,4,8,16,32]
+"""
+from unittest.mock import patch
+import argparse
+import asyncio
+import time
+
+from app.async_ai_service import AsyncAIService
+from app.config import settings
+from benchmarks.bench_ai_modes import CATEGORIES, make_emails
+from benchmarks.fake_openai import FakeOpenAIServer
+
+
+async def process(server: FakeOpenAIServer, concurrency: int, emails: list) -> float:
+    service = AsyncAIService(concurrency=concurrency, base_url=server.base_url)
+    try:
+        start = time.perf_counter()
+        await service.process_emails(emails, CATEGORIES)
+        return time.perf_counter() - start
+    finally:
+        await service.close()
+
+
+def run(email_count: int, latency: float, limits: list):
+    emails = make_emails(email_count)
+    print(f'emails: {email_count}, simulated latency: {latency * 1000:.0f}ms per completion')
+    print(f"{'limit':>6}{'seconds':>10}{'speedup':>9}{'in flight':>11}")
+    with FakeOpenAIServer(latency=latency) as server:
+        baseline = None
+        for concurrency in limits:
+            server.httpd.max_in_flight = 0
+            elapsed = asyncio.run(process(server, concurrency, emails))
+            baseline = baseline or elapsed
+            print(f'{concurrency:>6}{elapsed:>10.2f}{baseline / elapsed:>8.1f}x{server.max_in_flight:>11}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--emails', type=int, default=64)
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds per completion')
+    parser.add_argument('--limits', default='1,2,4,8,16,32', help='concurrency limits to compare')
+    args = parser.parse_args()
+    # Every email goes to the completions server, as it would without earlier results or a confident local guess
+    with patch.object(settings, 'AI_CACHE_ENABLED', False), patch.object(settings, 'LOCAL_CLASSIFIER_ENABLED', False):
+        run(args.emails, args.latency, [int(limit) for limit in args.limits.split(',')])
+
+
+if __name__ == '__main__':
+    main()
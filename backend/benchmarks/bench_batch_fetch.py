@@ -0,0 +1,64 @@
+"""
+Benchmark: serial get_message calls vs batched get_messages_batch
+
+Runs GmailService against a local fake Gmail endpoint and reports the
+wall-clock time per 1k messages for both fetch paths.
+
+Usage: python -m benchmarks.bench_batch_fetch [--messages 1000] [--latency 0.005]
+"""
+from unittest.mock import patch
+import argparse
+import time
+
+from app.gmail_quota import GmailRateLimiter
+from app.gmail_service import GmailService
+from benchmarks.fake_gmail import FakeGmailServer
+
+
+def make_service(server: FakeGmailServer) -> GmailService:
+    with patch('app.gmail_service.build_from_document', return_value=server.build_service()):
+        return GmailService(
+            access_token='bench_token',
+            refresh_token='bench_refresh',
+            client_id='bench_client_id',
+            client_secret='bench_client_secret',
+            # Measure round trips, not quota pacing
+            rate_limiter=GmailRateLimiter(10**9, 10**9)
+        )
+
+
+def run(message_count: int, latency: float):
+    message_ids = [f'msg{i:06d}' for i in range(message_count)]
+    per_1k = 1000 / message_count
+    
+    with FakeGmailServer(latency=latency) as server:
+        service = make_service(server)
+        
+        start = time.perf_counter()
+        serial = [service.get_message(message_id) for message_id in message_ids]
+        serial_time = time.perf_counter() - start
+        serial_requests = server.round_trips
+        
+        start = time.perf_counter()
+        batched, failures = service.get_messages_batch(message_ids)
+        batch_time = time.perf_counter() - start
+        batch_requests = server.round_trips - serial_requests
+    
+    assert len([m for m in serial if m]) == len(batched) == message_count, f'{len(failures)} batched fetches failed'
+    
+    print(f'messages: {message_count}, simulated latency: {latency * 1000:.1f}ms per round trip')
+    print(f'serial  : {serial_time * per_1k:8.2f}s per 1k messages ({serial_requests} HTTP requests)')
+    print(f'batched : {batch_time * per_1k:8.2f}s per 1k messages ({batch_requests} HTTP requests)')
+    print(f'speedup : {serial_time / batch_time:8.1f}x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.005)
+    args = parser.parse_args()
+    run(args.messages, args.latency)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Benchmark: email body cleanup before prompting, time and token reduction
+
+Cleans a fixture corpus of plain-text bodies (replies with quoted history, newsletters and
+marketing mail with tracking URLs and footers, receipts, plain notes) and reports, per shape,
+the average tokens before and after, the reduction, and the time per body. Also reports
+what a summary prompt ends up including of the body once it is cut to its token budget.
+
+Usage: python -m benchmarks.bench_body_cleaner [--per-shape 50] [--repeat 5]
+"""
+import argparse
+import time
+from collections import defaultdict
+from unittest.mock import patch
+
+from app.body_cleaner import clean_body
+from app.config import settings
+from app.prompts import count_tokens, prompt_body
+from benchmarks.email_bodies import corpus
+
+
+def run(per_shape: int, repeat: int):
+    bodies = corpus(per_shape)
+    by_shape = defaultdict(list)
+    for shape, body in bodies:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            cleaned = clean_body(body)
+        seconds = (time.perf_counter() - start) / repeat
+        by_shape[shape].append((count_tokens(body), count_tokens(cleaned), seconds))
+    
+    print(f'bodies: {len(bodies)} ({per_shape} per shape)')
+    print(f"{'shape':<14}{'tokens':>8}{'cleaned':>9}{'saved':>7}{'us/body':>9}")
+    for shape, rows in list(by_shape.items()) + [('all', [row for rows in by_shape.values() for row in rows])]:
+        before = sum(row[0] for row in rows) / len(rows)
+        after = sum(row[1] for row in rows) / len(rows)
+        seconds = sum(row[2] for row in rows) / len(rows)
+        print(f'{shape:<14}{before:>8.0f}{after:>9.0f}{1 - after / before:>7.0%}{seconds * 1e6:>9.0f}')
+    
+    budget = settings.AI_PROMPT_SUMMARY_BODY_TOKENS
+    sent = {}
+    for clean in (False, True):
+        with patch.object(settings, 'AI_CLEAN_BODY', clean):
+            sent[clean] = sum(count_tokens(prompt_body(body, budget)) for _, body in bodies) / len(bodies)
+    print(f'summary prompt body ({budget} token budget): {sent[False]:.0f} -> {sent[True]:.0f} tokens, '
+          f'{1 - sent[True] / sent[False]:.0%} saved')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--per-shape', type=int, default=50, help='bodies of each shape')
+    parser.add_argument('--repeat', type=int, default=5, help='cleanups per body when timing')
+    args = parser.parse_args()
+    run(args.per_shape, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
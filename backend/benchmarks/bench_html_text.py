@@ -0,0 +1,55 @@
+"""
+Benchmark: streaming HTML-to-text extraction vs BeautifulSoup
+
+Runs every registered extractor over the HTML bodies of the benchmarks.payloads corpus
+and reports time and peak traced memory per message, plus the extracted length.
+
+Usage: python -m benchmarks.bench_html_text [--per-shape 10]
+"""
+import argparse
+import time
+import tracemalloc
+
+from app.html_text import EXTRACTORS
+from app.mime_parser import extract_bodies
+from benchmarks import payloads
+
+SHAPES = ['newsletter', 'marketing', 'forwarded', 'huge_html']
+
+
+def measure(extract, documents) -> tuple:
+    """(seconds per document, peak bytes per document, characters per document)"""
+    start = time.perf_counter()
+    chars = sum(len(extract(html)) for html in documents)
+    seconds = (time.perf_counter() - start) / len(documents)
+    
+    # Peak memory is traced in a separate pass, tracing slows everything down
+    peak = 0
+    for html in documents:
+        tracemalloc.start()
+        extract(html)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return seconds, peak, chars // len(documents)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--per-shape', type=int, default=10, help='messages per payload shape')
+    args = parser.parse_args()
+    
+    print(f"{'shape':<14}{'html KB':>9}  " + ''.join(f"{name + ' ms':>18}{'peak KB':>10}{'chars':>8}" for name in EXTRACTORS))
+    for shape in SHAPES:
+        documents = [
+            extract_bodies(payloads.SHAPES[shape](f'{shape}-{i}')['payload'], max_html=10**9)[1]
+            for i in range(args.per_shape)
+        ]
+        row = f'{shape:<14}{len(documents[0]) // 1024:>9}  '
+        for extract in EXTRACTORS.values():
+            seconds, peak, chars = measure(extract, documents)
+            row += f'{seconds * 1000:>18.2f}{peak // 1024:>10}{chars:>8}'
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
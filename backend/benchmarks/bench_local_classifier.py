@@ -0,0 +1,48 @@
+"""
+Benchmark: local pre-classifier coverage and accuracy against the LLM's labels
+
+Classifies the labeled emails with the TF-IDF index for a range of margins and reports
+the share resolved locally (never sent to the LLM), how often those local answers agree
+with the LLM's label, and the time it takes to score one email.
+
+Usage: python -m benchmarks.bench_local_classifier [--margins 0,0.05,0.1,0.15,0.2,0.3] [--min-score 0.15]
+"""
+import argparse
+import time
+
+from app.local_classifier import CategoryIndex
+from benchmarks.labeled_emails import CATEGORIES, EMAILS
+
+
+def run(margins: list, min_score: float, repeat: int = 20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        index = CategoryIndex(CATEGORIES)
+    build_ms = (time.perf_counter() - start) / repeat * 1000
+    
+    start = time.perf_counter()
+    for _ in range(repeat):
+        index.scores(EMAILS)
+    score_us = (time.perf_counter() - start) / repeat / len(EMAILS) * 1e6
+    
+    print(f'emails: {len(EMAILS)}, categories: {len(CATEGORIES)}, min score: {min_score}')
+    print(f'index build: {build_ms:.2f}ms, scoring: {score_us:.0f}us per email')
+    print(f"{'margin':>7}{'local':>8}{'accuracy':>10}{'llm calls':>11}")
+    for margin in margins:
+        results = index.classify(EMAILS, margin, min_score)
+        resolved = [(category_id, email['label']) for category_id, email in zip(results, EMAILS) if category_id is not None]
+        correct = sum(category_id == label for category_id, label in resolved)
+        accuracy = f'{correct / len(resolved):.0%}' if resolved else '-'
+        print(f'{margin:>7.2f}{len(resolved) / len(EMAILS):>8.0%}{accuracy:>10}{len(EMAILS) - len(resolved):>11}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--margins', default='0,0.05,0.1,0.15,0.2,0.3', help='top-2 score margins to compare')
+    parser.add_argument('--min-score', type=float, default=0.15, help='lowest best score to accept')
+    args = parser.parse_args()
+    run([float(margin) for margin in args.margins.split(',')], args.min_score)
+
+
+if __name__ == '__main__':
+    main()
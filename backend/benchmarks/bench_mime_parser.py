@@ -0,0 +1,78 @@
+"""
+Benchmark: the previous top-level-only body extraction vs the capped MIME walker
+
+Parses the payload corpus from benchmarks.payloads with both and reports time per
+message and how many body characters (text plus HTML) each one extracted, per payload shape.
+
+Usage: python -m benchmarks.bench_mime_parser [--per-shape 20]
+"""
+import argparse
+import base64
+import time
+
+from bs4 import BeautifulSoup
+
+from app.mime_parser import extract_bodies
+from benchmarks import payloads
+
+
+def legacy_bodies(message: dict) -> tuple:
+    """Body extraction as _parse_message did it before the MIME walker"""
+    body_text = ''
+    body_html = ''
+    if 'parts' in message['payload']:
+        for part in message['payload']['parts']:
+            if part['mimeType'] == 'text/plain' and 'data' in part['body']:
+                body_text += base64.urlsafe_b64decode(part['body']['data']).decode('utf-8', errors='ignore')
+            elif part['mimeType'] == 'text/html' and 'data' in part['body']:
+                body_html += base64.urlsafe_b64decode(part['body']['data']).decode('utf-8', errors='ignore')
+    elif 'body' in message['payload'] and 'data' in message['payload']['body']:
+        body_data = base64.urlsafe_b64decode(message['payload']['body']['data']).decode('utf-8', errors='ignore')
+        if message['payload']['mimeType'] == 'text/plain':
+            body_text = body_data
+        elif message['payload']['mimeType'] == 'text/html':
+            body_html = body_data
+    if not body_text and body_html:
+        body_text = BeautifulSoup(body_html, 'html.parser').get_text(separator='\n', strip=True)
+    return body_text[:50000], body_html[:100000]
+
+
+def walker_bodies(message: dict) -> tuple:
+    """Body extraction as _parse_message does it now"""
+    body_text, body_html = extract_bodies(message['payload'], fetch_attachment=payloads.ATTACHMENTS.get)
+    if not body_text and body_html:
+        body_text = BeautifulSoup(body_html, 'html.parser').get_text(separator='\n', strip=True)
+    return body_text[:50000], body_html
+
+
+def time_per_message(func, messages) -> tuple:
+    start = time.perf_counter()
+    chars = sum(func(message) for message in messages)
+    return (time.perf_counter() - start) / len(messages), chars // len(messages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--per-shape', type=int, default=20, help='messages per payload shape')
+    args = parser.parse_args()
+    
+    def legacy(message):
+        text, html = legacy_bodies(message)
+        return len(text) + len(html)
+    
+    def walker(message):
+        text, html = walker_bodies(message)
+        return len(text) + len(html)
+    
+    print(f"{'shape':<30}{'legacy ms':>11}{'chars':>9}{'walker ms':>11}{'chars':>9}{'speedup':>9}")
+    for shape, messages in payloads.corpus(args.per_shape).items():
+        legacy_seconds, legacy_chars = time_per_message(legacy, messages)
+        current_seconds, current_chars = time_per_message(walker, messages)
+        print(
+            f'{shape:<30}{legacy_seconds * 1000:>11.2f}{legacy_chars:>9}'
+            f'{current_seconds * 1000:>11.2f}{current_chars:>9}{legacy_seconds / current_seconds:>8.1f}x'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark: LLM calls saved by the online classifier as a mailbox grows
+
+Replays the labeled emails in shuffled order as if they arrived one by one: the model
+predicts each email, the ones it isn't confident about go to the "LLM" (their label) and
+are learned. Reports, per stretch of the mailbox, the share of emails that still needed
+the LLM and how often the model's own answers agreed with it, averaged over several orders.
+
+Usage: python -m benchmarks.bench_online_classifier [--orders 50] [--window 10] [--min-emails 10]
+"""
+import argparse
+import random
+import time
+from unittest.mock import patch
+
+from app.config import settings
+from app.online_classifier import NaiveBayes, classify, email_features
+from app.sender_affinity import NO_CATEGORY
+from benchmarks.labeled_emails import EMAILS
+
+
+def run(orders: int, window: int, min_emails: int):
+    windows = (len(EMAILS) + window - 1) // window
+    asked = [0] * windows
+    predicted = [0] * windows
+    correct = [0] * windows
+    seconds = 0.0
+    with patch.object(settings, 'ONLINE_CLASSIFIER_MIN_EMAILS', min_emails):
+        for order in range(orders):
+            emails = list(EMAILS)
+            random.Random(order).shuffle(emails)
+            model = NaiveBayes()
+            start = time.perf_counter()
+            for position, email in enumerate(emails):
+                features = email_features(email)
+                category_id = classify(model, email)
+                if category_id is None:
+                    asked[position // window] += 1
+                    model.learn(features, email['label'])
+                else:
+                    predicted[position // window] += 1
+                    correct[position // window] += category_id == (email['label'] or NO_CATEGORY)
+            seconds += time.perf_counter() - start
+            state = model.to_bytes()
+    
+    print(f'emails: {len(EMAILS)}, orders: {orders}, min emails: {min_emails}, '
+          f'min confidence: {settings.ONLINE_CLASSIFIER_MIN_CONFIDENCE}')
+    print(f'{seconds / orders / len(EMAILS) * 1e6:.0f}us per email (predict + learn), '
+          f'last model state: {len(state)} bytes')
+    print(f"{'emails':>9}{'llm':>7}{'accuracy':>10}")
+    for index in range(windows):
+        total = asked[index] + predicted[index]
+        accuracy = f'{correct[index] / predicted[index]:.0%}' if predicted[index] else '-'
+        label = f'{index * window + 1}-{min((index + 1) * window, len(EMAILS))}'
+        print(f'{label:>9}{asked[index] / total:>7.0%}{accuracy:>10}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=50, help='shuffled arrival orders to average over')
+    parser.add_argument('--window', type=int, default=10, help='emails per reported stretch')
+    parser.add_argument('--min-emails', type=int, default=10, help='emails learned before predictions are used')
+    args = parser.parse_args()
+    run(args.orders, args.window, args.min_emails)
+
+
+if __name__ == '__main__':
+    main()
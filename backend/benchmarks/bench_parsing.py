@@ -0,0 +1,76 @@
+"""
+Parsing benchmarks (pytest-benchmark) with stored baselines
+
+Times _parse_message on the synthetic corpus and every payload shape, _parse_email_address
+and unsubscribe extraction. Baselines live in benchmarks/baselines, one directory per
+platform/interpreter; a run compared against them fails when a mean regresses too far.
+Any machine with the same platform name picks up the committed baseline, but timings don't
+carry over between machines: save your own before comparing on a different one, and refresh
+the committed one on the machine that recorded it. CI instead compares a pull request
+against its base commit on one runner.
+
+Save a baseline:
+    pytest benchmarks/bench_parsing.py --benchmark-storage=benchmarks/baselines --benchmark-save=baseline
+Check for regressions (fails above 20%):
+    pytest benchmarks/bench_parsing.py --benchmark-storage=benchmarks/baselines \\
+        --benchmark-compare --benchmark-compare-fail=mean:20%
+"""
+from unittest.mock import patch
+
+import pytest
+
+from app.gmail_service import GmailService
+from app.list_unsubscribe import parse_list_unsubscribe, find_unsubscribe_link
+from benchmarks import payloads
+
+SYNTHETIC = payloads.generate(50, seed=1)
+SHAPES = {name: [build(f'{name}-{i}') for i in range(5)] for name, build in payloads.SHAPES.items()}
+
+ADDRESSES = [
+    '"John Doe" <john@example.com>',
+    'john@example.com',
+    '=?UTF-8?B?w4lxdWlwZSBTdXBwb3J0?= <support@example.fr>',
+    'Long Display Name With Many Words <very.long.address+tag@sub.domain.example.co.uk>',
+    '"Shop, Inc." <offers@shop.example.com>',
+    'Broken <address',
+] * 200
+
+
+@pytest.fixture(scope='module')
+def gmail_service():
+    with patch('app.gmail_service.build_from_document'):
+        service = GmailService('bench_token', 'bench_refresh', 'bench_client_id', 'bench_client_secret')
+    service.get_attachment = lambda message_id, attachment_id: payloads.ATTACHMENTS[attachment_id]
+    return service
+
+
+def test_parse_message_synthetic(benchmark, gmail_service):
+    parsed = benchmark(lambda: [gmail_service._parse_message(message) for message in SYNTHETIC])
+    assert all(message['body_text'] for message in parsed)
+
+
+@pytest.mark.parametrize('shape', list(SHAPES))
+def test_parse_message_shape(benchmark, gmail_service, shape):
+    benchmark(lambda: [gmail_service._parse_message(message) for message in SHAPES[shape]])
+
+
+def test_parse_email_address(benchmark, gmail_service):
+    parsed = benchmark(lambda: [gmail_service._parse_email_address(address) for address in ADDRESSES])
+    assert parsed[0] == ('John Doe', 'john@example.com')
+
+
+def test_unsubscribe_extraction(benchmark):
+    messages = [
+        ({header['name']: header['value'] for header in message['payload']['headers']}, 'Unsubscribe: https://example.com/unsubscribe')
+        for message in SYNTHETIC
+    ]
+    
+    def extract():
+        results = []
+        for headers, body_text in messages:
+            options = parse_list_unsubscribe(headers)
+            results.append((options, find_unsubscribe_link(options, body_text)))
+        return results
+    
+    results = benchmark(extract)
+    assert results[0][0]['one_click']
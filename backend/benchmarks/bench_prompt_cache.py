@@ -0,0 +1,74 @@
+"""
+Benchmark: prompt tokens served from the provider's prompt cache
+
+Categorizes the same emails for users with more and more categories against the local fake
+completions server, which reports cached prompt tokens the way OpenAI does (a repeated
+prefix of at least 1024 tokens). Prints the size of the per-user prefix and the share of
+prompt tokens that were cached, for single and batched categorization.
+
+Usage: python -m benchmarks.bench_prompt_cache [--emails 40] [--categories 5,20,40,80]
+"""
+import argparse
+import asyncio
+from unittest.mock import patch
+
+from app.ai_service import AIService
+from app.async_ai_service import AsyncAIService
+from app.config import settings
+from app.metrics import metrics
+from app.prompts import categorize_request, prompt_tokens
+from benchmarks.bench_ai_modes import make_emails
+from benchmarks.fake_openai import FakeOpenAIServer
+
+
+def make_categories(count: int) -> list:
+    return [
+        {'id': i, 'name': f'Category {i}', 'description': f'Emails about topic {i} that the user wants kept together'}
+        for i in range(1, count + 1)
+    ]
+
+
+async def categorize_each(server: FakeOpenAIServer, emails: list, categories: list):
+    service = AsyncAIService(concurrency=1, base_url=server.base_url)
+    try:
+        for email_data in emails:
+            await service.categorize_email(email_data, categories)
+    finally:
+        await service.close()
+
+
+def cached_share(mode: str) -> str:
+    counters = metrics.snapshot()['counters']
+    cached = counters.get(f'ai.tokens.{mode}.cached_prompt_tokens', 0)
+    total = cached + counters.get(f'ai.tokens.{mode}.uncached_prompt_tokens', 0)
+    return f'{cached / total:.0%}' if total else '-'
+
+
+def run(email_count: int, category_counts: list):
+    emails = make_emails(email_count)
+    print(f'emails: {email_count}')
+    print(f"{'categories':>11}{'prefix tokens':>15}{'single cached':>15}{'batch cached':>14}")
+    # Every email goes to the completions server, as it would without earlier results or a confident local guess
+    with patch.object(settings, 'AI_CACHE_ENABLED', False), patch.object(settings, 'LOCAL_CLASSIFIER_ENABLED', False):
+        for count in category_counts:
+            categories = make_categories(count)
+            prefix = prompt_tokens({'messages': categorize_request(emails[0], categories)['messages'][:1]})
+            with FakeOpenAIServer(latency=0) as server:
+                metrics.reset()
+                asyncio.run(categorize_each(server, emails, categories))
+                with patch.object(settings, 'OPENAI_BASE_URL', server.base_url), \
+                     patch.object(settings, 'AI_BATCH_MAX_EMAILS', 10):
+                    AIService().categorize_emails(emails, categories)
+            print(f'{count:>11}{prefix:>15}{cached_share("separate"):>15}{cached_share("batch"):>14}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--emails', type=int, default=40)
+    parser.add_argument('--categories', default='5,20,40,80', help='category counts to compare')
+    args = parser.parse_args()
+    run(args.emails, [int(count) for count in args.categories.split(',')])
+
+
+if __name__ == '__main__':
+    main()
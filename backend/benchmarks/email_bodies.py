@@ -0,0 +1,132 @@
+"""
+Plain-text email bodies shaped like what Gmail hands the AI service
+
+Replies with quoted history, Outlook replies, newsletters and marketing mail with tracking
+URLs and footers, receipts with legal notices, mobile replies, and plain notes that have
+nothing to strip. Deterministic for a given seed.
+"""
+from typing import List, Tuple
+import random
+
+SENTENCES = [
+    'Thanks for sending the draft over, I went through it this morning.',
+    'The launch moved to next Thursday because the vendor needs another week.',
+    'Can you confirm the budget numbers before the review on Friday?',
+    'We shipped the new onboarding flow and early numbers look good.',
+    'Your order has been packed and will leave our warehouse tomorrow.',
+    'This week we look at how small teams run on-call without burning out.',
+    'The quarterly report is attached, the summary is on the first page.',
+    'Please let me know if the time works for you or suggest another slot.',
+    'Our autumn collection is here, with new colours and softer fabrics.',
+    'I added comments on sections two and four, the rest reads well.',
+]
+NAMES = ['Alice Martin', 'Bob Chen', 'Carla Diaz', 'Deepak Rao', 'Emma Novak']
+# Zero-width characters and non-breaking spaces marketing templates pad the preview text with
+PREHEADER_PADDING = '\u200b\u034f\u00ad\u00a0' * 40
+
+
+def _paragraphs(rng: random.Random, count: int, sentences: int = 3) -> str:
+    return '\n\n'.join(' '.join(rng.choice(SENTENCES) for _ in range(sentences)) for _ in range(count))
+
+
+def _tracking_url(rng: random.Random, domain: str) -> str:
+    token = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz0123456789') for _ in range(32))
+    return f'https://click.{domain}/ls/click?upn={token}&utm_source=newsletter&utm_medium=email&utm_campaign=weekly'
+
+
+def _quote(text: str) -> str:
+    return '\n'.join(f'> {line}' if line else '>' for line in text.split('\n'))
+
+
+def _footer(rng: random.Random, domain: str) -> str:
+    return (
+        f"\n\nYou are receiving this email because you signed up at {domain}.\n"
+        f"Unsubscribe: {_tracking_url(rng, domain)}\n"
+        f"Manage your email preferences: {_tracking_url(rng, domain)}\n"
+        f"View this email in your browser: {_tracking_url(rng, domain)}\n"
+        f"{domain.split('.')[0].title()} Inc., 548 Market St, San Francisco, CA 94104\n"
+        f"© 2025 {domain.split('.')[0].title()} Inc. All rights reserved. Privacy Policy | Terms of Service"
+    )
+
+
+def reply(rng: random.Random) -> str:
+    sender, other = rng.sample(NAMES, 2)
+    history = _paragraphs(rng, 2)
+    for depth in range(rng.randint(1, 3)):
+        history = (
+            f"{_paragraphs(rng, 1)}\n\nOn Mon, Oct {6 + depth}, 2025 at 9:{10 + depth} AM {other} "
+            f"<{other.split()[0].lower()}@example.com> wrote:\n\n{_quote(history)}"
+        )
+    return (
+        f"Hi {other.split()[0]},\n\n{_paragraphs(rng, 1)}\n\nThanks,\n{sender}\n"
+        f"-- \n{sender}\nProduct Lead, Example Co\n+1 415 555 0100\n\n{_quote(history)}"
+    )
+
+
+def outlook_reply(rng: random.Random) -> str:
+    sender, other = rng.sample(NAMES, 2)
+    return (
+        f"{_paragraphs(rng, 1)}\n\nBest regards,\n{sender}\n\n-----Original Message-----\n"
+        f"From: {other} <{other.split()[0].lower()}@example.com>\nSent: Tuesday, October 7, 2025 4:12 PM\n"
+        f"To: {sender}\nSubject: RE: Review\n\n{_paragraphs(rng, 3)}\n\n"
+        "This email and any attachments are confidential and intended solely for the named recipient. "
+        "If you have received it in error, please notify the sender and delete it."
+    )
+
+
+def newsletter(rng: random.Random) -> str:
+    domain = rng.choice(['morningbrew.com', 'substack.com', 'medium.com'])
+    sections = '\n\n'.join(
+        f"{_paragraphs(rng, 1)}\nRead more: {_tracking_url(rng, domain)}" for _ in range(rng.randint(3, 6))
+    )
+    return f"View in browser: {_tracking_url(rng, domain)}\n\n{sections}{_footer(rng, domain)}"
+
+
+def marketing(rng: random.Random) -> str:
+    domain = rng.choice(['shop.example.com', 'store.example.org'])
+    offers = '\n\n\n'.join(
+        f"   {rng.choice(SENTENCES)}      Shop now    {_tracking_url(rng, domain)}   " for _ in range(rng.randint(3, 5))
+    )
+    return f"Up to 40% off this weekend{PREHEADER_PADDING}\n\n\n{offers}{_footer(rng, domain)}"
+
+
+def receipt(rng: random.Random) -> str:
+    items = '\n'.join(
+        f"{rng.choice(['Notebook', 'Cable', 'Mug', 'Lamp'])}   x{rng.randint(1, 3)}   ${rng.randint(5, 90)}.00"
+        for _ in range(rng.randint(1, 4))
+    )
+    return (
+        f"Thanks for your order #{rng.randint(100000, 999999)}.\n\n{items}\n\nTrack your package: "
+        f"{_tracking_url(rng, 'shipping.example.com')}\n\nQuestions? Visit our help center.\n\n"
+        "This message was sent to you@example.com. Please do not reply to this email.\n"
+        "© 2025 Example Store. All rights reserved.\nPrivacy Policy: https://store.example.com/legal/privacy-policy?ref=receipt"
+    )
+
+
+def mobile_reply(rng: random.Random) -> str:
+    other = rng.choice(NAMES)
+    return (
+        f"{rng.choice(SENTENCES)}\n\nSent from my iPhone\n\n"
+        f"On Oct 8, 2025, at 18:02, {other} <{other.split()[0].lower()}@example.com> wrote:\n\n{_quote(_paragraphs(rng, 2))}"
+    )
+
+
+def plain(rng: random.Random) -> str:
+    return f"Hi,\n\n{_paragraphs(rng, rng.randint(1, 3))}\n\nCheers"
+
+
+SHAPES = {
+    'reply': reply,
+    'outlook_reply': outlook_reply,
+    'newsletter': newsletter,
+    'marketing': marketing,
+    'receipt': receipt,
+    'mobile_reply': mobile_reply,
+    'plain': plain,
+}
+
+
+def corpus(per_shape: int = 20, seed: int = 0) -> List[Tuple[str, str]]:
+    """(shape, body) pairs, per_shape of each"""
+    rng = random.Random(seed)
+    return [(shape, build(rng)) for shape, build in SHAPES.items() for _ in range(per_shape)]
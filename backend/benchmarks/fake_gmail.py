@@ -0,0 +1,153 @@
+"""
+Local fake Gmail API endpoint for offline benchmarks
+
+Serves just enough of the Gmail REST surface (messages.get and the HTTP batch
+endpoint) for GmailService to run against it, with a fixed simulated network
+latency per HTTP round trip.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from email.parser import BytesParser
+from email.policy import HTTP
+from urllib.parse import urlsplit
+import base64
+import json
+import os
+import threading
+import time
+
+import httplib2
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
+
+
+def make_message(message_id: str) -> dict:
+    """Build a Gmail API message resource shaped like a typical newsletter"""
+    text = (f'Weekly update {message_id}\n' + 'Lorem ipsum dolor sit amet. ' * 40).encode('utf-8')
+    html = (f'<html><body><h1>Weekly update {message_id}</h1>' + '<p>Lorem ipsum dolor sit amet.</p>' * 80 + '</body></html>').encode('utf-8')
+    return {
+        'id': message_id,
+        'threadId': f'thread-{message_id}',
+        'labelIds': ['INBOX', 'CATEGORY_PROMOTIONS'],
+        'payload': {
+            'mimeType': 'multipart/alternative',
+            'headers': [
+                {'name': 'From', 'value': '"News Corp" <news@example.com>'},
+                {'name': 'To', 'value': 'me@example.com'},
+                {'name': 'Subject', 'value': f'Weekly update {message_id}'},
+                {'name': 'Date', 'value': 'Mon, 6 Oct 2025 10:00:00 +0000'},
+                {'name': 'List-Unsubscribe', 'value': '<https://example.com/unsubscribe?id=1>'},
+            ],
+            'parts': [
+                {'mimeType': 'text/plain', 'body': {'size': len(text), 'data': base64.urlsafe_b64encode(text).decode()}},
+                {'mimeType': 'text/html', 'body': {'size': len(html), 'data': base64.urlsafe_b64encode(html).decode()}},
+            ]
+        }
+    }
+
+
+class FakeGmailHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _send(self, status: int, body: bytes, content_type: str = 'application/json'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _handle(self, method: str, path: str, body: bytes):
+        """Return (status, json_body) for a single REST call"""
+        url = urlsplit(path)
+        parts = url.path.strip('/').split('/')
+        self.server.request_count += 1
+        # gmail/v1/users/me/messages/<id>
+        if method == 'GET' and parts[:5] == ['gmail', 'v1', 'users', 'me', 'messages'] and len(parts) == 6:
+            message_id = parts[5]
+            if message_id in self.server.missing_ids:
+                return 404, {'error': {'code': 404, 'message': 'Requested entity was not found.'}}
+            return 200, make_message(message_id)
+        return 404, {'error': {'code': 404, 'message': f'Unknown path {url.path}'}}
+    
+    def do_GET(self):
+        self.server.round_trips += 1
+        time.sleep(self.server.latency)
+        status, payload = self._handle('GET', self.path, b'')
+        self._send(status, json.dumps(payload).encode('utf-8'))
+    
+    def do_POST(self):
+        self.server.round_trips += 1
+        time.sleep(self.server.latency)
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if urlsplit(self.path).path.startswith('/batch'):
+            self._send_batch(body)
+            return
+        status, payload = self._handle('POST', self.path, body)
+        self._send(status, json.dumps(payload).encode('utf-8'))
+    
+    def _send_batch(self, body: bytes):
+        mime = BytesParser(policy=HTTP).parsebytes(
+            f'Content-Type: {self.headers["Content-Type"]}\r\n\r\n'.encode('utf-8') + body
+        )
+        boundary = f'batch_{os.urandom(8).hex()}'
+        out = []
+        for part in mime.iter_parts():
+            content_id = part['Content-ID'].strip('<>')
+            request_line, _, rest = part.get_payload().partition('\n')
+            method, path, _ = request_line.strip().split(' ', 2)
+            sub_body = rest.split('\r\n\r\n', 1)[1].encode('utf-8') if '\r\n\r\n' in rest else b''
+            status, payload = self._handle(method, path, sub_body)
+            out.append(
+                f'--{boundary}\r\n'
+                'Content-Type: application/http\r\n'
+                f'Content-ID: <response-{content_id}>\r\n\r\n'
+                f'HTTP/1.1 {status} {"OK" if status < 300 else "Error"}\r\n'
+                'Content-Type: application/json; charset=UTF-8\r\n\r\n'
+                f'{json.dumps(payload)}\r\n'
+            )
+        out.append(f'--{boundary}--\r\n')
+        self._send(200, ''.join(out).encode('utf-8'), f'multipart/mixed; boundary={boundary}')
+
+
+class FakeGmailServer:
+    """Run the fake Gmail API in a background thread"""
+    
+    def __init__(self, latency: float = 0.005):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), FakeGmailHandler)
+        self.httpd.latency = latency
+        self.httpd.request_count = 0
+        self.httpd.round_trips = 0
+        self.httpd.missing_ids = set()
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+    
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address
+        return f'http://{host}:{port}/'
+    
+    @property
+    def request_count(self) -> int:
+        """API calls served, counting each batch sub-request"""
+        return self.httpd.request_count
+    
+    @property
+    def round_trips(self) -> int:
+        """HTTP requests received"""
+        return self.httpd.round_trips
+    
+    def build_service(self):
+        """Build a Gmail API client pointed at this server"""
+        document = json.loads(discovery_cache.get_static_doc('gmail', 'v1'))
+        document['rootUrl'] = self.url
+        return build_from_document(document, http=httplib2.Http())
+    
+    def __enter__(self):
+        self.thread.start()
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.httpd.shutdown()
+        self.httpd.server_close()
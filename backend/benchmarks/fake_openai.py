@@ -0,0 +1,150 @@
+"""
+Local fake OpenAI chat completions endpoint for offline benchmarks and tests
+
+Serves POST /v1/chat/completions with a fixed simulated latency per request, answering
+the prompts AIService sends the way gpt-4o-mini would. It records how many requests were
+in flight at once and can answer the first requests with 429 and a Retry-After header.
+Like OpenAI's prompt caching, usage reports a repeated prefix of 1024 tokens or more as
+cached, in steps of 128 tokens; here the prefix is every message but the last.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import re
+import threading
+import time
+
+from app.prompts import estimate_tokens
+
+SUMMARY = 'Weekly newsletter with the latest product updates and an invitation to the autumn sale.'
+
+
+def answer(messages: list, max_tokens: int, response_format: dict = None) -> str:
+    """Reply content for the categorize, summarize, combined and batched prompt shapes"""
+    prompt = '\n'.join(message['content'] for message in messages)
+    if response_format and '"summary"' in prompt:
+        return json.dumps({'category_id': 1, 'summary': SUMMARY})
+    if response_format:
+        keys = re.findall(r'^\[(.+)\]$', prompt, re.MULTILINE)
+        return json.dumps({'results': {key: 1 for key in keys}})
+    if max_tokens <= 10:
+        return '1'
+    return SUMMARY
+
+
+def completion(content: str, messages: list, model: str, cached_tokens: int = 0) -> dict:
+    """A chat.completion resource with usage counted like estimate_tokens does"""
+    prompt_tokens = sum(estimate_tokens(message['content']) for message in messages)
+    completion_tokens = estimate_tokens(content)
+    return {
+        'id': 'chatcmpl-fake',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': model,
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+        'usage': {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+            'prompt_tokens_details': {'cached_tokens': cached_tokens}
+        }
+    }
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _send(self, status: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_POST(self):
+        server = self.server
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        if self.path.rstrip('/') != '/v1/chat/completions':
+            self._send(404, {'error': {'message': f'Unknown path {self.path}'}})
+            return
+        
+        with server.lock:
+            server.request_count += 1
+            rate_limited = server.request_count <= server.rate_limited_requests
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            time.sleep(server.latency)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+        
+        if rate_limited:
+            self._send(
+                429,
+                {'error': {'message': 'Rate limit reached', 'type': 'requests', 'code': 'rate_limit_exceeded'}},
+                {'Retry-After': str(server.retry_after)}
+            )
+            return
+        content = answer(request['messages'], request.get('max_tokens', 0), request.get('response_format'))
+        self._send(200, completion(
+            content, request['messages'], request.get('model', 'gpt-4o-mini'), self._cached_tokens(request['messages'])
+        ))
+    
+    def _cached_tokens(self, messages: list) -> int:
+        prefix = json.dumps(messages[:-1])
+        tokens = sum(estimate_tokens(message['content']) for message in messages[:-1])
+        with self.server.lock:
+            seen = prefix in self.server.prefixes
+            self.server.prefixes.add(prefix)
+        return tokens // 128 * 128 if seen and tokens >= 1024 else 0
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Many clients connect at once when the concurrency limit is high
+    request_queue_size = 256
+
+
+class FakeOpenAIServer:
+    """Run the fake completions endpoint in a background thread"""
+    
+    def __init__(self, latency: float = 0.05, rate_limited_requests: int = 0, retry_after: float = 0.1):
+        self.httpd = _Server(('127.0.0.1', 0), FakeOpenAIHandler)
+        self.httpd.latency = latency
+        self.httpd.rate_limited_requests = rate_limited_requests
+        self.httpd.retry_after = retry_after
+        self.httpd.lock = threading.Lock()
+        self.httpd.request_count = 0
+        self.httpd.in_flight = 0
+        self.httpd.max_in_flight = 0
+        self.httpd.prefixes = set()
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+    
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address
+        return f'http://{host}:{port}/v1'
+    
+    @property
+    def request_count(self) -> int:
+        return self.httpd.request_count
+    
+    @property
+    def max_in_flight(self) -> int:
+        """Most requests the server was handling at the same time"""
+        return self.httpd.max_in_flight
+    
+    def __enter__(self):
+        self.thread.start()
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.httpd.shutdown()
+        self.httpd.server_close()
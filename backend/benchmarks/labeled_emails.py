@@ -0,0 +1,176 @@
+"""
+Labeled emails for measuring the local pre-classifier against the LLM
+
+Each email carries the category the LLM (gpt-4o-mini with the categorize prompt) chose for it,
+None where it answered that no category fits.
+"""
+from typing import Dict, List
+
+CATEGORIES: List[Dict] = [
+    {'id': 1, 'name': 'Newsletters', 'description': 'Newsletters, weekly digests and blog posts from publications and writers I subscribe to'},
+    {'id': 2, 'name': 'Receipts', 'description': 'Purchase receipts, order confirmations, invoices and payment confirmations'},
+    {'id': 3, 'name': 'Shipping', 'description': 'Shipping notifications, delivery updates and package tracking'},
+    {'id': 4, 'name': 'Social', 'description': 'Social network notifications: friend requests, mentions, comments, likes and followers'},
+    {'id': 5, 'name': 'Travel', 'description': 'Flight and hotel bookings, itineraries, boarding passes and check-in reminders'},
+    {'id': 6, 'name': 'Promotions', 'description': 'Marketing offers, sales, discounts, coupons and promotional deals from stores'},
+    {'id': 7, 'name': 'Security', 'description': 'Account security alerts, password resets, sign-in notifications and verification codes'},
+]
+
+
+def _email(label, subject, sender, sender_email, body) -> Dict:
+    return {'label': label, 'subject': subject, 'sender': sender, 'sender_email': sender_email, 'body_text': body}
+
+
+EMAILS: List[Dict] = [
+    # Newsletters
+    _email(1, 'The Weekly Digest: what we read this week', 'The Browser', 'digest@thebrowser.com',
+           'Welcome to this week\'s digest. Five essays worth your time, plus a podcast and a long read on cities. '
+           'You are receiving this newsletter because you subscribed.'),
+    _email(1, 'Issue #214: Rust async in practice', 'This Week in Rust', 'newsletter@this-week-in-rust.org',
+           'Hello and welcome to another issue of the newsletter. Updates from the community, blog posts, '
+           'crate of the week and call for participation.'),
+    _email(1, 'New post: Why we rewrote our build system', 'Engineering Blog', 'blog@engineering.example.com',
+           'A new blog post is up. We explain the rewrite of our build system and what we learned. Read the post.'),
+    _email(1, 'Morning Brew: markets, AI chips and a weekend read', 'Morning Brew', 'crew@morningbrew.com',
+           'Good morning. Here is your daily newsletter: markets recap, the story everyone is talking about, '
+           'and our weekend reading list.'),
+    _email(1, 'Your weekly digest from Medium', 'Medium Daily Digest', 'noreply@medium.com',
+           'Stories picked for you this week from writers you follow. Top posts in technology, design and science.'),
+    _email(1, 'Stratechery Weekly: the aggregation update', 'Ben Thompson', 'email@stratechery.com',
+           'This week\'s articles and the subscriber update, collected in one weekly email for subscribers.'),
+    _email(1, 'The Pragmatic Engineer: the state of hiring', 'The Pragmatic Engineer', 'pragmaticengineer@substack.com',
+           'In this issue of the newsletter: the state of tech hiring, a deep dive on on-call, and reader questions.'),
+    _email(1, 'Python Weekly - Issue 650', 'Python Weekly', 'rahul@pythonweekly.com',
+           'Welcome to issue 650 of Python Weekly. Articles, tutorials, projects and new releases from this week.'),
+    _email(1, 'Notes from the editor: our autumn issue', 'Quarterly Review', 'editor@quarterlyreview.org',
+           'Dear subscriber, the autumn issue is out. Essays, fiction and poetry from our writers.'),
+    _email(1, 'Sunday reading: 7 links worth your time', 'Recomendo', 'hello@recomendo.com',
+           'Our weekly newsletter of short recommendations: tools, books, and tips from our writers.'),
+    
+    # Receipts
+    _email(2, 'Your receipt from Apple', 'Apple', 'no_reply@email.apple.com',
+           'Receipt. Order ID MQ7D8K2. iCloud+ 200GB monthly subscription $2.99. Billed to Visa ending 4242. '
+           'Total $2.99.'),
+    _email(2, 'Order confirmation #112-3345', 'Amazon.com', 'auto-confirm@amazon.com',
+           'Thanks for your order. Your order confirmation: USB-C cable x2, order total $18.98. '
+           'We\'ll send a confirmation when your items ship.'),
+    _email(2, 'Your Uber receipt for Tuesday evening', 'Uber Receipts', 'noreply@uber.com',
+           'Thanks for riding. Total $23.40. Payment: Mastercard 5555. Download the PDF receipt for expenses.'),
+    _email(2, 'Invoice INV-2025-0042 from Figma', 'Figma Billing', 'billing@figma.com',
+           'Here is your invoice for the Professional plan. Amount paid $45.00. Payment confirmation attached.'),
+    _email(2, 'Payment received - thank you', 'City Utilities', 'billing@cityutilities.gov',
+           'We received your payment of $84.12 for account 55-201. This is your payment confirmation and receipt.'),
+    _email(2, 'Your order is confirmed', 'Etsy', 'transaction@etsy.com',
+           'Your order from HandmadeMugs is confirmed. Order number 2291883. Item total $32.00, tax $2.60.'),
+    _email(2, 'Receipt for your donation', 'Wikimedia Foundation', 'donate@wikimedia.org',
+           'Thank you for your donation of $10. Please keep this receipt for your tax records.'),
+    _email(2, 'Your Steam purchase', 'Steam', 'noreply@steampowered.com',
+           'Thank you for your purchase. Order total 19,99 EUR. Payment method PayPal. Keep this receipt.'),
+    _email(2, 'Your DoorDash order receipt', 'DoorDash', 'no-reply@doordash.com',
+           'Order receipt: Pad Thai, Spring rolls. Subtotal $27.50, fees $4.99, total charged $36.10.'),
+    _email(2, 'Invoice paid: AWS billing statement', 'Amazon Web Services', 'aws-billing@amazon.com',
+           'Your invoice for October has been paid. Total amount $12.43 charged to your payment method.'),
+    
+    # Shipping
+    _email(3, 'Your package has shipped', 'Amazon.com', 'shipment-tracking@amazon.com',
+           'Good news, your package shipped. Track your package: arriving Thursday. Carrier UPS, tracking 1Z999.'),
+    _email(3, 'Out for delivery today', 'UPS', 'mcinfo@ups.com',
+           'Your UPS package is out for delivery today. Estimated delivery between 2pm and 6pm. Track shipment.'),
+    _email(3, 'Delivered: your package was left at the front door', 'USPS Informed Delivery', 'usps@informeddelivery.usps.com',
+           'Your item was delivered at 11:32 am in or at the mailbox. Tracking number 9400 1000.'),
+    _email(3, 'DHL: your shipment is on its way', 'DHL Express', 'noreply@dhl.com',
+           'Shipment 48291 is in transit. Delivery expected tomorrow. Track your shipment online.'),
+    _email(3, 'Tracking update for order 2291883', 'Etsy', 'transaction@etsy.com',
+           'Your order shipped! Tracking number LX123456789. The seller shipped your package with USPS.'),
+    _email(3, 'Delivery attempted', 'FedEx', 'trackingupdates@fedex.com',
+           'We attempted delivery of your package today. Schedule a redelivery or track the package.'),
+    _email(3, 'Your parcel is arriving tomorrow', 'Royal Mail', 'no-reply@royalmail.com',
+           'Your parcel from ShopCo will be delivered tomorrow. Tracking reference RM1234.'),
+    _email(3, 'Shipping update: delayed', 'Best Buy', 'bestbuyinfo@emailinfo.bestbuy.com',
+           'Your shipment is delayed. New estimated delivery date Friday. Track your package for updates.'),
+    _email(3, 'Your order is on the way', 'IKEA', 'noreply@ikea.com',
+           'Your delivery is scheduled. The delivery team will call 30 minutes before arrival. Track delivery.'),
+    
+    # Social
+    _email(4, 'Anna Smith sent you a friend request', 'Facebook', 'notification@facebookmail.com',
+           'Anna Smith wants to be friends on Facebook. Confirm friend request. 12 mutual friends.'),
+    _email(4, 'You were mentioned in a comment', 'LinkedIn', 'notifications-noreply@linkedin.com',
+           'Sam mentioned you in a comment on a post: "great writeup @you". See the comment and reply.'),
+    _email(4, 'New followers on Instagram', 'Instagram', 'no-reply@mail.instagram.com',
+           'jane_doe and 3 others started following you. See your new followers.'),
+    _email(4, '5 people liked your post', 'Mastodon', 'notifications@mastodon.social',
+           'Your post got 5 likes and 2 boosts. alex replied to your post. See notifications.'),
+    _email(4, 'Reply to your comment on r/python', 'Reddit', 'noreply@redditmail.com',
+           'u/dev42 replied to your comment in r/python: "Thanks, that fixed it". View the thread.'),
+    _email(4, 'Jordan mentioned you on X', 'X', 'notify@x.com',
+           'Jordan mentioned you in a post. See the post and reply. You have 3 new notifications.'),
+    _email(4, 'You have new connection requests', 'LinkedIn', 'invitations@linkedin.com',
+           'Priya, Recruiter at Acme, wants to connect. Accept the connection request on LinkedIn.'),
+    _email(4, 'Maria commented on your photo', 'Facebook', 'notification@facebookmail.com',
+           'Maria commented on your photo: "Lovely view!". See the comment and like or reply.'),
+    
+    # Travel
+    _email(5, 'Your flight confirmation: SFO to JFK', 'United Airlines', 'unitedairlines@united.com',
+           'Confirmation number K7P2QX. Flight UA 1234 departs San Francisco 8:05 am. Your itinerary and seats.'),
+    _email(5, 'Check-in is now open for your flight', 'Delta', 'deltaairlines@t.delta.com',
+           'Check in now for your flight DL 402 tomorrow. Get your boarding pass in the app.'),
+    _email(5, 'Booking confirmed: Hotel Lisboa, 3 nights', 'Booking.com', 'noreply@booking.com',
+           'Your booking is confirmed. Hotel Lisboa, check-in Friday, check-out Monday. Booking number 3344.'),
+    _email(5, 'Your boarding pass', 'Lufthansa', 'online@booking-lufthansa.com',
+           'Here is your boarding pass for LH 401 Frankfurt to New York. Gate closes 20 minutes before departure.'),
+    _email(5, 'Trip itinerary: Tokyo, March 3-10', 'Expedia', 'travel@expediamail.com',
+           'Your trip itinerary: flight NH 7, hotel in Shinjuku, car rental pickup at Narita.'),
+    _email(5, 'Reminder: your stay starts tomorrow', 'Airbnb', 'automated@airbnb.com',
+           'Your reservation in Porto starts tomorrow. Check-in after 3pm. Message your host for directions.'),
+    _email(5, 'Your train booking', 'Amtrak', 'Amtrak@e.amtrak.com',
+           'Reservation number 8A2F1C. Northeast Regional departs Boston 7:10 am. eTicket and itinerary attached.'),
+    _email(5, 'Flight schedule change', 'American Airlines', 'no-reply@info.email.aa.com',
+           'The schedule of your flight AA 100 changed. New departure 9:45 am. Review your itinerary and booking.'),
+    
+    # Promotions
+    _email(6, '48 hours only: 30% off everything', 'J.Crew', 'jcrew@email.jcrew.com',
+           'Our biggest sale of the season. Take 30% off everything with code SAVE30. Shop the sale now.'),
+    _email(6, 'A coupon just for you', 'Target', 'target@em.target.com',
+           'Here is a coupon for $10 off your next purchase of $50. Deals on home, toys and more.'),
+    _email(6, 'Black Friday deals start now', 'Best Buy', 'bestbuydeals@emailinfo.bestbuy.com',
+           'Early Black Friday deals on TVs, laptops and headphones. Discounts up to 40%. Shop deals.'),
+    _email(6, 'Free shipping + 20% off this weekend', 'Uniqlo', 'uniqlo@mail.uniqlo.com',
+           'This weekend only: 20% off sweaters and free shipping on all orders. Limited time offer.'),
+    _email(6, 'You left something in your cart', 'Wayfair', 'shop@e.wayfair.com',
+           'Your cart misses you. Complete your purchase today and save 15% with this exclusive offer.'),
+    _email(6, 'Members save more this week', 'Costco', 'costco@online.costco.com',
+           'Member-only savings on electronics and groceries. Special offers valid through Sunday.'),
+    _email(6, 'Flash sale: up to 60% off', 'Nike', 'nike@official.nike.com',
+           'Flash sale on running shoes and apparel. Discounts up to 60% while supplies last. Shop the sale.'),
+    _email(6, 'Your exclusive discount code inside', 'Sephora', 'sephora@beauty.sephora.com',
+           'Use code BEAUTY15 for 15% off. Plus free samples with every order. Offer ends Monday.'),
+    
+    # Security
+    _email(7, 'Security alert: new sign-in on Windows', 'Google', 'no-reply@accounts.google.com',
+           'A new sign-in to your Google Account on a Windows device. If this was you, you don\'t need to do '
+           'anything. If not, secure your account.'),
+    _email(7, 'Reset your password', 'Dropbox', 'no-reply@dropbox.com',
+           'We received a request to reset the password for your account. Click the link to reset your password.'),
+    _email(7, 'Your verification code is 482913', 'Microsoft account team', 'account-security-noreply@accountprotection.microsoft.com',
+           'Use this verification code to sign in: 482913. If you didn\'t request it, someone may be trying to access your account.'),
+    _email(7, 'Unusual sign-in activity', 'Microsoft account team', 'account-security-noreply@accountprotection.microsoft.com',
+           'We detected unusual sign-in activity on your account from a new location. Review the security alert.'),
+    _email(7, 'Two-factor authentication enabled', 'GitHub', 'noreply@github.com',
+           'Two-factor authentication was enabled on your account. Keep your recovery codes safe.'),
+    _email(7, 'Your password was changed', 'Slack', 'feedback@slack.com',
+           'The password for your Slack account was changed. If you did not change your password, reset it now.'),
+    _email(7, 'Confirm your sign-in', 'PayPal', 'service@paypal.com',
+           'Enter this security code to confirm your sign-in: 901122. The code expires in 10 minutes.'),
+    
+    # No category fits
+    _email(None, 'Dinner on Saturday?', 'Chris', 'chris.w@gmail.com',
+           'Hey! Are you free for dinner on Saturday? Thinking of the new ramen place around 7.'),
+    _email(None, 'Re: project timeline', 'Dana Lee', 'dana@acme-corp.com',
+           'Thanks for the update. Can we move the review to Thursday? I need another day for the estimates.'),
+    _email(None, 'Photos from the trip', 'Mom', 'mom.family@yahoo.com',
+           'Here are the photos from last weekend. The kids loved the lake.'),
+    _email(None, 'Interview scheduling', 'Acme Recruiting', 'recruiting@acme-corp.com',
+           'We would like to schedule a 45 minute interview with the hiring manager next week. Please share times.'),
+    _email(None, 'Meeting notes 10/6', 'Team Bot', 'notes@acme-corp.com',
+           'Notes from the Monday meeting: roadmap, staffing, next steps. Action items assigned to owners.'),
+]
@@ -0,0 +1,213 @@
+"""
+Gmail message payloads shaped like real mail, for offline benchmarks
+
+Each builder returns a Gmail API message resource (format='full'). Bodies that Gmail
+would only reference by attachmentId are kept in ATTACHMENTS, keyed by that ID.
+"""
+from typing import Callable, Dict, List
+import base64
+import random
+
+ATTACHMENTS: Dict[str, str] = {}
+
+LOREM = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor. '
+
+
+def encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode()
+
+
+def text_part(mime_type: str, content: str, charset: str = 'utf-8') -> Dict:
+    data = content.encode(charset)
+    return {
+        'mimeType': mime_type,
+        'headers': [{'name': 'Content-Type', 'value': f'{mime_type}; charset="{charset}"'}],
+        'body': {'size': len(data), 'data': encode(data)}
+    }
+
+
+def attachment_part(filename: str, mime_type: str, size: int) -> Dict:
+    attachment_id = f'att-{len(ATTACHMENTS)}'
+    ATTACHMENTS[attachment_id] = encode(random.Random(size).randbytes(size))
+    return {
+        'mimeType': mime_type,
+        'filename': filename,
+        'headers': [{'name': 'Content-Disposition', 'value': f'attachment; filename="{filename}"'}],
+        'body': {'size': size, 'attachmentId': attachment_id}
+    }
+
+
+def inline_image_part(size: int) -> Dict:
+    data = random.Random(size).randbytes(size)
+    return {
+        'mimeType': 'image/png',
+        'filename': 'logo.png',
+        'headers': [{'name': 'Content-Disposition', 'value': 'inline; filename="logo.png"'}],
+        'body': {'size': size, 'data': encode(data)}
+    }
+
+
+def multipart(mime_type: str, *parts: Dict) -> Dict:
+    return {'mimeType': mime_type, 'headers': [], 'body': {'size': 0}, 'parts': list(parts)}
+
+
+def html_document(paragraphs: int) -> str:
+    rows = ''.join(
+        f'<tr><td style="padding:8px;font-family:Arial"><p>{LOREM}</p><a href="https://example.com/item/{i}">Read more</a></td></tr>'
+        for i in range(paragraphs)
+    )
+    return (
+        '<html><head><style>td { color: #333; } .hidden { display: none; }</style></head>'
+        f'<body><table>{rows}</table><p><a href="https://example.com/unsubscribe">Unsubscribe</a></p></body></html>'
+    )
+
+
+def message(message_id: str, payload: Dict, headers: List[Dict]) -> Dict:
+    payload['headers'] = headers + payload.get('headers', [])
+    return {'id': message_id, 'threadId': f'thread-{message_id}', 'labelIds': ['INBOX'], 'payload': payload}
+
+
+def standard_headers(subject: str, sender: str = '"News Corp" <news@example.com>') -> List[Dict]:
+    return [
+        {'name': 'From', 'value': sender},
+        {'name': 'To', 'value': 'me@example.com'},
+        {'name': 'Subject', 'value': subject},
+        {'name': 'Date', 'value': 'Mon, 6 Oct 2025 10:00:00 +0000'},
+        {'name': 'List-Unsubscribe', 'value': '<mailto:unsub@example.com>, <https://example.com/unsubscribe?id=1>'},
+    ]
+
+
+def newsletter(message_id: str) -> Dict:
+    """multipart/alternative with a short text part and a ~40KB HTML part"""
+    return message(message_id, multipart(
+        'multipart/alternative',
+        text_part('text/plain', LOREM * 20),
+        text_part('text/html', html_document(150))
+    ), standard_headers('Weekly newsletter'))
+
+
+def marketing(message_id: str) -> Dict:
+    """mixed > related > alternative, inline images and a 500KB PDF, like most marketing mail"""
+    return message(message_id, multipart(
+        'multipart/mixed',
+        multipart(
+            'multipart/related',
+            multipart(
+                'multipart/alternative',
+                text_part('text/plain', LOREM * 30),
+                text_part('text/html', html_document(300))
+            ),
+            inline_image_part(20000),
+            inline_image_part(60000)
+        ),
+        attachment_part('catalog.pdf', 'application/pdf', 500000)
+    ), standard_headers('Autumn sale'))
+
+
+def forwarded(message_id: str) -> Dict:
+    """A forward: a short note plus the original message as message/rfc822"""
+    original = multipart(
+        'multipart/alternative',
+        text_part('text/plain', LOREM * 15),
+        text_part('text/html', html_document(60))
+    )
+    return message(message_id, multipart(
+        'multipart/mixed',
+        text_part('text/plain', 'See below.\n'),
+        {'mimeType': 'message/rfc822', 'headers': [], 'body': {'size': 0}, 'parts': [original]}
+    ), standard_headers('Fwd: meeting notes', sender='Alice <alice@example.com>'))
+
+
+def legacy_charsets(message_id: str) -> Dict:
+    """Single parts in windows-1252 and ISO-2022-JP, as older mailers still send"""
+    return message(message_id, multipart(
+        'multipart/alternative',
+        text_part('text/plain', '“Quoted” café — ' * 200, charset='windows-1252'),
+        text_part('text/html', '<p>' + 'お知らせです。' * 300 + '</p>', charset='iso-2022-jp')
+    ), standard_headers('Notice', sender='=?ISO-2022-JP?B?GyRCJCokaxsoQg==?= <notice@example.jp>'))
+
+
+def huge_html(message_id: str) -> Dict:
+    """A single 2MB text/html part, e.g. a report or an export pasted inline"""
+    return message(message_id, text_part('text/html', html_document(7500)), standard_headers('Monthly report'))
+
+
+def large_body_by_attachment_id(message_id: str) -> Dict:
+    """Gmail moves large bodies out of the message resource behind an attachmentId"""
+    html = html_document(3000).encode('utf-8')
+    attachment_id = f'att-{len(ATTACHMENTS)}'
+    ATTACHMENTS[attachment_id] = encode(html)
+    return message(message_id, multipart(
+        'multipart/alternative',
+        text_part('text/plain', LOREM * 600),
+        {
+            'mimeType': 'text/html',
+            'headers': [{'name': 'Content-Type', 'value': 'text/html; charset=utf-8'}],
+            'body': {'size': len(html), 'attachmentId': attachment_id}
+        }
+    ), standard_headers('Statement'))
+
+
+SHAPES: Dict[str, Callable[[str], Dict]] = {
+    'newsletter': newsletter,
+    'marketing': marketing,
+    'forwarded': forwarded,
+    'legacy_charsets': legacy_charsets,
+    'huge_html': huge_html,
+    'large_body_by_attachment_id': large_body_by_attachment_id,
+}
+
+
+def corpus(per_shape: int = 20) -> Dict[str, List[Dict]]:
+    """per_shape messages of every shape"""
+    return {name: [build(f'{name}-{i}') for i in range(per_shape)] for name, build in SHAPES.items()}
+
+
+ODD_CHARSETS = ['windows-1252', 'iso-8859-1', 'iso-8859-15', 'koi8-r', 'shift_jis', 'iso-2022-jp', 'gb2312', 'utf-16']
+SAMPLE_TEXT = {
+    'iso-8859-1': 'Café naïve résumé. ',
+    'iso-8859-15': 'Café naïve résumé € ',
+    'koi8-r': 'Новости недели. ',
+    'shift_jis': 'お知らせです。',
+    'iso-2022-jp': 'お知らせです。',
+    'gb2312': '本周新闻。',
+}
+
+
+def synthetic(message_id: str, seed: int, depth: int = 3, html_kb: int = 64, header_count: int = 40) -> Dict:
+    """
+    A random but reproducible message: multiparts nested depth levels deep, an HTML part of
+    about html_kb KB, header_count extra headers and a body in an odd charset
+    """
+    rng = random.Random(seed)
+    charset = rng.choice(ODD_CHARSETS)
+    sample = SAMPLE_TEXT.get(charset, 'Café “naïve” résumé — ')
+    
+    leaf = multipart(
+        'multipart/alternative',
+        text_part('text/plain', sample * rng.randint(50, 400), charset=charset),
+        text_part('text/html', html_document(max(1, html_kb * 1024 // 190)))
+    )
+    for level in range(depth):
+        siblings = [inline_image_part(rng.randint(1000, 20000))]
+        if rng.random() < 0.5:
+            siblings.append(attachment_part(f'file-{level}.pdf', 'application/pdf', rng.randint(1000, 50000)))
+        leaf = multipart(rng.choice(['multipart/mixed', 'multipart/related']), leaf, *siblings)
+    
+    headers = standard_headers(f'Synthetic {message_id}', sender=rng.choice([
+        '"Shop, Inc." <offers@shop.example.com>',
+        'noreply@example.org',
+        '=?UTF-8?B?w4lxdWlwZSBTdXBwb3J0?= <support@example.fr>',
+        'Long Display Name With Many Words <very.long.address+tag@sub.domain.example.co.uk>',
+    ]))
+    headers.append({'name': 'List-Unsubscribe-Post', 'value': 'List-Unsubscribe=One-Click'})
+    headers += [
+        {'name': rng.choice(['Received', 'X-Mailer-Trace', 'ARC-Seal', 'DKIM-Signature']), 'value': 'x' * rng.randint(40, 400)}
+        for _ in range(header_count)
+    ]
+    return message(message_id, leaf, headers)
+
+
+def generate(count: int, seed: int = 0, **kwargs) -> List[Dict]:
+    """count synthetic messages, the same ones for the same seed"""
+    return [synthetic(f'synthetic-{seed}-{i}', seed * 100003 + i, **kwargs) for i in range(count)]
@@ -0,0 +1,42 @@
+from logging.config import fileConfig
+from sqlalchemy import create_engine
+from alembic import context
+
+from app.database import Base
+from app import models  # noqa: F401, registers the tables on Base.metadata
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+
+def get_url() -> str:
+    """The ini's sqlalchemy.url when set (tests), the app's database otherwise"""
+    url = config.get_main_option("sqlalchemy.url")
+    if url:
+        return url
+    from app.config import settings
+    return settings.DATABASE_URL
+
+
+def run_migrations_offline():
+    context.configure(url=get_url(), target_metadata=target_metadata, literal_binds=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    engine = create_engine(get_url())
+    with engine.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata)
+        with context.begin_transaction():
+            context.run_migrations()
+    engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
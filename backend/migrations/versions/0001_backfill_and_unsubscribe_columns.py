@@ -0,0 +1,44 @@
+"""Backfill checkpoint and unsubscribe option columns
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# Columns added to tables that create_all only creates when they don't exist yet
+COLUMNS = [
+    ('gmail_accounts', sa.Column('backfill_page_token', sa.String(), nullable=True)),
+    ('gmail_accounts', sa.Column('backfill_completed_at', sa.DateTime(), nullable=True)),
+    ('emails', sa.Column('unsubscribe_options', sa.JSON(), nullable=True)),
+]
+
+
+def _existing_columns(table: str):
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table(table):
+        return None
+    return {column['name'] for column in inspector.get_columns(table)}
+
+
+def upgrade():
+    # Databases created after these columns were added already have them, a fresh one has no tables yet
+    for table, column in COLUMNS:
+        existing = _existing_columns(table)
+        if existing is not None and column.name not in existing:
+            op.add_column(table, column)
+
+
+def downgrade():
+    for table, column in reversed(COLUMNS):
+        existing = _existing_columns(table)
+        if existing is not None and column.name in existing:
+            with op.batch_alter_table(table) as batch_op:
+                batch_op.drop_column(column.name)
@@ -0,0 +1,8 @@
+import os
+
+# Run background jobs in-process with an in-memory broker, no Redis needed
+os.environ.setdefault("CELERY_TASK_ALWAYS_EAGER", "true")
+# Tests that need the AI result cache build their own
+os.environ.setdefault("AI_CACHE_ENABLED", "false")
+# Tests that exercise the local pre-classifier turn it on themselves
+os.environ.setdefault("LOCAL_CLASSIFIER_ENABLED", "false")
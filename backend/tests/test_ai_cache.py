@@ -0,0 +1,117 @@
+import pytest
+from unittest.mock import Mock, patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.ai_cache import AIResultCache, category_key, content_key, purge_expired, summary_key
+from app.ai_service import AIService
+from app.database import Base
+from app.metrics import metrics
+from app.models import AIResult
+
+CATEGORIES = [
+    {"id": 1, "name": "Newsletters", "description": "Marketing and promotional emails, newsletters"},
+    {"id": 2, "name": "Receipts", "description": "Purchase receipts and order confirmations"}
+]
+
+def make_email(message_id="m1", tracking="abc"):
+    return {
+        "message_id": message_id,
+        "subject": "Weekly  Newsletter",
+        "sender": "News Corp",
+        "sender_email": "News@Example.com",
+        "body_text": f"This week's updates.\n\nRead more: https://example.com/post?utm_source={tracking}"
+    }
+
+def make_response(content):
+    response = Mock()
+    response.choices = [Mock()]
+    response.choices[0].message.content = content
+    return response
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture
+def cache(session_factory):
+    metrics.reset()
+    return AIResultCache(max_entries=100, ttl=3600, session_factory=session_factory)
+
+def test_keys_ignore_tracking_and_formatting_but_not_categories():
+    copy = {**make_email("m2", tracking="xyz"), "subject": "weekly newsletter", "sender_email": "news@example.com"}
+    
+    assert content_key(make_email()) == content_key(copy)
+    assert content_key(make_email()) != content_key({**copy, "body_text": "Something else"})
+    assert category_key(make_email(), CATEGORIES) == category_key(copy, list(reversed(CATEGORIES)))
+    renamed = [CATEGORIES[0], {**CATEGORIES[1], "description": "Invoices"}]
+    assert category_key(make_email(), CATEGORIES) != category_key(make_email(), renamed)
+
+def test_lru_evicts_oldest_and_db_tier_survives(cache, session_factory):
+    cache.max_entries = 2
+    for key in ("summary:a", "summary:b", "summary:c"):
+        cache.set(key, {"summary": key})
+    
+    assert list(cache._entries) == ["summary:b", "summary:c"]
+    assert cache.get("summary:a") == {"summary": "summary:a"}
+    
+    # Another process sees the persistent tier
+    other = AIResultCache(ttl=3600, session_factory=session_factory)
+    assert other.get("summary:c") == {"summary": "summary:c"}
+    assert other.get("summary:missing") is None
+    counters = metrics.snapshot()["counters"]
+    assert counters["ai.cache.hits.db"] == 2
+    assert counters["ai.cache.misses.summary"] == 1
+
+def test_expired_entries_are_misses_and_purged(session_factory):
+    cache = AIResultCache(ttl=0, session_factory=session_factory)
+    cache.set("category:a", {"category_id": 1})
+    
+    assert cache.get("category:a") is None
+    db = session_factory()
+    assert purge_expired(db) == 1
+    assert db.query(AIResult).count() == 0
+
+def test_identical_email_is_not_sent_again(cache):
+    ai_service = AIService(cache=cache)
+    with patch.object(ai_service.client.chat.completions, "create") as mock_create:
+        mock_create.return_value = make_response('{"category_id": 2, "summary": "Weekly updates"}')
+        
+        first = ai_service.process_email(make_email("m1"), CATEGORIES, combined=True)
+        second = ai_service.process_email(make_email("m2", tracking="other"), CATEGORIES, combined=True)
+        # Separate mode reuses what the combined call stored
+        third = ai_service.process_email(make_email("m3"), CATEGORIES, combined=False)
+    
+    assert first == {"category_id": 2, "summary": "Weekly updates", "source": "llm"}
+    assert second == third == {"category_id": 2, "summary": "Weekly updates", "source": "cache"}
+    assert mock_create.call_count == 1
+    counters = metrics.snapshot()["counters"]
+    assert counters["ai.cache.saved_calls"] == 3
+    assert counters["ai.cache.saved_prompt_tokens"] > 0
+
+def test_failures_are_not_cached(cache):
+    ai_service = AIService(cache=cache)
+    with patch.object(ai_service.client.chat.completions, "create") as mock_create:
+        mock_create.side_effect = [Exception("API down"), make_response("Weekly updates")]
+        
+        assert ai_service.summarize_email(make_email()) == "Unable to generate summary."
+        assert ai_service.summarize_email(make_email()) == "Weekly updates"
+    
+    assert cache.get(summary_key(make_email())) == {"summary": "Weekly updates"}
+
+def test_batch_only_sends_uncached_emails(cache):
+    ai_service = AIService(cache=cache)
+    cache.set(category_key(make_email(), CATEGORIES), {"category_id": 1})
+    other = {**make_email("m2"), "subject": "Your receipt"}
+    with patch.object(ai_service.client.chat.completions, "create") as mock_create:
+        mock_create.return_value = make_response('{"results": {"m2": 2}}')
+        
+        results = ai_service.categorize_emails([make_email("m1"), other], CATEGORIES)
+    
+    assert results == {"m1": 1, "m2": 2}
+    prompt = mock_create.call_args.kwargs["messages"][1]["content"]
+    assert "[m1]" not in prompt and "[m2]" in prompt
+    assert cache.get(category_key(other, CATEGORIES)) == {"category_id": 2}
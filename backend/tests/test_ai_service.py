@@ -1,6 +1,8 @@
 import pytest
 from unittest.mock import Mock, patch
 from app.ai_service import AIService
+import json
+import re
 
 @pytest.fixture
 def ai_service():
@@ -63,7 +65,7 @@ def test_categorize_email_no_match(ai_service, sample_email, sample_categories):
 
 def test_process_email(ai_service, sample_email, sample_categories):
     with patch.object(ai_service.client.chat.completions, 'create') as mock_create:
-        # Mock responses for both categorization and summarization
+        # Mock responses for separate categorization and summarization
         mock_response_cat = Mock()
         mock_response_cat.choices = [Mock()]
         mock_response_cat.choices[0].message.content = "1"
@@ -74,9 +76,180 @@ def test_process_email(ai_service, sample_email, sample_categories):
         
         mock_create.side_effect = [mock_response_cat, mock_response_sum]
         
-        result = ai_service.process_email(sample_email, sample_categories)
+        result = ai_service.process_email(sample_email, sample_categories, combined=False)
         
         assert result["category_id"] == 1
         assert result["summary"] == "Test summary"
         assert mock_create.call_count == 2
 
+
+def make_response(content):
+    response = Mock()
+    response.choices = [Mock()]
+    response.choices[0].message.content = content
+    return response
+
+def test_categorize_emails_in_one_call(ai_service, sample_email, sample_categories):
+    emails = [{**sample_email, 'message_id': f'm{i}'} for i in range(3)]
+    with patch.object(ai_service.client.chat.completions, 'create') as mock_create:
+        mock_create.return_value = make_response('{"results": {"m0": 1, "m1": 0, "m2": "3"}}')
+        
+        results = ai_service.categorize_emails(emails, sample_categories)
+        
+        assert results == {'m0': 1, 'm1': None, 'm2': 3}
+        assert mock_create.call_count == 1
+        assert mock_create.call_args.kwargs['response_format'] == {"type": "json_object"}
+
+def test_categorize_emails_retries_only_invalid_answers(ai_service, sample_email, sample_categories):
+    emails = [{**sample_email, 'message_id': f'm{i}'} for i in range(3)]
+    with patch.object(ai_service.client.chat.completions, 'create') as mock_create:
+        mock_create.side_effect = [
+            make_response('{"results": {"m0": 1, "m1": 42}}'),
+            make_response('{"results": {"m1": 2, "m2": 3}}')
+        ]
+        
+        results = ai_service.categorize_emails(emails, sample_categories)
+        
+        assert results == {'m0': 1, 'm1': 2, 'm2': 3}
+        retry_prompt = mock_create.call_args_list[1].kwargs['messages'][1]['content']
+        assert '[m0]' not in retry_prompt and '[m1]' in retry_prompt and '[m2]' in retry_prompt
+
+def test_categorize_emails_batches_by_token_budget(ai_service, sample_categories):
+    emails = [{'message_id': f'm{i}', 'subject': 'Hi', 'body_text': 'x' * 1000} for i in range(5)]
+    # Counted with the estimate, whether or not the tokenizer is installed
+    with patch('app.prompts._get_encoding', return_value=None), \
+         patch('app.ai_service.settings.AI_BATCH_TOKEN_BUDGET', 700), \
+         patch.object(ai_service.client.chat.completions, 'create') as mock_create:
+        mock_create.side_effect = lambda **kwargs: make_response(json.dumps({
+            'results': {key: 1 for key in re.findall(r'\[(m\d)\]', kwargs['messages'][1]['content'])}
+        }))
+        
+        results = ai_service.categorize_emails(emails, sample_categories)
+        
+        assert set(results.values()) == {1}
+        # Each email is ~270 tokens, two fit next to the category list
+        assert mock_create.call_count == 3
+
+def test_process_email_combined(ai_service, sample_email, sample_categories):
+    with patch.object(ai_service.client.chat.completions, 'create') as mock_create:
+        mock_create.return_value = make_response('{"category_id": 1, "summary": "Weekly updates"}')
+        
+        result = ai_service.process_email(sample_email, sample_categories, combined=True)
+        
+        assert result == {'category_id': 1, 'summary': 'Weekly updates', 'source': 'llm'}
+        assert mock_create.call_count == 1
+        assert mock_create.call_args.kwargs['response_format'] == {"type": "json_object"}
+
+def test_process_email_combined_invalid_category_asks_again(ai_service, sample_email, sample_categories):
+    with patch.object(ai_service.client.chat.completions, 'create') as mock_create:
+        mock_create.side_effect = [
+            make_response('{"category_id": 42, "summary": "Weekly updates"}'),
+            make_response('2')
+        ]
+        
+        result = ai_service.process_email(sample_email, sample_categories, combined=True)
+        
+        assert result == {'category_id': 2, 'summary': 'Weekly updates', 'source': 'llm'}
+        assert mock_create.call_count == 2
+
+def test_process_email_combined_falls_back_to_separate_calls(ai_service, sample_email, sample_categories):
+    with patch.object(ai_service.client.chat.completions, 'create') as mock_create:
+        mock_create.side_effect = [
+            make_response('not json'),
+            make_response('3'),
+            make_response('Test summary')
+        ]
+        
+        result = ai_service.process_email(sample_email, sample_categories, combined=True)
+        
+        assert result == {'category_id': 3, 'summary': 'Test summary', 'source': 'llm'}
+        assert mock_create.call_count == 3
+
+def test_categorize_emails_leaves_out_emails_it_could_not_categorize(ai_service, sample_email, sample_categories):
+    emails = [{**sample_email, 'message_id': f'm{i}'} for i in range(3)]
+    with patch('app.ai_service.settings.AI_BATCH_MAX_RETRIES', 1), \
+         patch.object(ai_service.client.chat.completions, 'create') as mock_create:
+        mock_create.side_effect = [
+            make_response('{"results": {"m0": 1, "m1": 0, "m2": 42}}'),
+            RuntimeError("OpenAI unavailable")
+        ]
+        
+        assert ai_service.categorize_emails(emails, sample_categories) == {'m0': 1, 'm1': None}
+    
+    with patch.object(ai_service.client.chat.completions, 'create', side_effect=RuntimeError("OpenAI unavailable")), \
+         patch.object(ai_service, 'summarize_emails', side_effect=lambda emails: ['Summary'] * len(emails)):
+        results = ai_service.process_emails(emails[:1], sample_categories, combined=False)
+    
+    assert results[0]['category_id'] is None
+    assert "OpenAI unavailable" in results[0]['error']
+
+def test_process_emails_summarizes_only_categorized_emails(ai_service, sample_email, sample_categories):
+    emails = [{**sample_email, 'message_id': f'm{i}'} for i in range(2)]
+    with patch.object(ai_service.client.chat.completions, 'create') as mock_create:
+        mock_create.side_effect = [
+            make_response('{"results": {"m0": 1, "m1": 0}}'),
+            make_response('Weekly updates')
+        ]
+        
+        results = ai_service.process_emails(emails, sample_categories, combined=False)
+    
+    assert results == [
+        {'category_id': 1, 'summary': 'Weekly updates', 'source': 'llm'},
+        {'category_id': None, 'summary': None, 'source': 'llm'}
+    ]
+    assert mock_create.call_count == 2
+
+def test_process_emails_uses_one_combined_call_per_email(ai_service, sample_email, sample_categories):
+    emails = [{**sample_email, 'message_id': f'm{i}'} for i in range(3)]
+    with patch.object(ai_service.client.chat.completions, 'create') as mock_create:
+        mock_create.return_value = make_response('{"category_id": 2, "summary": "Weekly updates"}')
+        
+        results = ai_service.process_emails(emails, sample_categories, combined=True)
+    
+    assert results == [{'category_id': 2, 'summary': 'Weekly updates', 'source': 'llm'}] * 3
+    # Not one batch plus three summaries
+    assert mock_create.call_count == 3
+
+def test_process_emails_batches_whatever_the_combined_mode(ai_service, sample_email, sample_categories):
+    emails = [{**sample_email, 'message_id': f'm{i}'} for i in range(3)]
+    with patch('app.ai_service.settings.AI_COMBINED_MODE', True), \
+         patch.object(ai_service.client.chat.completions, 'create') as mock_create:
+        mock_create.side_effect = [
+            make_response('{"results": {"m0": 1, "m1": 0, "m2": 0}}'),
+            make_response('Weekly updates')
+        ]
+        
+        results = ai_service.process_emails(emails, sample_categories)
+    
+    assert [result['category_id'] for result in results] == [1, None, None]
+    # One batch and a summary of the one match, not three combined calls
+    assert mock_create.call_count == 2
+
+def test_completions_share_the_process_wide_limit(sample_email):
+    import threading
+    import time
+    from app import ai_service as ai_service_module
+    lock = threading.Lock()
+    state = {'in_flight': 0, 'peak': 0}
+    
+    def create(**request):
+        with lock:
+            state['in_flight'] += 1
+            state['peak'] = max(state['peak'], state['in_flight'])
+        time.sleep(0.02)
+        with lock:
+            state['in_flight'] -= 1
+        return make_response('Summary')
+    
+    services = [AIService() for _ in range(2)]
+    emails = [{**sample_email, 'message_id': f'm{i}'} for i in range(8)]
+    with patch('app.ai_service.settings.AI_MAX_IN_FLIGHT', 3), patch.object(ai_service_module, '_limiter', None):
+        for service in services:
+            service.client.chat.completions.create = create
+        threads = [threading.Thread(target=service.summarize_emails, args=(emails,)) for service in services]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    
+    assert state['peak'] == 3
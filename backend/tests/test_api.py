@@ -4,8 +4,9 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from app.main import app
 from app.database import Base, get_db
-from app.models import User, Category, GmailAccount
+from app.models import User, Category, GmailAccount, SenderAffinity
 from app.auth import create_access_token
+from app.sender_affinity import NO_CATEGORY
 
 # Test database
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -128,6 +129,49 @@ def test_update_category(client, auth_headers):
     data = response.json()
     assert data["name"] == "Updated Category"
 
+def test_editing_or_deleting_category_expires_sender_affinities(client, auth_headers, test_user):
+    ids = [
+        client.post("/categories/", json={"name": name, "description": name}, headers=auth_headers).json()["id"]
+        for name in ("Newsletters", "Receipts")
+    ]
+    db = TestingSessionLocal()
+    for category_id in ids + [NO_CATEGORY]:
+        db.add(SenderAffinity(user_id=test_user.id, sender=f"{category_id}@example.com", category_id=category_id, count=5))
+    db.commit()
+    
+    # Saving the same description again changes nothing
+    client.put(f"/categories/{ids[1]}", json={"description": "Receipts"}, headers=auth_headers)
+    assert db.query(SenderAffinity).count() == 3
+    # Senders that matched nothing may match the edited category
+    client.put(f"/categories/{ids[0]}", json={"description": "Weekly reading"}, headers=auth_headers)
+    assert [row.category_id for row in db.query(SenderAffinity)] == [ids[1]]
+    client.delete(f"/categories/{ids[1]}", headers=auth_headers)
+    assert db.query(SenderAffinity).count() == 0
+    db.close()
+
+def test_creating_category_relearns_affinities_from_stored_emails(client, auth_headers, test_user):
+    from datetime import datetime
+    from app.models import Email
+    
+    newsletters = client.post("/categories/", json={"name": "Newsletters", "description": "News"},
+                              headers=auth_headers).json()["id"]
+    db = TestingSessionLocal()
+    account = db.query(GmailAccount).filter(GmailAccount.user_id == test_user.id).first()
+    db.add_all([
+        Email(gmail_account_id=account.id, category_id=newsletters, gmail_message_id=f"gm{i}",
+              thread_id=f"t{i}", subject="Hi", sender="News", sender_email="News@example.com",
+              recipient="test@example.com", received_at=datetime(2025, 10, 6), body_text="Hi", ai_summary="Hi")
+        for i in range(3)
+    ])
+    db.add(SenderAffinity(user_id=test_user.id, sender="noise@shop.com", category_id=NO_CATEGORY, count=5))
+    db.commit()
+    
+    client.post("/categories/", json={"name": "Receipts", "description": "Receipts"}, headers=auth_headers)
+    
+    counts = {(row.sender, row.category_id): row.count for row in db.query(SenderAffinity)}
+    assert counts == {("news@example.com", newsletters): 3, ("@example.com", newsletters): 3}
+    db.close()
+
 def test_delete_category(client, auth_headers):
     # Create a category
     create_response = client.post(
@@ -173,3 +217,99 @@ def test_list_gmail_accounts(client, auth_headers):
     assert len(data) >= 1
     assert data[0]["email"] == "test@example.com"
 
+
+def test_sync_job_status(client, auth_headers, test_user):
+    from unittest.mock import patch
+    
+    def fake_sync(user_id, account_ids=None, on_result=None):
+        on_result(1, {"status": "ok", "imported": 2, "failed": 0, "full_sync": False})
+        return {}
+    
+    with patch('app.tasks.sync_emails_task', side_effect=fake_sync):
+        response = client.post("/emails/sync", headers=auth_headers)
+    assert response.status_code == 200
+    job_id = response.json()["job_id"]
+    
+    response = client.get(f"/jobs/{job_id}", headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "SUCCESS"
+    assert data["result"]["accounts"]["1"]["imported"] == 2
+
+def test_sync_job_retries_only_failed_accounts(client, auth_headers, test_user):
+    from unittest.mock import patch
+    calls = []
+    
+    def fake_sync(user_id, account_ids=None, on_result=None):
+        calls.append(account_ids)
+        on_result(1, {"status": "ok", "imported": 2, "failed": 0, "full_sync": False})
+        if account_ids is None:
+            on_result(2, {"status": "error", "error": "Gmail unavailable"})
+        return {}
+    
+    with patch('app.tasks.sync_emails_task', side_effect=fake_sync):
+        response = client.post("/emails/sync", headers=auth_headers)
+    assert response.status_code == 200
+    
+    assert calls == [None, [2]]
+    data = client.get(f"/jobs/{response.json()['job_id']}", headers=auth_headers).json()
+    assert data["status"] == "SUCCESS"
+
+def test_job_status_hidden_from_other_users(client, auth_headers, test_user):
+    from unittest.mock import patch
+    
+    with patch('app.tasks.sync_emails_task', return_value={}):
+        job_id = client.post("/emails/sync", headers=auth_headers).json()["job_id"]
+    
+    other_headers = {"Authorization": f"Bearer {create_access_token(data={'user_id': test_user.id + 1})}"}
+    db = TestingSessionLocal()
+    db.add(User(id=test_user.id + 1, google_id="other123", email="other@example.com", name="Other"))
+    db.commit()
+    db.close()
+    
+    response = client.get(f"/jobs/{job_id}", headers=other_headers)
+    assert response.status_code == 404
+
+def test_bulk_delete_groups_by_account(client, auth_headers, test_user):
+    from unittest.mock import patch
+    from datetime import datetime
+    from app.models import Email
+    
+    db = TestingSessionLocal()
+    category = Category(user_id=test_user.id, name="Bulk", description="Bulk")
+    second_account = GmailAccount(user_id=test_user.id, email="second@example.com",
+                                  access_token="token2", refresh_token="refresh2")
+    db.add_all([category, second_account])
+    db.commit()
+    first_account = db.query(GmailAccount).filter(GmailAccount.email == "test@example.com").first()
+    emails = [
+        Email(gmail_account_id=account.id, category_id=category.id, gmail_message_id=f"gm{i}",
+              thread_id=f"t{i}", subject="Hi", sender="News", sender_email="news@example.com",
+              recipient="test@example.com", received_at=datetime(2025, 10, 6), body_text="Hi", ai_summary="Hi")
+        for i, account in enumerate([first_account, first_account, second_account])
+    ]
+    db.add_all(emails)
+    db.commit()
+    email_ids = [email.id for email in emails]
+    db.close()
+    
+    def trash(ids):
+        return {"succeeded": [i for i in ids if i != "gm2"], "failed": [i for i in ids if i == "gm2"]}
+    
+    with patch('app.routers.emails.get_gmail_service') as mock_service_class:
+        mock_service_class.return_value.trash_messages.side_effect = trash
+        response = client.post(
+            "/emails/bulk-action",
+            json={"email_ids": email_ids, "action": "delete"},
+            headers=auth_headers
+        )
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert sorted(data["succeeded"]) == sorted(email_ids[:2])
+    assert data["failed"] == [email_ids[2]]
+    assert mock_service_class.call_count == 2
+    
+    db = TestingSessionLocal()
+    assert db.query(Email).filter(Email.is_deleted == True).count() == 2
+    db.close()
@@ -0,0 +1,121 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from app.async_ai_service import AsyncAIService, retry_after
+from app.metrics import metrics
+from benchmarks.fake_openai import FakeOpenAIServer, SUMMARY, answer
+
+CATEGORIES = [
+    {"id": 1, "name": "Newsletters", "description": "Marketing and promotional emails, newsletters"},
+    {"id": 2, "name": "Receipts", "description": "Purchase receipts and order confirmations"}
+]
+
+def make_emails(count):
+    return [
+        {"message_id": f"m{i}", "subject": f"Update {i}", "sender": "News", "sender_email": "news@example.com", "body_text": "Hello"}
+        for i in range(count)
+    ]
+
+def run_with(server, concurrency, emails, **kwargs):
+    async def run():
+        service = AsyncAIService(concurrency=concurrency, base_url=server.base_url, **kwargs)
+        try:
+            start = time.perf_counter()
+            results = await service.process_emails(emails, CATEGORIES)
+            return results, time.perf_counter() - start
+        finally:
+            await service.close()
+    return asyncio.run(run())
+
+def test_process_emails_over_http():
+    with FakeOpenAIServer(latency=0.01) as server:
+        results, _ = run_with(server, 4, make_emails(3))
+    
+    assert results == [{"category_id": 1, "summary": SUMMARY, "source": "llm"}] * 3
+    assert server.request_count == 3
+
+class CountingCompletions:
+    """Stands in for AsyncOpenAI's chat.completions, counts the calls running at the same time"""
+    
+    def __init__(self):
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+    
+    async def create(self, timeout=None, **request):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            self.in_flight -= 1
+        content = answer(request["messages"], request.get("max_tokens", 0), request.get("response_format"))
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+def test_calls_in_flight_never_exceed_the_concurrency_limit():
+    for concurrency in (1, 2, 4):
+        completions = CountingCompletions()
+        
+        async def run():
+            service = AsyncAIService(concurrency=concurrency)
+            service.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+            return await service.process_emails(make_emails(8), CATEGORIES)
+        
+        results = asyncio.run(run())
+        
+        assert results == [{"category_id": 1, "summary": SUMMARY, "source": "llm"}] * 8
+        assert completions.calls == 8
+        assert completions.max_in_flight == concurrency
+
+def test_rate_limited_requests_wait_for_retry_after():
+    metrics.reset()
+    with FakeOpenAIServer(latency=0.0, rate_limited_requests=1, retry_after=0.3) as server:
+        results, elapsed = run_with(server, 1, make_emails(1))
+    
+    assert results[0]["category_id"] == 1
+    assert server.request_count == 2
+    assert elapsed >= 0.3
+    assert metrics.snapshot()["counters"]["ai.retries"] == 1
+
+def test_gives_up_after_max_retries_and_falls_back():
+    with FakeOpenAIServer(latency=0.0, rate_limited_requests=100, retry_after=0) as server:
+        results, _ = run_with(server, 1, make_emails(1), max_retries=1)
+    
+    # Combined call and both fallback calls tried twice each, then reported as a failure rather than "no category"
+    assert server.request_count == 6
+    assert results[0]["category_id"] is None
+    assert "Error categorizing email" in results[0]["error"]
+
+def test_retry_after_header_formats():
+    class Response:
+        def __init__(self, headers):
+            self.headers = headers
+    
+    class Error(Exception):
+        def __init__(self, headers):
+            self.response = Response(headers)
+    
+    assert retry_after(Error({"retry-after": "2"})) == 2.0
+    assert retry_after(Error({"retry-after-ms": "250", "retry-after": "2"})) == 0.25
+    assert retry_after(Error({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0.0
+    assert retry_after(Error({})) == 0.0
+    assert retry_after(ValueError()) == 0.0
+
+def test_services_share_the_process_wide_limit():
+    from unittest.mock import patch
+    from app import ai_service
+    completions = CountingCompletions()
+    
+    async def run():
+        services = [AsyncAIService(concurrency=8) for _ in range(2)]
+        for service in services:
+            service.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        return await asyncio.gather(*(service.process_emails(make_emails(8), CATEGORIES) for service in services))
+    
+    with patch('app.ai_service.settings.AI_MAX_IN_FLIGHT', 3), patch.object(ai_service, '_limiter', None):
+        asyncio.run(run())
+    
+    assert completions.calls == 16
+    assert completions.max_in_flight == 3
@@ -0,0 +1,95 @@
+from unittest.mock import patch
+
+from app.body_cleaner import clean_body
+from app.prompts import count_tokens, prompt_body
+from benchmarks.email_bodies import corpus
+
+def test_quoted_reply_is_cut():
+    body = (
+        "Friday works for me.\n\n"
+        "On Mon, Oct 6, 2025 at 9:10 AM Bob Chen\n<bob@example.com> wrote:\n\n"
+        "> Can we meet on Friday?\n> Bob"
+    )
+    
+    assert clean_body(body) == "Friday works for me."
+    assert clean_body("See below.\n> quoted line\nMy answer.") == "See below.\nMy answer."
+
+def test_outlook_reply_is_cut():
+    body = (
+        "Approved.\n\n-----Original Message-----\nFrom: Bob <bob@example.com>\n"
+        "Sent: Tuesday, October 7, 2025 4:12 PM\nSubject: RE: Budget\n\nPlease approve the budget."
+    )
+    
+    assert clean_body(body) == "Approved."
+
+def test_forward_without_reply_text_keeps_the_quoted_message():
+    body = "On Mon, Oct 6, 2025 at 9:10 AM Bob wrote:\nThe launch moved to Thursday."
+    
+    assert "launch moved to Thursday" in clean_body(body)
+
+def test_signatures_are_removed():
+    assert clean_body("See you there.\n-- \nAlice Martin\n+1 415 555 0100") == "See you there."
+    assert clean_body("On my way.\n\nSent from my iPhone") == "On my way."
+
+def test_footer_lines_are_removed():
+    body = (
+        "Your order has shipped.\n\n"
+        "You are receiving this email because you signed up at shop.com.\n"
+        "Unsubscribe | Manage your email preferences\n"
+        "© 2025 Shop Inc. All rights reserved."
+    )
+    long_line = "We changed how you unsubscribe from the weekly digest, " + "details on the new settings page. " * 6
+    
+    assert clean_body(body) == "Your order has shipped."
+    assert clean_body(long_line) == long_line.strip()
+
+def test_boilerplate_words_above_the_footer_are_kept():
+    notice = (
+        "Hi Sam,\nWe are updating our Terms of Service on March 1.\n"
+        "Please review the new privacy policy before then.\nThanks,\nAcme"
+    )
+    request = "Can you unsubscribe me from the team alias?\nI moved to the platform group.\n\nBob"
+    
+    assert clean_body(notice) == notice
+    assert clean_body(request) == request
+    assert clean_body(notice + "\nUnsubscribe | Privacy policy") == notice
+    footer = (
+        "\n\nYou are receiving this email because you have an Acme account.\n"
+        "Unsubscribe | Privacy policy\nAcme Inc., 1 Main St, Springfield"
+    )
+    assert clean_body(notice + footer) == notice
+
+def test_long_urls_are_shortened_to_their_domain():
+    body = (
+        "Read more: https://click.morningbrew.com/ls/click?upn=abc123&utm_source=newsletter.\n"
+        "Docs at https://www.Example.com/a/very/long/path/to/the/page/you/wanted, then "
+        "(https://example.com/faq?ref=mail)"
+    )
+    
+    assert clean_body(body) == (
+        "Read more: https://click.morningbrew.com/ls/click.\n"
+        "Docs at example.com, then (https://example.com/faq)"
+    )
+
+def test_whitespace_and_invisible_characters_are_collapsed():
+    body = "Sale\u200b\u034f\u00ad\u00a0 starts   now\r\n\r\n\r\n\r\n\tShop\t now  "
+    
+    assert clean_body(body) == "Sale starts now\n\nShop now"
+    assert clean_body(None) == ""
+
+def test_body_is_kept_when_cleaning_would_leave_nothing():
+    assert clean_body("Unsubscribe  from  this list") == "Unsubscribe from this list"
+
+def test_prompt_body_cleans_unless_disabled():
+    body = "Thanks!\n\nOn Mon, Oct 6, 2025 Bob wrote:\n> Are we done?"
+    
+    assert prompt_body(body, 100) == "Thanks!"
+    with patch("app.prompts.settings.AI_CLEAN_BODY", False):
+        assert prompt_body(body, 100) == body
+
+def test_corpus_prompts_shrink_by_half():
+    bodies = [body for _, body in corpus(per_shape=5)]
+    before = sum(count_tokens(body) for body in bodies)
+    after = sum(count_tokens(clean_body(body)) for body in bodies)
+    
+    assert after <= before / 2
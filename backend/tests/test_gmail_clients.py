@@ -0,0 +1,44 @@
+import pytest
+from unittest.mock import Mock, patch
+from app.gmail_clients import GmailClientCache
+from app.metrics import metrics
+
+def make_account(account_id, refresh_token="refresh"):
+    return Mock(id=account_id, access_token="token", refresh_token=refresh_token)
+
+@pytest.fixture
+def cache():
+    with patch('app.gmail_clients.GmailService', side_effect=lambda **kwargs: Mock()):
+        yield GmailClientCache(max_size=2, ttl=60)
+
+def test_reuses_client_per_account(cache):
+    account = make_account(1)
+    
+    first = cache.get(account)
+    second = cache.get(account)
+    
+    assert first is second
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert metrics.snapshot()['gauges']['gmail.client.cache_hit_ratio'] == 0.5
+
+def test_new_refresh_token_gets_new_client(cache):
+    first = cache.get(make_account(1))
+    
+    assert cache.get(make_account(1, refresh_token="reauthorized")) is not first
+
+def test_evicts_least_recently_used(cache):
+    first = cache.get(make_account(1))
+    cache.get(make_account(2))
+    cache.get(make_account(1))
+    cache.get(make_account(3))
+    
+    assert cache.get(make_account(1)) is first
+    assert cache.misses == 3
+    cache.get(make_account(2))
+    assert cache.misses == 4
+
+def test_expires_after_ttl(cache):
+    first = cache.get(make_account(1))
+    
+    with patch('app.gmail_clients.time.monotonic', return_value=10**9):
+        assert cache.get(make_account(1)) is not first
@@ -0,0 +1,62 @@
+import pytest
+from unittest.mock import Mock, patch
+from googleapiclient.errors import HttpError
+from app.gmail_quota import GmailRateLimiter, TokenBucket, is_rate_limited
+from app.metrics import metrics
+
+def make_error(status, reason=None):
+    content = b'{}'
+    if reason:
+        content = ('{"error": {"code": %d, "message": "limit", "errors": [{"reason": "%s"}]}}' % (status, reason)).encode()
+    return HttpError(Mock(status=status, reason='error'), content)
+
+def test_is_rate_limited():
+    assert is_rate_limited(make_error(429))
+    assert is_rate_limited(make_error(403, 'userRateLimitExceeded'))
+    assert not is_rate_limited(make_error(403, 'dailyLimitExceeded'))
+    assert not is_rate_limited(make_error(500))
+    assert not is_rate_limited(None)
+
+def test_token_bucket_waits_off_debt():
+    with patch('app.gmail_quota.time.monotonic', return_value=100.0):
+        bucket = TokenBucket(rate=250)
+        assert bucket.reserve(250) == 0
+        # A 100 message batch costs 500 units, two seconds of per-user quota
+        assert bucket.reserve(500) == pytest.approx(2.0)
+    with patch('app.gmail_quota.time.monotonic', return_value=101.0):
+        assert bucket.reserve(5) == pytest.approx(1.02)
+
+def test_limiter_paces_per_account():
+    limiter = GmailRateLimiter(user_units_per_second=10, project_units_per_second=10**6)
+    with patch('app.gmail_quota.time.sleep') as sleep:
+        limiter.acquire('a', 'messages.get', count=2)
+        limiter.acquire('b', 'messages.get', count=2)
+        sleep.assert_not_called()
+        limiter.acquire('a', 'messages.batchModify')
+        assert sleep.call_args[0][0] == pytest.approx(5.0, abs=0.1)
+
+def test_call_retries_rate_limited_requests():
+    limiter = GmailRateLimiter(10**6, 10**6, max_retries=3)
+    func = Mock(side_effect=[make_error(429), make_error(403, 'rateLimitExceeded'), 'ok'])
+    metrics.reset()
+    
+    with patch('app.gmail_quota.time.sleep') as sleep:
+        assert limiter.call('a', 'messages.list', func) == 'ok'
+    
+    assert func.call_count == 3
+    assert sleep.call_count == 2
+    counters = metrics.snapshot()['counters']
+    assert counters['gmail.quota.rate_limited'] == 2
+    assert counters['gmail.quota.retries'] == 2
+    assert counters['gmail.quota.units.messages.list'] == 15
+
+def test_call_gives_up_after_max_retries_and_raises_other_errors():
+    limiter = GmailRateLimiter(10**6, 10**6, max_retries=1)
+    with patch('app.gmail_quota.time.sleep'):
+        with pytest.raises(HttpError):
+            limiter.call('a', 'messages.get', Mock(side_effect=make_error(429)))
+        
+        func = Mock(side_effect=make_error(500))
+        with pytest.raises(HttpError):
+            limiter.call('a', 'messages.get', func)
+        assert func.call_count == 1
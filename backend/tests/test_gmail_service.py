@@ -1,11 +1,12 @@
 import pytest
 from unittest.mock import Mock, patch, MagicMock
 from app.gmail_service import GmailService
+from app.gmail_quota import GmailRateLimiter
 from datetime import datetime
 
 @pytest.fixture
 def gmail_service():
-    with patch('app.gmail_service.build') as mock_build:
+    with patch('app.gmail_service.build_from_document') as mock_build:
         # Create a mock service
         mock_service = MagicMock()
         mock_build.return_value = mock_service
@@ -14,7 +15,8 @@ def gmail_service():
             access_token="test_token",
             refresh_token="test_refresh",
             client_id="test_client_id",
-            client_secret="test_client_secret"
+            client_secret="test_client_secret",
+            rate_limiter=GmailRateLimiter(10**9, 10**9)
         )
         
         # Attach the mock service so tests can use it
@@ -65,3 +67,187 @@ def test_delete_message(gmail_service):
         assert result is True
         mock_trash.assert_called_once()
 
+
+class FakeBatch:
+    """Stand-in for BatchHttpRequest that answers from a dict of responses"""
+    
+    def __init__(self, responses, callback):
+        self.responses = responses
+        self.callback = callback
+        self.request_ids = []
+    
+    def add(self, request, request_id=None):
+        self.request_ids.append(request_id)
+    
+    def execute(self, http=None):
+        for request_id in self.request_ids:
+            response = self.responses[request_id]
+            if isinstance(response, Exception):
+                self.callback(request_id, None, response)
+            else:
+                self.callback(request_id, response, None)
+
+def make_raw_message(message_id):
+    return {
+        'id': message_id,
+        'threadId': f'thread_{message_id}',
+        'labelIds': ['INBOX'],
+        'payload': {
+            'mimeType': 'text/plain',
+            'headers': [
+                {'name': 'From', 'value': 'News <news@example.com>'},
+                {'name': 'Subject', 'value': f'Subject {message_id}'}
+            ],
+            'body': {'data': 'SGVsbG8='}
+        }
+    }
+
+def test_get_messages_batch_reports_failures(gmail_service):
+    responses = {
+        'a': make_raw_message('a'),
+        'b': Exception('404 Not Found'),
+        'c': make_raw_message('c')
+    }
+    batches = []
+    
+    def new_batch(callback=None):
+        batches.append(FakeBatch(responses, callback))
+        return batches[-1]
+    
+    gmail_service.service.new_batch_http_request.side_effect = new_batch
+    
+    messages, failures = gmail_service.get_messages_batch(['a', 'b', 'c'])
+    
+    assert [m['message_id'] for m in messages] == ['a', 'c']
+    assert messages[0]['body_text'] == 'Hello'
+    assert list(failures) == ['b']
+    assert len(batches) == 1
+
+def test_get_messages_batch_chunks_requests(gmail_service):
+    message_ids = [f'm{i}' for i in range(250)]
+    responses = {message_id: make_raw_message(message_id) for message_id in message_ids}
+    batches = []
+    
+    def new_batch(callback=None):
+        batches.append(FakeBatch(responses, callback))
+        return batches[-1]
+    
+    gmail_service.service.new_batch_http_request.side_effect = new_batch
+    
+    messages, failures = gmail_service.get_messages_batch(message_ids)
+    
+    assert len(messages) == 250
+    assert not failures
+    assert [len(batch.request_ids) for batch in batches] == [100, 100, 50]
+
+def test_get_metadata_batch_requests_headers_only(gmail_service):
+    responses = {'a': {'id': 'a', 'labelIds': ['INBOX']}}
+    gmail_service.service.new_batch_http_request.side_effect = lambda callback=None: FakeBatch(responses, callback)
+    
+    metadata, failures = gmail_service.get_metadata_batch(['a'])
+    
+    assert metadata == [responses['a']]
+    kwargs = gmail_service.service.users().messages().get.call_args.kwargs
+    assert kwargs['format'] == 'metadata'
+    assert kwargs['metadataHeaders'] == GmailService.METADATA_HEADERS
+    assert 'payload/headers' in kwargs['fields']
+
+def make_http_error(status):
+    from googleapiclient.errors import HttpError
+    return HttpError(Mock(status=status, reason='error'), b'{}')
+
+def test_get_messages_batch_retries_rate_limited_requests(gmail_service):
+    attempts = [
+        {'a': make_raw_message('a'), 'b': make_http_error(429)},
+        {'b': make_raw_message('b')}
+    ]
+    batches = []
+    
+    def new_batch(callback=None):
+        batches.append(FakeBatch(attempts[len(batches)], callback))
+        return batches[-1]
+    
+    gmail_service.service.new_batch_http_request.side_effect = new_batch
+    
+    with patch('app.gmail_quota.time.sleep'):
+        messages, failures = gmail_service.get_messages_batch(['a', 'b'])
+    
+    assert [m['message_id'] for m in messages] == ['a', 'b']
+    assert not failures
+    assert [batch.request_ids for batch in batches] == [['a', 'b'], ['b']]
+
+def test_list_history_follows_pages(gmail_service):
+    history_list = gmail_service.service.users().history().list
+    history_list.return_value.execute.side_effect = [
+        {
+            'history': [{'messagesAdded': [{'message': {'id': 'a'}}]}],
+            'historyId': '110',
+            'nextPageToken': 'page2'
+        },
+        {
+            'history': [{'messagesAdded': [{'message': {'id': 'b'}}, {'message': {'id': 'a'}}]}],
+            'historyId': '120'
+        }
+    ]
+    
+    history = gmail_service.list_history('100')
+    
+    assert history == {'message_ids': ['a', 'b'], 'history_id': '120'}
+    assert history_list.call_args_list[-1].kwargs['pageToken'] == 'page2'
+
+def test_list_history_expired(gmail_service):
+    from app.gmail_service import HistoryExpiredError
+    history_list = gmail_service.service.users().history().list
+    history_list.return_value.execute.side_effect = make_http_error(404)
+    
+    with pytest.raises(HistoryExpiredError):
+        gmail_service.list_history('100')
+
+def test_get_sync_changes_idle_mailbox(gmail_service):
+    history_list = gmail_service.service.users().history().list
+    history_list.return_value.execute.return_value = {'historyId': '100'}
+    
+    changes = gmail_service.get_sync_changes('100')
+    
+    assert changes['message_ids'] == []
+    assert changes['history_id'] == '100'
+    assert changes['full_sync'] is False
+    assert history_list.call_count == 1
+
+def test_get_sync_changes_resyncs_when_history_expired(gmail_service):
+    users = gmail_service.service.users()
+    users.history().list.return_value.execute.side_effect = make_http_error(404)
+    users.getProfile.return_value.execute.return_value = {'emailAddress': 'test@example.com', 'historyId': '500'}
+    users.messages().list.return_value.execute.return_value = {'messages': []}
+    
+    changes = gmail_service.get_sync_changes('100', resync_query='newer_than:2d', resync_max_messages=50)
+    
+    assert changes['full_sync'] is True
+    assert changes['history_id'] == '500'
+    assert users.messages().list.call_args.kwargs['q'] == 'newer_than:2d'
+    assert users.messages().list.call_args.kwargs['maxResults'] == 50
+
+def test_iter_message_pages(gmail_service):
+    messages_list = gmail_service.service.users().messages().list
+    messages_list.return_value.execute.side_effect = [
+        {'messages': [{'id': 'a'}, {'id': 'b'}], 'nextPageToken': 'page2'},
+        {'messages': [{'id': 'c'}]}
+    ]
+    
+    pages = list(gmail_service.iter_message_pages(query='', page_token='page1'))
+    
+    assert pages == [(['a', 'b'], 'page2'), (['c'], None)]
+    assert messages_list.call_args_list[-2].kwargs['pageToken'] == 'page1'
+
+def test_modify_labels_chunks_and_reports_failures(gmail_service):
+    batch_modify = gmail_service.service.users().messages().batchModify
+    batch_modify.return_value.execute.side_effect = [{}, make_http_error(500), {}]
+    message_ids = [f'm{i}' for i in range(2500)]
+    
+    result = gmail_service.archive_messages(message_ids)
+    
+    assert batch_modify.call_count == 3
+    assert [len(call.kwargs['body']['ids']) for call in batch_modify.call_args_list] == [1000, 1000, 500]
+    assert batch_modify.call_args.kwargs['body']['removeLabelIds'] == ['INBOX']
+    assert result['failed'] == message_ids[1000:2000]
+    assert len(result['succeeded']) == 1500
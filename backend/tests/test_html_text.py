@@ -0,0 +1,38 @@
+import pytest
+from unittest.mock import patch
+from app import html_text
+from app.html_text import html_to_text, streaming_html_to_text, soup_html_to_text
+
+NEWSLETTER = """
+<html><head><title>Weekly</title><style>p { color: red; }</style></head>
+<body>
+<div style="display:none;max-height:0;overflow:hidden">Preview text &zwnj;&nbsp;&zwnj;&nbsp;<p>unclosed</div>
+<span class="preheader">More preview</span>
+<table><tr><td>Hello   <b>World</b></td><td>Deals &amp; offers</td></tr></table>
+<script>track();</script>
+<p>Read <a href="https://example.com">more</a><br>Thanks</p>
+<div style="opacity:0.5">Faded but visible</div>
+</body></html>
+"""
+
+@pytest.mark.parametrize('extract', [streaming_html_to_text, soup_html_to_text])
+def test_extracts_visible_text(extract):
+    assert extract(NEWSLETTER) == 'Hello World\nDeals & offers\nRead more\nThanks\nFaded but visible'
+
+@pytest.mark.parametrize('extract', [streaming_html_to_text, soup_html_to_text])
+def test_keeps_image_alt_text(extract):
+    html = ('<p>Hello</p><img alt="pixel" style="display:none"/><img alt="50% OFF SALE"/><img alt="Shop now">'
+            '<br/><p>Bye</p>')
+    assert extract(html) == 'Hello\n50% OFF SALE Shop now\nBye'
+
+def test_falls_back_to_beautifulsoup():
+    def broken(html):
+        raise ValueError('bad markup')
+    
+    with patch.dict(html_text.EXTRACTORS, {'broken': broken}):
+        assert html_to_text('<p>Hi</p>', extractor='broken') == 'Hi'
+
+def test_uses_configured_extractor():
+    with patch.object(html_text.settings, 'HTML_TEXT_EXTRACTOR', 'beautifulsoup'), \
+         patch.dict(html_text.EXTRACTORS, {'beautifulsoup': lambda html: 'soup'}):
+        assert html_to_text('<p>Hi</p>') == 'soup'
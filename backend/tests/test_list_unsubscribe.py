@@ -0,0 +1,151 @@
+import asyncio
+import httpx
+import pytest
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.database import Base
+from app.models import User, Category, Email, GmailAccount
+from app.list_unsubscribe import parse_list_unsubscribe, parse_mailto, find_unsubscribe_link, one_click_unsubscribe
+from app import tasks
+
+def test_parse_list_unsubscribe():
+    options = parse_list_unsubscribe({
+        'List-Unsubscribe': '<mailto:unsub@example.com?subject=stop>, <https://example.com/u?id=1>',
+        'List-Unsubscribe-Post': 'List-Unsubscribe=One-Click'
+    })
+    
+    assert options == {
+        'http': ['https://example.com/u?id=1'],
+        'mailto': ['mailto:unsub@example.com?subject=stop'],
+        'one_click': True
+    }
+    # One-click needs an https URL to POST to
+    assert not parse_list_unsubscribe({
+        'list-unsubscribe': '<http://example.com/u>',
+        'list-unsubscribe-post': 'List-Unsubscribe=One-Click'
+    })['one_click']
+
+def test_find_link_and_parse_mailto():
+    assert find_unsubscribe_link({'http': []}, 'Bye: https://example.com/unsubscribe?x=1.') == 'https://example.com/unsubscribe?x=1'
+    assert parse_mailto('mailto:list%2Bunsub@example.com?subject=remove') == {
+        'to': 'list+unsub@example.com', 'subject': 'remove', 'body': 'unsubscribe'
+    }
+
+def test_one_click_posts_without_following_redirects():
+    requests = []
+    
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(302 if 'redirect' in request.url.path else 200)
+    
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return (
+                await one_click_unsubscribe(client, 'https://example.com/ok'),
+                await one_click_unsubscribe(client, 'https://example.com/redirect')
+            )
+    
+    ok, redirected = asyncio.run(run())
+    
+    assert ok['success'] and not redirected['success']
+    assert requests[0].method == 'POST'
+    assert requests[0].content == b'List-Unsubscribe=One-Click'
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    user = User(google_id="unsub", email="me@example.com", name="Me")
+    session.add(user)
+    session.commit()
+    session.add(GmailAccount(user_id=user.id, email="me@example.com", access_token="t", refresh_token="r"))
+    session.add(Category(user_id=user.id, name="Newsletters", description="Newsletters"))
+    session.commit()
+    yield session
+    session.close()
+
+def add_email(db, message_id, headers, unsubscribe_link=None):
+    email = Email(
+        gmail_account_id=1, category_id=1, gmail_message_id=message_id, subject="News",
+        sender_email="news@example.com", headers=headers, unsubscribe_link=unsubscribe_link
+    )
+    db.add(email)
+    db.commit()
+    return email
+
+def test_unsubscribe_prefers_one_click_then_mailto_then_browser(db):
+    one_click = add_email(db, 'a', {
+        'List-Unsubscribe': '<https://a.example.com/u>', 'List-Unsubscribe-Post': 'List-Unsubscribe=One-Click'
+    })
+    same_list = add_email(db, 'b', {
+        'List-Unsubscribe': '<https://a.example.com/u>', 'List-Unsubscribe-Post': 'List-Unsubscribe=One-Click'
+    })
+    mailto = add_email(db, 'c', {'List-Unsubscribe': '<mailto:unsub@c.example.com>'})
+    browser = add_email(db, 'd', {}, unsubscribe_link='https://d.example.com/unsubscribe')
+    
+    posts = []
+    transport = httpx.MockTransport(lambda request: posts.append(request) or httpx.Response(200))
+    real_client = httpx.AsyncClient
+    gmail_service = Mock()
+    agent = MagicMock()
+    agent.__aenter__.return_value.unsubscribe = AsyncMock(return_value={"success": True, "message": "done"})
+    
+    with patch.object(tasks.httpx, 'AsyncClient', lambda **kwargs: real_client(transport=transport)), \
+         patch.object(tasks, 'get_gmail_service', return_value=gmail_service), \
+         patch.object(tasks, 'UnsubscribeAgent', return_value=agent):
+        results = asyncio.run(tasks._unsubscribe(db, 1, [one_click.id, same_list.id, mailto.id, browser.id]))
+    
+    assert [results[str(email.id)]['method'] for email in (one_click, same_list, mailto, browser)] == [
+        'one_click', 'one_click', 'mailto', 'browser'
+    ]
+    assert len(posts) == 1
+    gmail_service.send_message.assert_called_once_with('unsub@c.example.com', 'unsubscribe', 'unsubscribe')
+    agent.__aenter__.return_value.unsubscribe.assert_awaited_once_with('https://d.example.com/unsubscribe')
+    assert db.query(Email).filter(Email.is_deleted == True).count() == 4
+
+def test_unsubscribe_keeps_earlier_results_when_the_browser_fails_to_start(db):
+    one_click = add_email(db, 'a', {
+        'List-Unsubscribe': '<https://a.example.com/u>', 'List-Unsubscribe-Post': 'List-Unsubscribe=One-Click'
+    })
+    browser = add_email(db, 'b', {}, unsubscribe_link='https://b.example.com/unsubscribe')
+    other_user = User(google_id="other", email="other@example.com", name="Other")
+    db.add(other_user)
+    db.commit()
+    db.add(GmailAccount(user_id=other_user.id, email="other@example.com", access_token="t", refresh_token="r"))
+    db.commit()
+    not_mine = Email(
+        gmail_account_id=2, category_id=1, gmail_message_id='c', subject="News", sender_email="news@example.com",
+        headers={'List-Unsubscribe': '<https://c.example.com/u>', 'List-Unsubscribe-Post': 'List-Unsubscribe=One-Click'}
+    )
+    db.add(not_mine)
+    db.commit()
+    
+    posts = []
+    transport = httpx.MockTransport(lambda request: posts.append(request) or httpx.Response(200))
+    real_client = httpx.AsyncClient
+    committed = []
+    
+    def start_browser():
+        # The one-click result is committed before the browser is needed
+        committed.append(one_click.is_deleted and not db.dirty)
+        raise RuntimeError("chromium missing")
+    
+    agent = MagicMock()
+    agent.__aenter__.side_effect = start_browser
+    
+    with patch.object(tasks.httpx, 'AsyncClient', lambda **kwargs: real_client(transport=transport)), \
+         patch.object(tasks, 'UnsubscribeAgent', return_value=agent):
+        results = asyncio.run(tasks._unsubscribe(db, 1, [one_click.id, browser.id, not_mine.id]))
+    
+    assert committed == [True]
+    # Another user's email is left alone
+    assert set(results) == {str(one_click.id), str(browser.id)}
+    assert [str(request.url) for request in posts] == ['https://a.example.com/u']
+    assert results[str(one_click.id)]['success']
+    assert not results[str(browser.id)]['success']
+    assert 'chromium missing' in results[str(browser.id)]['message']
+    db.expire_all()
+    assert [email.gmail_message_id for email in db.query(Email).filter(Email.is_deleted == True)] == ['a']
@@ -0,0 +1,68 @@
+import pytest
+from unittest.mock import patch
+
+from app.ai_service import AIService
+from app.config import settings
+from app.local_classifier import _indexes, CategoryIndex, classify_locally, get_category_index, tokenize
+from app.metrics import metrics
+from benchmarks.labeled_emails import CATEGORIES, EMAILS
+
+@pytest.fixture
+def local_classifier():
+    metrics.reset()
+    _indexes.clear()
+    with patch.object(settings, 'LOCAL_CLASSIFIER_ENABLED', True):
+        yield
+
+def test_tokenize_drops_stopwords_and_plurals():
+    assert tokenize("Your Receipts for the 2 orders") == ["receipt", "order"]
+
+def test_labeled_emails_mostly_resolved_locally_and_correctly(local_classifier):
+    results = classify_locally(EMAILS, CATEGORIES)
+    resolved = [(category_id, email["label"]) for category_id, email in zip(results, EMAILS) if category_id is not None]
+    
+    assert len(resolved) / len(EMAILS) >= 0.5
+    assert sum(category_id == label for category_id, label in resolved) / len(resolved) >= 0.95
+    assert metrics.snapshot()["counters"]["ai.local.resolved"] == len(resolved)
+
+def test_unrelated_email_is_left_to_the_llm(local_classifier):
+    # Personal mail that happens to share a word with a category
+    unrelated = [email for email in EMAILS if email["label"] is None] + [
+        {"subject": "Comments on the draft", "sender": "Priya",
+         "body_text": "I left a few comments in the doc, mostly small wording changes."},
+        {"subject": "Hotel for the wedding?", "sender": "Sam",
+         "body_text": "Are you staying at the same place as us? We could share a taxi from the ceremony."},
+        {"subject": "Your invoice question", "sender": "Dana (accountant)",
+         "body_text": "I looked at last year's return, we can go over it on a call next week."},
+        {"subject": "Package from grandma", "sender": "Mom", "body_text": "She sent cookies, tell me when they arrive."},
+    ]
+    
+    assert classify_locally(unrelated, CATEGORIES) == [None] * len(unrelated)
+
+def test_close_call_is_left_to_the_llm():
+    index = CategoryIndex(CATEGORIES)
+    email = {"subject": "Receipt for your flight booking", "sender": "", "body_text": ""}
+    
+    assert index.classify([email], margin=1.0, min_score=0) == [None]
+    assert index.classify([], margin=0, min_score=0) == []
+
+def test_index_rebuilt_only_when_a_category_changes(local_classifier):
+    first = get_category_index(CATEGORIES)
+    assert get_category_index(list(reversed(CATEGORIES))) is first
+    
+    renamed = [{**CATEGORIES[0], "description": "Anything at all"}] + CATEGORIES[1:]
+    assert get_category_index(renamed) is not first
+    assert metrics.snapshot()["counters"]["ai.local.index_builds"] == 2
+
+def test_disabled_classifier_defers_everything():
+    with patch.object(settings, 'LOCAL_CLASSIFIER_ENABLED', False):
+        assert classify_locally(EMAILS[:3], CATEGORIES) == [None, None, None]
+
+def test_confident_email_skips_the_llm(local_classifier):
+    ai_service = AIService()
+    email = EMAILS[0]
+    
+    with patch.object(ai_service.client.chat.completions, 'create') as mock_create:
+        assert ai_service.categorize_email(email, CATEGORIES) == email["label"]
+        assert ai_service.categorize_emails([email], CATEGORIES) == {"0": email["label"]}
+        mock_create.assert_not_called()
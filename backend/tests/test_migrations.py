@@ -0,0 +1,39 @@
+import os
+from sqlalchemy import create_engine, inspect, text
+
+
+def alembic_config(url):
+    from alembic.config import Config
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    config = Config(os.path.join(backend, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(backend, "migrations"))
+    config.set_main_option("sqlalchemy.url", url)
+    return config
+
+def test_upgrade_adds_columns_to_tables_created_before_them(tmp_path):
+    from alembic import command
+    url = f"sqlite:///{tmp_path / 'old.db'}"
+    engine = create_engine(url)
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE gmail_accounts (id INTEGER PRIMARY KEY, email VARCHAR)"))
+        connection.execute(text("CREATE TABLE emails (id INTEGER PRIMARY KEY, unsubscribe_link VARCHAR)"))
+    
+    command.upgrade(alembic_config(url), "head")
+    
+    columns = {table: {column['name'] for column in inspect(engine).get_columns(table)}
+               for table in ('gmail_accounts', 'emails')}
+    assert {'backfill_page_token', 'backfill_completed_at'} <= columns['gmail_accounts']
+    assert 'unsubscribe_options' in columns['emails']
+    engine.dispose()
+
+def test_upgrade_leaves_a_current_schema_alone(tmp_path):
+    from alembic import command
+    from app.database import Base
+    url = f"sqlite:///{tmp_path / 'new.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    
+    command.upgrade(alembic_config(url), "head")
+    
+    assert 'unsubscribe_options' in {column['name'] for column in inspect(engine).get_columns('emails')}
+    engine.dispose()
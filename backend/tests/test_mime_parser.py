@@ -0,0 +1,60 @@
+import base64
+from unittest.mock import Mock
+from app.mime_parser import extract_bodies, part_charset, decode_base64url
+
+def encode(data):
+    return base64.urlsafe_b64encode(data).decode()
+
+def part(mime_type, data, charset='utf-8', **extra):
+    return {
+        'mimeType': mime_type,
+        'headers': [{'name': 'Content-Type', 'value': f'{mime_type}; charset="{charset}"'}],
+        'body': {'data': encode(data)},
+        **extra
+    }
+
+def test_walks_nested_parts_in_order():
+    payload = {'mimeType': 'multipart/mixed', 'parts': [
+        {'mimeType': 'multipart/related', 'parts': [
+            {'mimeType': 'multipart/alternative', 'parts': [
+                part('text/plain', b'first'),
+                part('text/html', b'<p>html</p>')
+            ]}
+        ]},
+        {'mimeType': 'message/rfc822', 'parts': [part('text/plain', b' second')]},
+        part('text/plain', b'ignored', filename='notes.txt')
+    ]}
+    
+    assert extract_bodies(payload) == ('first second', '<p>html</p>')
+
+def test_decodes_declared_charsets():
+    payload = {'mimeType': 'multipart/alternative', 'parts': [
+        part('text/plain', 'café “quoted”'.encode('windows-1252'), charset='windows-1252'),
+        part('text/html', 'お知らせ'.encode('iso-2022-jp'), charset='iso-2022-jp')
+    ]}
+    
+    assert extract_bodies(payload) == ('café “quoted”', 'お知らせ')
+    assert part_charset({'headers': [{'name': 'Content-Type', 'value': 'text/plain; charset=x-bogus'}]}) == 'utf-8'
+    assert part_charset({'headers': [{'name': 'Content-Type', 'value': 'text/plain; charset=GB2312'}]}) == 'gb18030'
+
+def test_caps_stop_decoding_and_lazy_fetches():
+    fetch_attachment = Mock(return_value=encode(b'<p>large html</p>'))
+    payload = {'mimeType': 'multipart/mixed', 'parts': [
+        part('text/plain', b'x' * 1000),
+        part('text/plain', b'never decoded'),
+        {'mimeType': 'text/html', 'body': {'attachmentId': 'html-body'}},
+        {'mimeType': 'text/plain', 'body': {'attachmentId': 'text-body'}}
+    ]}
+    
+    text, html = extract_bodies(payload, fetch_attachment=fetch_attachment, max_text=100, max_html=100)
+    
+    assert text == 'x' * 100
+    assert html == '<p>large html</p>'
+    # The text cap was already reached, its attachment-backed body is never fetched
+    fetch_attachment.assert_called_once_with('html-body')
+
+def test_decode_base64url_prefix_and_missing_padding():
+    data = encode(b'hello world').rstrip('=')
+    
+    assert decode_base64url(data) == b'hello world'
+    assert decode_base64url(data, max_bytes=5) == b'hello '
@@ -0,0 +1,103 @@
+import pytest
+from datetime import datetime
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base
+from app.models import Category, Email, GmailAccount, User, UserClassifier
+from app.online_classifier import (
+    NaiveBayes, classify, email_features, expire_category, load_classifier, record_emails, reset_user
+)
+from app.sender_affinity import NO_CATEGORY
+from benchmarks.labeled_emails import EMAILS
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+
+@pytest.fixture
+def user(db):
+    user = User(google_id="nb123", email="nb@example.com", name="NB User")
+    db.add(user)
+    db.commit()
+    account = GmailAccount(user_id=user.id, email="nb@example.com", access_token="t", refresh_token="r")
+    category = Category(user_id=user.id, name="Receipts", description="Purchase receipts")
+    db.add_all([account, category])
+    db.commit()
+    for i in range(3):
+        db.add(Email(gmail_account_id=account.id, category_id=category.id, gmail_message_id=f"m{i}",
+                     subject="Your receipt", sender_email="orders@shop.com", body_text="Order total $10",
+                     received_at=datetime(2025, 10, i + 1)))
+    db.commit()
+    return user
+
+def train(emails):
+    model = NaiveBayes()
+    for email in emails:
+        model.learn(email_features(email), email["label"])
+    return model
+
+def test_features_are_hashed_once_per_word():
+    features = email_features({"subject": "Receipt receipt", "sender_email": "A@Shop.com", "body_text": "receipt"})
+    
+    # Subject and body words are separate features, plus the address and its domain
+    assert len(features) == 4
+    assert features == email_features({"subject": "receipt", "sender_email": "a@shop.com", "body_text": "Receipts"})
+
+def test_confident_predictions_agree_with_the_labels():
+    held_out = EMAILS[::4]
+    model = train([email for email in EMAILS if email not in held_out])
+    
+    with patch('app.online_classifier.settings.ONLINE_CLASSIFIER_MIN_EMAILS', 10):
+        predictions = [(classify(model, email), email["label"]) for email in held_out]
+    confident = [(category_id, label) for category_id, label in predictions if category_id is not None]
+    
+    assert len(confident) >= len(held_out) / 4
+    assert all(category_id == (label or NO_CATEGORY) for category_id, label in confident)
+
+def test_too_few_emails_are_never_trusted():
+    model = train(EMAILS[:5])
+    
+    with patch('app.online_classifier.settings.ONLINE_CLASSIFIER_MIN_EMAILS', 50):
+        assert classify(model, EMAILS[0]) is None
+
+def test_state_round_trips_and_models_add_up():
+    first, second = train(EMAILS[:30]), train(EMAILS[30:])
+    restored = NaiveBayes.from_bytes(first.to_bytes())
+    restored.merge(second)
+    
+    assert restored.classes == train(EMAILS).classes
+    assert restored.predict(email_features(EMAILS[0])) == train(EMAILS).predict(email_features(EMAILS[0]))
+    assert len(train(EMAILS).to_bytes()) < 20000
+
+def test_new_model_is_bootstrapped_from_stored_emails(db, user):
+    model = load_classifier(db, user.id)
+    
+    assert model.email_count == 3
+    assert db.get(UserClassifier, user.id).email_count == 3
+    record_emails(db, user.id, [(email_features(EMAILS[0]), None)])
+    db.commit()
+    assert load_classifier(db, user.id).classes[NO_CATEGORY][0] == 1
+
+def test_changed_categories_are_forgotten(db, user):
+    category_id = db.query(Category).one().id
+    load_classifier(db, user.id)
+    record_emails(db, user.id, [(email_features(EMAILS[0]), None)])
+    db.commit()
+    
+    # "No match" goes too, those emails may match the changed category
+    expire_category(db, user.id, category_id)
+    db.commit()
+    assert load_classifier(db, user.id).email_count == 0
+    
+    # A reset model stays empty instead of being trained again from the old decisions
+    reset_user(db, user.id)
+    db.commit()
+    assert db.get(UserClassifier, user.id).email_count == 0
+    assert load_classifier(db, user.id).classes == {}
@@ -0,0 +1,102 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from app.ai_service import record_usage
+from app.async_ai_service import AsyncAIService
+from app.metrics import metrics
+from app.prompts import (
+    batch_request, categorize_request, combined_request, count_tokens, prompt_tokens, summarize_request,
+    truncate_tokens
+)
+from benchmarks.fake_openai import FakeOpenAIServer
+
+CATEGORIES = [
+    {"id": 1, "name": "Newsletters", "description": "Marketing and promotional emails, newsletters"},
+    {"id": 2, "name": "Receipts", "description": "Purchase receipts and order confirmations"}
+]
+
+def make_email(subject="Weekly Newsletter", body="This is our weekly newsletter. " * 200):
+    return {"subject": subject, "sender": "News Corp", "sender_email": "news@example.com", "body_text": body}
+
+class WordEncoding:
+    """Stands in for a tiktoken encoding, one token per space-separated word"""
+    
+    def encode(self, text, disallowed_special=()):
+        return text.split(' ')
+    
+    def decode(self, tokens):
+        return ' '.join(tokens)
+
+def test_categories_come_first_and_the_email_last():
+    requests = [
+        categorize_request(make_email(), CATEGORIES),
+        combined_request(make_email(), CATEGORIES),
+        batch_request(["[m1]\nSubject: Hi"], CATEGORIES)
+    ]
+    
+    for request in requests:
+        system, user = request["messages"]
+        assert system["content"].index("Newsletters") < system["content"].index("Receipts")
+        assert "Subject:" in user["content"] and "Subject:" not in system["content"]
+    # The same prefix for every email of the user, whatever the order of their categories
+    other = categorize_request(make_email("Your receipt", "Thanks for your order"), list(reversed(CATEGORIES)))
+    assert other["messages"][0] == requests[0]["messages"][0]
+    assert requests[0]["messages"][0]["content"].startswith(requests[1]["messages"][0]["content"][:200])
+
+def test_body_is_budgeted_in_tokens():
+    with patch("app.prompts._get_encoding", return_value=None):
+        with patch("app.prompts.settings.AI_PROMPT_CATEGORIZE_BODY_TOKENS", 100):
+            request = categorize_request(make_email(), CATEGORIES)
+        summary = summarize_request(make_email())
+        
+        assert 100 <= count_tokens(request["messages"][1]["content"]) <= 130
+        assert prompt_tokens(summary) > prompt_tokens(request)
+        assert truncate_tokens(None, 10) == ""
+
+def test_missing_tokenizer_is_logged_once(capsys):
+    with patch("app.prompts.tiktoken", None), patch("app.prompts._encoding", None), \
+         patch("app.prompts._encoding_loaded", False):
+        assert count_tokens("abcdefgh") == 3
+        assert count_tokens("abcd") == 2
+    
+    assert capsys.readouterr().out.count("estimating token counts") == 1
+
+def test_truncation_uses_the_tokenizer_when_it_is_available():
+    with patch("app.prompts._get_encoding", return_value=WordEncoding()):
+        assert truncate_tokens("one two three four", 2) == "one two"
+        assert truncate_tokens("one two", 5) == "one two"
+        assert count_tokens("one two three") == 3
+
+def test_usage_is_split_into_cached_and_uncached_prompt_tokens():
+    metrics.reset()
+    record_usage(SimpleNamespace(usage=SimpleNamespace(
+        prompt_tokens=1500, completion_tokens=5, prompt_tokens_details={"cached_tokens": 1280}
+    )), "separate")
+    record_usage(SimpleNamespace(usage=SimpleNamespace(prompt_tokens=300, completion_tokens=5)), "separate")
+    
+    counters = metrics.snapshot()["counters"]
+    assert counters["ai.tokens.separate.cached_prompt_tokens"] == 1280
+    assert counters["ai.tokens.separate.uncached_prompt_tokens"] == 220 + 300
+
+def test_repeated_category_prefix_is_reported_as_cached():
+    metrics.reset()
+    categories = [
+        {"id": i, "name": f"Category {i}", "description": "Emails about a topic the user wants kept together " * 3}
+        for i in range(1, 41)
+    ]
+    
+    async def categorize(server):
+        service = AsyncAIService(concurrency=1, base_url=server.base_url)
+        try:
+            for subject in ("First", "Second"):
+                await service.categorize_email(make_email(subject), categories)
+        finally:
+            await service.close()
+    
+    with FakeOpenAIServer(latency=0) as server:
+        asyncio.run(categorize(server))
+    
+    counters = metrics.snapshot()["counters"]
+    assert counters["ai.tokens.separate.cached_prompt_tokens"] >= 1024
+    assert counters["ai.tokens.separate.uncached_prompt_tokens"] > 0
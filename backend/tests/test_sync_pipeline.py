@@ -0,0 +1,67 @@
+import threading
+import time
+from app.sync_pipeline import Pipeline, Stage
+
+def test_pipeline_runs_items_through_stages():
+    pipeline = Pipeline("test", [
+        Stage("split", lambda chunk: list(chunk), 2),
+        Stage("double", lambda n: [n * 2], 3),
+        Stage("odd_only", lambda n: [n] if n % 4 else [], 1),
+    ], queue_size=2)
+    
+    results = pipeline.run([[1, 2], [3, 4], [5]])
+    
+    assert sorted(results) == [2, 6, 10]
+    assert pipeline.stats["double"].received == 5
+    assert pipeline.stats["odd_only"].emitted == 3
+    assert pipeline.stats["double"].max_queue_depth <= 2
+
+def test_pipeline_records_errors_and_keeps_going():
+    def flaky(n):
+        if n == 2:
+            raise ValueError("bad item")
+        return [n]
+    
+    pipeline = Pipeline("test", [Stage("flaky", flaky, 2)])
+    
+    results = pipeline.run([1, 2, 3])
+    
+    assert sorted(results) == [1, 3]
+    assert pipeline.stats["flaky"].errors == 1
+    assert pipeline.errors == [{"stage": "flaky", "error": "bad item"}]
+
+def test_pipeline_hands_errors_to_the_stage_handler():
+    def flaky(batch):
+        if 2 in batch:
+            raise ValueError("bad batch")
+        return batch
+    
+    failed = []
+    pipeline = Pipeline("test", [
+        Stage("flaky", flaky, 1, batch_size=2, on_error=lambda batch, e: failed.append((batch, str(e)))),
+    ])
+    
+    results = pipeline.run([1, 2, 3])
+    
+    assert results == [3]
+    assert failed == [([1, 2], "bad batch")]
+    assert pipeline.stats["flaky"].errors == 1
+    assert pipeline.errors == []
+
+def test_pipeline_overlaps_stage_work():
+    lock = threading.Lock()
+    state = {"running": 0, "peak": 0}
+    
+    def slow(n):
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        time.sleep(0.02)
+        with lock:
+            state["running"] -= 1
+        return [n]
+    
+    pipeline = Pipeline("test", [Stage("slow", slow, 4)])
+    
+    assert len(pipeline.run(range(8))) == 8
+    assert state["peak"] > 1
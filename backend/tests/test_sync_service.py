@@ -0,0 +1,523 @@
+import pytest
+from unittest.mock import Mock
+from datetime import datetime
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.database import Base
+from app.models import User, Category, Email, GmailAccount
+from app.sync_service import sync_account, backfill_account, SyncError
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+
+@pytest.fixture
+def gmail_account(db):
+    user = User(google_id="sync123", email="sync@example.com", name="Sync User")
+    db.add(user)
+    db.commit()
+    account = GmailAccount(
+        user_id=user.id,
+        email="sync@example.com",
+        access_token="test_token",
+        refresh_token="test_refresh",
+        history_id="100"
+    )
+    db.add(account)
+    db.add(Category(user_id=user.id, name="Newsletters", description="Newsletters"))
+    db.commit()
+    return account
+
+@pytest.fixture
+def categories_data(db, gmail_account):
+    return [{"id": cat.id, "name": cat.name, "description": cat.description} for cat in db.query(Category).all()]
+
+def make_message(message_id):
+    return {
+        'message_id': message_id,
+        'thread_id': f'thread_{message_id}',
+        'subject': 'Weekly Newsletter',
+        'sender': 'News Corp',
+        'sender_email': 'news@example.com',
+        'recipient': 'sync@example.com',
+        'received_at': datetime(2025, 10, 6),
+        'body_text': 'Latest updates',
+        'body_html': None,
+        'headers': {},
+        'labels': ['INBOX'],
+        'unsubscribe_link': None
+    }
+
+@pytest.fixture
+def ai_service(categories_data):
+    service = Mock()
+    service.process_email.return_value = {'category_id': categories_data[0]['id'], 'summary': 'Summary', 'source': 'llm'}
+    service.process_emails.side_effect = lambda messages, categories: [
+        service.process_email(message, categories) for message in messages
+    ]
+    service.summarize_emails.side_effect = lambda messages: ['Summary' for message in messages]
+    return service
+
+def make_metadata(message_id, labels=('INBOX',), sender='news@example.com'):
+    return {
+        'id': message_id,
+        'labelIds': list(labels),
+        'sizeEstimate': 20000,
+        'payload': {'headers': [{'name': 'From', 'value': f'News <{sender}>'}]}
+    }
+
+def make_gmail_service(message_ids=(), failures=None, history_id='150', metadata=None):
+    gmail_service = Mock()
+    gmail_service.get_sync_changes.return_value = {
+        'message_ids': list(message_ids),
+        'history_id': history_id,
+        'full_sync': False
+    }
+    failures = failures or {}
+    metadata = metadata or {}
+    gmail_service.get_metadata_batch.side_effect = lambda ids: (
+        [metadata.get(i) or make_metadata(i) for i in ids if i not in failures],
+        {i: failures[i] for i in ids if i in failures}
+    )
+    gmail_service.get_raw_messages_batch.side_effect = lambda ids: (
+        [{'id': i} for i in ids if i not in failures],
+        {i: failures[i] for i in ids if i in failures}
+    )
+    gmail_service.parse_message.side_effect = lambda raw: make_message(raw['id'])
+    gmail_service.archive_messages.side_effect = lambda ids: {'succeeded': list(ids), 'failed': []}
+    return gmail_service
+
+def test_sync_account_persists_history_id(db, gmail_account, ai_service, categories_data):
+    gmail_service = make_gmail_service(['a', 'b'])
+    
+    result = sync_account(db, gmail_account, gmail_service, ai_service, categories_data)
+    
+    assert result['imported'] == 2
+    assert gmail_service.get_sync_changes.call_args.args[0] == '100'
+    db.refresh(gmail_account)
+    assert gmail_account.history_id == '150'
+    assert gmail_account.last_synced is not None
+    assert db.query(Email).filter(Email.is_archived == True).count() == 2
+
+def test_sync_account_reports_stage_stats(db, gmail_account, ai_service, categories_data):
+    gmail_service = make_gmail_service(['a', 'b', 'c'])
+    ai_service.process_email.side_effect = lambda message, categories: {
+        'category_id': None if message['message_id'] == 'b' else categories[0]['id'],
+        'summary': 'Summary'
+    }
+    
+    result = sync_account(db, gmail_account, gmail_service, ai_service, categories_data)
+    
+    stages = result['stages']
+    assert list(stages) == ['fetch', 'parse', 'classify', 'persist', 'archive']
+    assert stages['parse']['received'] == 3
+    assert stages['classify']['emitted'] == 2
+    assert stages['archive']['emitted'] == 2
+    assert result['imported'] == 2
+
+def test_sync_account_skips_already_imported(db, gmail_account, ai_service, categories_data):
+    sync_account(db, gmail_account, make_gmail_service(['a']), ai_service, categories_data)
+    gmail_service = make_gmail_service(['a', 'b'])
+    
+    result = sync_account(db, gmail_account, gmail_service, ai_service, categories_data)
+    
+    assert result['imported'] == 1
+    gmail_service.get_raw_messages_batch.assert_called_once_with(['b'])
+
+def test_sync_account_keeps_history_id_on_fetch_failures(db, gmail_account, ai_service, categories_data):
+    gmail_service = make_gmail_service(['a', 'b'], failures={'b': 'HttpError 500'})
+    
+    result = sync_account(db, gmail_account, gmail_service, ai_service, categories_data)
+    
+    assert result['failed'] == 1
+    db.refresh(gmail_account)
+    assert gmail_account.history_id == '100'
+
+def test_sync_account_retries_failed_messages_a_limited_number_of_times(db, gmail_account, ai_service,
+                                                                        categories_data):
+    from unittest.mock import patch
+    from app.models import SyncFailure
+    ai_service.process_email.side_effect = RuntimeError("OpenAI unavailable")
+    
+    with patch('app.sync_service.settings.SYNC_MAX_MESSAGE_ATTEMPTS', 3):
+        for attempt in range(1, 4):
+            result = sync_account(db, gmail_account, make_gmail_service(['a']), ai_service, categories_data)
+            
+            # A stage error fails the batch's messages instead of the sync
+            assert result['failed'] == 1
+            assert db.query(SyncFailure).one().attempts == attempt
+            db.refresh(gmail_account)
+            assert gmail_account.history_id == ('150' if attempt == 3 else '100')
+    
+    assert gmail_account.last_synced is not None
+    assert 'OpenAI unavailable' in db.query(SyncFailure).one().error
+    
+    # Imported when it comes up again, e.g. in a backfill, and its failures are forgotten
+    ai_service.process_email.side_effect = None
+    sync_account(db, gmail_account, make_gmail_service(['a'], history_id='200'), ai_service, categories_data)
+    assert db.query(SyncFailure).count() == 0
+
+def make_backfill_gmail_service(pages):
+    gmail_service = make_gmail_service()
+    gmail_service.iter_message_pages.side_effect = lambda query, page_token=None: iter(pages[page_token])
+    return gmail_service
+
+def test_backfill_account_bounds_in_flight_and_checkpoints(db, gmail_account, ai_service, categories_data):
+    pages = {None: [(['a', 'b', 'c'], 'page2'), (['d', 'e'], None)]}
+    gmail_service = make_backfill_gmail_service(pages)
+    
+    result = backfill_account(db, gmail_account, gmail_service, ai_service, categories_data, max_in_flight=16)
+    
+    assert result == {'imported': 5, 'failed': 0}
+    batch_sizes = [len(call.args[0]) for call in gmail_service.get_raw_messages_batch.call_args_list]
+    assert sorted(batch_sizes) == [1, 2, 2]
+    db.refresh(gmail_account)
+    assert gmail_account.backfill_page_token is None
+    assert gmail_account.backfill_completed_at is not None
+
+def test_import_holds_at_most_max_in_flight_messages(db, gmail_account, ai_service, categories_data):
+    import threading
+    import time
+    from unittest.mock import patch
+    from app import sync_service
+    from app.config import settings
+    message_ids = [f'm{i}' for i in range(2000)]
+    gmail_service = make_backfill_gmail_service({None: [(message_ids, None)]})
+    fetch_raw = gmail_service.get_raw_messages_batch.side_effect
+    process_emails = ai_service.process_emails.side_effect
+    insert_new_emails = sync_service._insert_new_emails
+    lock = threading.Lock()
+    held = {'now': 0, 'peak': 0}
+    
+    def fetched(ids):
+        with lock:
+            held['now'] += len(ids)
+            held['peak'] = max(held['peak'], held['now'])
+        return fetch_raw(ids)
+    
+    def slow_classify(messages, categories):
+        time.sleep(0.001)
+        return process_emails(messages, categories)
+    
+    def inserted(db, rows):
+        result = insert_new_emails(db, rows)
+        with lock:
+            held['now'] -= len(rows)
+        return result
+    
+    gmail_service.get_raw_messages_batch.side_effect = fetched
+    ai_service.process_emails.side_effect = slow_classify
+    with patch('app.sync_service._insert_new_emails', side_effect=inserted):
+        result = backfill_account(db, gmail_account, gmail_service, ai_service, categories_data, max_in_flight=100)
+    
+    assert result == {'imported': 2000, 'failed': 0}
+    # One message more per parse worker, which holds the one it is parsing
+    assert held['peak'] <= 100 + settings.SYNC_PARSE_CONCURRENCY
+
+def test_backfill_account_resumes_from_checkpoint(db, gmail_account, ai_service, categories_data):
+    pages = {None: [(['a'], 'page2'), (['b'], None)], 'page2': [(['b'], None)]}
+    gmail_service = make_backfill_gmail_service(pages)
+    ai_service.process_email.side_effect = [
+        {'category_id': categories_data[0]['id'], 'summary': 'Summary'},
+        RuntimeError("interrupted")
+    ]
+    
+    with pytest.raises(SyncError):
+        backfill_account(db, gmail_account, gmail_service, ai_service, categories_data)
+    db.refresh(gmail_account)
+    assert gmail_account.backfill_page_token == 'page2'
+    
+    ai_service.process_email.side_effect = None
+    backfill_account(db, gmail_account, gmail_service, ai_service, categories_data)
+    
+    assert gmail_service.iter_message_pages.call_args.kwargs['page_token'] == 'page2'
+    assert db.query(Email).count() == 2
+
+def test_backfill_task_raises_after_trying_every_account(db, gmail_account, ai_service, categories_data):
+    from unittest.mock import patch
+    from app.sync_service import backfill_emails_task
+    db.add(GmailAccount(user_id=gmail_account.user_id, email="revoked@example.com",
+                        access_token="t", refresh_token="r"))
+    db.commit()
+    gmail_service = make_backfill_gmail_service({None: [(['a'], None)]})
+    
+    def get_gmail_service(account, db):
+        if account.email == "revoked@example.com":
+            raise RuntimeError("Token has been revoked")
+        return gmail_service
+    
+    with patch('app.sync_service.SessionLocal', return_value=db), \
+         patch('app.sync_service.AIService', return_value=ai_service), \
+         patch('app.sync_service.get_gmail_service', side_effect=get_gmail_service):
+        with pytest.raises(SyncError, match="revoked@example.com: Token has been revoked"):
+            backfill_emails_task(gmail_account.user_id)
+    
+    # The other account is still backfilled, a retry only picks up the failed one
+    account = db.query(GmailAccount).filter(GmailAccount.email == "sync@example.com").one()
+    assert account.backfill_completed_at is not None
+    assert db.query(Email).count() == 1
+
+def test_sync_user_accounts_limits_concurrency_and_isolates_failures():
+    import threading
+    import time
+    from unittest.mock import patch
+    from app import sync_service
+    
+    lock = threading.Lock()
+    state = {'running': 0, 'peak': 0}
+    
+    def fake_sync_account(db, gmail_account, gmail_service, ai_service, categories_data):
+        with lock:
+            state['running'] += 1
+            state['peak'] = max(state['peak'], state['running'])
+        time.sleep(0.05)
+        with lock:
+            state['running'] -= 1
+        if gmail_account.id == 3:
+            raise RuntimeError("Gmail unavailable")
+        return {'imported': gmail_account.id, 'failed': 0, 'full_sync': False}
+    
+    def fake_session():
+        db = Mock()
+        db.get.side_effect = lambda model, account_id: Mock(id=account_id)
+        return db
+    
+    reported = []
+    with patch.object(sync_service, 'SessionLocal', side_effect=fake_session), \
+         patch.object(sync_service, 'get_gmail_service'), \
+         patch.object(sync_service, 'AIService'), \
+         patch.object(sync_service, 'sync_account', side_effect=fake_sync_account), \
+         patch.object(sync_service.settings, 'SYNC_MAX_ACCOUNTS_PER_USER', 2):
+        sync_service._user_semaphores.pop(999, None)
+        results = sync_service.sync_user_accounts(
+            999, [1, 2, 3, 4, 5], [], on_result=lambda account_id, result: reported.append(account_id)
+        )
+    
+    assert state['peak'] == 2
+    assert sorted(reported) == [1, 2, 3, 4, 5]
+    assert results[3] == {'status': 'error', 'error': 'Gmail unavailable'}
+    assert results[5] == {'status': 'ok', 'imported': 5, 'failed': 0, 'full_sync': False}
+
+def test_sync_account_batches_commits(db, gmail_account, ai_service, categories_data):
+    from sqlalchemy import event
+    message_ids = [f'm{i}' for i in range(500)]
+    commits = []
+    event.listen(db, 'after_commit', lambda session: commits.append(1))
+    
+    result = sync_account(db, gmail_account, make_gmail_service(message_ids), ai_service, categories_data)
+    
+    assert result['imported'] == 500
+    assert db.query(Email).filter(Email.is_archived == True).count() == 500
+    assert len(commits) <= 6
+
+def test_sync_account_workers_never_load_the_account(db, gmail_account, ai_service, categories_data):
+    import threading
+    from unittest.mock import patch
+    from sqlalchemy import event
+    queries = []
+    
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if 'FROM gmail_accounts' in statement:
+            queries.append(threading.current_thread().name)
+    
+    event.listen(db.get_bind(), 'before_cursor_execute', record)
+    try:
+        # Several persist commits, each expires the account
+        with patch('app.sync_service.settings.SYNC_PERSIST_BATCH_SIZE', 10):
+            result = sync_account(db, gmail_account, make_gmail_service([f'm{i}' for i in range(50)]),
+                                  ai_service, categories_data)
+    finally:
+        event.remove(db.get_bind(), 'before_cursor_execute', record)
+    
+    assert result['imported'] == 50
+    assert not [name for name in queries if name.startswith('sync-')]
+
+def test_insert_new_emails_ignores_duplicates(db, gmail_account, categories_data):
+    from app.sync_service import _insert_new_emails
+    
+    def row(message_id):
+        message = make_message(message_id)
+        return {
+            'gmail_account_id': gmail_account.id,
+            'category_id': categories_data[0]['id'],
+            'gmail_message_id': message_id,
+            'thread_id': message['thread_id'],
+            'subject': message['subject'],
+            'sender': message['sender'],
+            'sender_email': message['sender_email'],
+            'recipient': message['recipient'],
+            'received_at': message['received_at'],
+            'body_text': message['body_text'],
+            'ai_summary': 'Summary'
+        }
+    
+    assert _insert_new_emails(db, [row('a')]) == ['a']
+    assert _insert_new_emails(db, [row('a'), row('b')]) == ['b']
+    db.commit()
+    assert db.query(Email).count() == 2
+
+def test_sync_account_only_fetches_relevant_messages(db, gmail_account, ai_service, categories_data):
+    gmail_service = make_gmail_service(['a', 'b', 'c', 'd'], metadata={
+        'b': make_metadata('b', labels=['SENT']),
+        'c': make_metadata('c', sender='sync@example.com')
+    })
+    
+    result = sync_account(db, gmail_account, gmail_service, ai_service, categories_data)
+    
+    fetched = [i for call in gmail_service.get_raw_messages_batch.call_args_list for i in call.args[0]]
+    assert sorted(fetched) == ['a', 'd']
+    assert result['imported'] == 2
+    assert result['fetch']['screened'] == 4
+    assert result['fetch']['skipped'] == 2
+    assert 0 < result['fetch']['bytes_saved'] < 40000
+
+def test_sync_account_skips_llm_for_consistent_senders(db, gmail_account, ai_service, categories_data):
+    from app.models import SenderAffinity
+    from app.sender_affinity import expire_category
+    newsletters = categories_data[0]['id']
+    
+    sync_account(db, gmail_account, make_gmail_service([f'a{i}' for i in range(5)]), ai_service, categories_data)
+    assert ai_service.process_email.call_count == 5
+    counts = {(row.sender, row.category_id): row.count for row in db.query(SenderAffinity)}
+    assert counts == {('news@example.com', newsletters): 5, ('@example.com', newsletters): 5}
+    
+    result = sync_account(db, gmail_account, make_gmail_service(['b1', 'b2']), ai_service, categories_data)
+    
+    # Known sender: only summaries were asked for, and nothing new was learned from them
+    assert result['imported'] == 2
+    assert ai_service.process_email.call_count == 5
+    assert ai_service.summarize_emails.call_count == 1
+    assert db.query(Email).filter(Email.gmail_message_id == 'b1').one().category_id == newsletters
+    assert db.query(SenderAffinity).filter(SenderAffinity.sender == 'news@example.com').one().count == 5
+    
+    # Editing the category sends the sender back to the LLM
+    expire_category(db, gmail_account.user_id, newsletters)
+    db.commit()
+    sync_account(db, gmail_account, make_gmail_service(['c1']), ai_service, categories_data)
+    assert ai_service.process_email.call_count == 6
+
+def test_sync_account_learns_no_category_only_from_real_answers(db, gmail_account, ai_service, categories_data):
+    from app.models import SenderAffinity
+    from app.sender_affinity import NO_CATEGORY
+    ai_service.process_email.side_effect = lambda message, categories: (
+        {'category_id': None, 'summary': None, 'error': "Error categorizing email: timeout"}
+        if message['message_id'] == 'b' else {'category_id': None, 'summary': None}
+    )
+    
+    result = sync_account(db, gmail_account, make_gmail_service(['a', 'b']), ai_service, categories_data)
+    
+    assert result['failed'] == 1
+    counts = {(row.sender, row.category_id): row.count for row in db.query(SenderAffinity)}
+    assert counts == {('news@example.com', NO_CATEGORY): 1, ('@example.com', NO_CATEGORY): 1}
+
+def test_affinity_thresholds():
+    from unittest.mock import patch
+    from app.sender_affinity import AffinityTable, NO_CATEGORY
+    table = AffinityTable({
+        'news@example.com': {1: 19, 2: 1},
+        '@example.com': {1: 30},
+        'noise@shop.com': {NO_CATEGORY: 6},
+        'friend@gmail.com': {3: 2},
+    })
+    
+    with patch('app.sender_affinity.settings.AFFINITY_MIN_EMAILS', 5), \
+         patch('app.sender_affinity.settings.AFFINITY_MIN_SHARE', 0.95):
+        # 95% agreement is enough, a disagreeing history is not overridden by the domain
+        assert table.lookup('News@Example.com') == 1
+        with patch('app.sender_affinity.settings.AFFINITY_MIN_SHARE', 0.99):
+            assert table.lookup('news@example.com') is None
+        # New sender of a consistent domain
+        assert table.lookup('promo@example.com') == 1
+        assert table.lookup('noise@shop.com') == NO_CATEGORY
+        # Too little history, and gmail.com is never learned as a domain
+        assert table.lookup('friend@gmail.com') is None
+        assert table.lookup('other@gmail.com') is None
+
+def test_sync_account_learns_a_model_that_replaces_the_llm(db, gmail_account, ai_service, categories_data):
+    from unittest.mock import patch
+    from app.models import UserClassifier
+    newsletters = categories_data[0]['id']
+    
+    with patch('app.sync_service.settings.AFFINITY_ENABLED', False), \
+         patch('app.online_classifier.settings.ONLINE_CLASSIFIER_MIN_EMAILS', 3):
+        sync_account(db, gmail_account, make_gmail_service(['a1', 'a2', 'a3']), ai_service, categories_data)
+        assert ai_service.process_email.call_count == 3
+        assert db.get(UserClassifier, gmail_account.user_id).email_count == 3
+        
+        result = sync_account(db, gmail_account, make_gmail_service(['b1', 'b2']), ai_service, categories_data)
+    
+    # Predicted by the model: only summaries were asked for, and nothing new was learned from them
+    assert result['imported'] == 2
+    assert ai_service.process_email.call_count == 3
+    assert ai_service.summarize_emails.call_count == 1
+    assert db.query(Email).filter(Email.gmail_message_id == 'b1').one().category_id == newsletters
+    assert db.get(UserClassifier, gmail_account.user_id).email_count == 3
+
+def test_sync_account_model_learns_only_from_the_llm(db, gmail_account, ai_service, categories_data):
+    from unittest.mock import patch
+    from app.models import UserClassifier
+    answers = {
+        'a': {'category_id': categories_data[0]['id'], 'summary': 'Summary', 'source': 'local'},
+        'b': {'category_id': categories_data[0]['id'], 'summary': 'Summary', 'source': 'cache'},
+        'c': {'category_id': None, 'summary': None, 'error': "Error categorizing email: timeout"},
+        'd': {'category_id': None, 'summary': 'Summary', 'source': 'local'},
+        'e': {'category_id': None, 'summary': 'Summary', 'source': 'llm'},
+    }
+    ai_service.process_email.side_effect = lambda message, categories: answers[message['message_id']]
+    
+    with patch('app.sync_service.settings.AFFINITY_ENABLED', False):
+        sync_account(db, gmail_account, make_gmail_service(list(answers)), ai_service, categories_data)
+    
+    model = db.get(UserClassifier, gmail_account.user_id)
+    assert model.email_count == 1
+
+def make_ai_response(request, category_id):
+    """
+    Completion answering every email of a batched categorize request with category_id, a combined
+    request with category_id and a summary, anything else with a summary
+    """
+    import json
+    import re
+    content = request['messages'][-1]['content']
+    if request.get('response_format'):
+        keys = re.findall(r'^\[(.+)\]$', content, re.MULTILINE)
+        if keys:
+            content = json.dumps({'results': {key: category_id for key in keys}})
+        else:
+            content = json.dumps({'category_id': category_id, 'summary': 'Summary'})
+    else:
+        content = 'Summary'
+    response = Mock()
+    response.choices = [Mock()]
+    response.choices[0].message.content = content
+    return response
+
+def test_sync_account_keeps_messages_the_llm_failed_on(db, gmail_account, categories_data):
+    from unittest.mock import patch
+    from app.ai_service import AIService
+    from app.models import SenderAffinity
+    message_ids = [f'm{i}' for i in range(30)]
+    ai_service = AIService()
+    
+    with patch.object(ai_service.client.chat.completions, 'create', side_effect=RuntimeError("OpenAI unavailable")):
+        result = sync_account(db, gmail_account, make_gmail_service(message_ids), ai_service, categories_data)
+    
+    # Failures, not "no category": nothing stored or learned and the history ID stays for the next sync
+    assert result['imported'] == 0
+    assert result['failed'] == 30
+    db.refresh(gmail_account)
+    assert gmail_account.history_id == '100'
+    assert db.query(SenderAffinity).count() == 0
+    
+    answer = lambda **request: make_ai_response(request, categories_data[0]['id'])
+    with patch.object(ai_service.client.chat.completions, 'create', side_effect=answer):
+        result = sync_account(db, gmail_account, make_gmail_service(message_ids), ai_service, categories_data)
+    
+    assert result['imported'] == 30
+    db.refresh(gmail_account)
+    assert gmail_account.history_id == '150'
@@ -0,0 +1,131 @@
+import pytest
+import threading
+import time
+from unittest.mock import Mock, patch
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.database import Base
+from app.models import User, GmailAccount
+from app import token_manager
+from app.gmail_service import GmailService
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+def add_account(db, token_expiry, last_synced=None, email="tokens@example.com"):
+    user = User(google_id=email, email=email, name="Token User")
+    db.add(user)
+    db.commit()
+    account = GmailAccount(
+        user_id=user.id,
+        email=email,
+        access_token="old_token",
+        refresh_token="refresh",
+        token_expiry=token_expiry,
+        last_synced=last_synced
+    )
+    db.add(account)
+    db.commit()
+    return account
+
+class FakeCredentials:
+    """Stands in for google credentials, counts token endpoint calls"""
+    calls = 0
+    
+    def __init__(self, **kwargs):
+        self.token = None
+        self.expiry = None
+    
+    def refresh(self, request):
+        type(self).calls += 1
+        time.sleep(0.05)
+        self.token = f"new_token_{type(self).calls}"
+        self.expiry = datetime.utcnow() + timedelta(hours=1)
+
+@pytest.fixture
+def fake_refresh():
+    FakeCredentials.calls = 0
+    with patch.object(token_manager, 'Credentials', FakeCredentials):
+        yield FakeCredentials
+
+def test_concurrent_refreshes_are_merged(session_factory, db, fake_refresh):
+    account = add_account(db, datetime.utcnow() + timedelta(seconds=30))
+    results = []
+    
+    def worker():
+        session = session_factory()
+        try:
+            credentials = Mock(token="old_token", expiry=account.token_expiry)
+            token_manager.ensure_fresh_token(session, session.get(GmailAccount, account.id), credentials)
+            results.append(credentials.token)
+        finally:
+            session.close()
+    
+    threads = [threading.Thread(target=worker) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert fake_refresh.calls == 1
+    assert results == ["new_token_1"] * 5
+    db.refresh(account)
+    assert account.access_token == "new_token_1"
+    assert account.token_expiry > datetime.utcnow() + timedelta(minutes=30)
+
+def test_adopts_token_stored_by_another_worker(db, fake_refresh):
+    account = add_account(db, datetime.utcnow() + timedelta(hours=1))
+    account.access_token = "stored_token"
+    db.commit()
+    credentials = Mock(token="stale_token", expiry=datetime.utcnow() - timedelta(minutes=1))
+    
+    token_manager.ensure_fresh_token(db, account, credentials)
+    
+    assert fake_refresh.calls == 0
+    assert credentials.token == "stored_token"
+
+def test_background_refresh_only_touches_active_expiring_accounts(db, fake_refresh):
+    now = datetime.utcnow()
+    expiring = add_account(db, now + timedelta(minutes=5), last_synced=now, email="a@example.com")
+    fresh = add_account(db, now + timedelta(hours=1), last_synced=now, email="b@example.com")
+    inactive = add_account(db, now + timedelta(minutes=5), last_synced=now - timedelta(days=7), email="c@example.com")
+    
+    result = token_manager.refresh_expiring_tokens(db)
+    
+    assert result == {"refreshed": 1, "failed": 0}
+    assert expiring.access_token == "new_token_1"
+    assert fresh.access_token == "old_token"
+    assert inactive.access_token == "old_token"
+
+def test_inline_refresh_is_saved_unless_older(session_factory, db):
+    account = add_account(db, datetime.utcnow() + timedelta(minutes=30))
+    
+    with patch.object(token_manager, 'SessionLocal', session_factory):
+        token_manager.save_refreshed_token(account.id, Mock(token="older", expiry=datetime.utcnow()))
+        db.refresh(account)
+        assert account.access_token == "old_token"
+        
+        token_manager.save_refreshed_token(account.id, Mock(token="newer", expiry=datetime.utcnow() + timedelta(hours=1)))
+        db.refresh(account)
+        assert account.access_token == "newer"
+
+def test_gmail_service_reports_refreshes():
+    on_refresh = Mock()
+    with patch('app.gmail_service.build_from_document'):
+        service = GmailService("token", "refresh", "id", "secret", on_token_refresh=on_refresh)
+    
+    with patch('google.oauth2.credentials.Credentials.refresh'):
+        service.credentials.refresh(Mock())
+    
+    on_refresh.assert_called_once_with(service.credentials)